@@ -1,17 +1,39 @@
 import os
-from openai import OpenAI
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Dict, Tuple
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
 from loguru import logger
 from langgraph.graph import StateGraph, END
+from langgraph.config import get_stream_writer
 
 from app.schemas.schema import ChatState
-from app.utils.llm import generate_embedding
-from app.modules.opensearch_database import opensearch_client
-from app.utils.athena_client import run_athena_query, wait_for_query_to_complete, get_query_results
+from app.utils.athena_result_set import ResultSet
+from app.utils.llm import async_generate_embedding
+from app.modules.opensearch_database import async_opensearch_client
+from app.utils.athena_client import (
+    ATHENA_WORKGROUP,
+    async_run_athena_query,
+    async_wait_for_query_execution,
+    async_get_result_set,
+)
 
 from app.langgraph.data_services_nodes import WorkflowNodes
 
-from app.utils.s3_prompts_config import get_prompt
+from app.utils.s3_prompts_config import async_get_prompt
+from app.utils.semantic_cache import SEMANTIC_CACHE_ENABLED, semantic_cache
+from app.utils.intent_classifier import load_intent_classifier
+from app.utils.sql_template_cache import SQL_TEMPLATE_CACHE_ENABLED, sql_template_cache
+from app.utils.athena_result_cache import ATHENA_RESULT_CACHE_ENABLED, athena_result_cache
+from app.utils.athena_scheduler import get_athena_scheduler
+from app.utils.sql_guard import REJECT, SQL_GUARD_ENABLED, SqlGuard
+from app.utils.sql_validator import SQL_MAX_CORRECTIONS, SQL_VALIDATION_ENABLED, is_correctable
+from app.utils.local_sql_tier import LOCAL_SQL_ENABLED, local_sql_tier
+from app.utils.table_vector_index import TABLE_VECTOR_INDEX_ENABLED, table_vector_index
+from app.utils.column_retrieval import COLUMN_RETRIEVAL_ENABLED, column_index
+from app.utils.metrics import CHAT_ROUTES, dependency_timer, observe_node
+from app.utils.state_logging import log_state, summarize_tables
 
 load_dotenv()
 
@@ -20,34 +42,57 @@ class ChatWorkflow:
     A class that encapsulates the LangGraph chat flow logic.
     Orchestrates the workflow nodes and the state graph.
     """
-    def __init__(self, openai_api_key: str = None, text_to_sql_model: str = None, final_answer_model: str = None):
+    def __init__(self, openai_api_key: str = None, text_to_sql_model: str = None, final_answer_model: str = None,
+                 speculative: bool = None):
         # Set configuration values via environment variables or provided arguments.
         self.openai_api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
         self.text_to_sql_model = text_to_sql_model or os.getenv("TEXT_TO_SQL_MODEL")
         self.final_answer_model = final_answer_model or os.getenv("FINAL_ANSWER_MODEL")
+        # In speculative mode the table search starts while the query is still being classified.
+        self.speculative = _resolve_speculative(speculative)
+        # Semantic answer cache shared by all workflows in this worker (disabled unless configured)
+        self.answer_cache = semantic_cache if SEMANTIC_CACHE_ENABLED else None
+        # Optional local classifier that decides clear-cut queries without an LLM call
+        self.intent_classifier = load_intent_classifier()
         
-        # Initialize shared resources/clients
-        self.client = OpenAI(api_key=self.openai_api_key)
+        # Initialize shared resources/clients. All I/O in the graph is async so
+        # a single worker can serve many chats concurrently.
+        self.client = AsyncOpenAI(api_key=self.openai_api_key)
     
         # Instantiate the WorkflowNodes with all required dependencies
         self.workflow_nodes = WorkflowNodes(
             client=self.client,
-            opensearch_client=opensearch_client,
+            opensearch_client=async_opensearch_client,
             text_to_sql_model=self.text_to_sql_model,
             final_answer_model=self.final_answer_model,
-            run_athena_query=run_athena_query,
-            wait_for_query_to_complete=wait_for_query_to_complete,
-            get_query_results=get_query_results,
-            generate_embedding=generate_embedding,
-            logger=logger
+            run_athena_query=async_run_athena_query,
+            wait_for_query_execution=async_wait_for_query_execution,
+            get_result_set=async_get_result_set,
+            generate_embedding=async_generate_embedding,
+            logger=logger,
+            sql_template_cache=sql_template_cache if SQL_TEMPLATE_CACHE_ENABLED else None,
+            result_cache=athena_result_cache if ATHENA_RESULT_CACHE_ENABLED else None,
+            athena_scheduler=get_athena_scheduler(ATHENA_WORKGROUP),
+            sql_guard=SqlGuard() if SQL_GUARD_ENABLED else None,
+            local_sql=local_sql_tier if LOCAL_SQL_ENABLED else None,
+            table_index=table_vector_index if TABLE_VECTOR_INDEX_ENABLED else None,
+            column_index=column_index if COLUMN_RETRIEVAL_ENABLED else None,
         )
         
         # Build the LangGraph state graph
         logger.info("Building the LangGraph state graph...")
         self.graph = StateGraph(ChatState)
-        self.graph.add_node("process_user_query", self.workflow_nodes.process_user_query)
+        if self.speculative:
+            self.graph.add_node("process_user_query", self.speculative_process_user_query)
+        elif self.intent_classifier is not None:
+            self.graph.add_node("process_user_query", self.classify_user_query)
+        else:
+            self.graph.add_node("process_user_query", self.workflow_nodes.process_user_query)
         self.graph.add_node("similarity_search", self.workflow_nodes.similarity_search)
         self.graph.add_node("generate_sql_query", self.workflow_nodes.generate_sql_query)
+        if SQL_VALIDATION_ENABLED:
+            self.graph.add_node("validate_sql_query", self.workflow_nodes.validate_sql_query)
+        self.graph.add_node("guard_sql_query", self.workflow_nodes.guard_sql_query)
         self.graph.add_node("execute_sql_query", self.workflow_nodes.execute_sql_query)
         self.graph.add_node("fetch_table_prompt", self.workflow_nodes.fetch_table_prompt)
         self.graph.add_node("generate_final_answer", self.workflow_nodes.generate_final_answer)
@@ -66,8 +111,37 @@ class ChatWorkflow:
         )
         # Continue with the existing SQL-based flow
         self.graph.add_edge("similarity_search", "generate_sql_query")
-        self.graph.add_edge("generate_sql_query", "execute_sql_query")
-        self.graph.add_edge("execute_sql_query", "fetch_table_prompt")
+        # Invalid SQL goes back to the LLM with the errors, up to SQL_MAX_CORRECTIONS times
+        if SQL_VALIDATION_ENABLED:
+            self.graph.add_edge("generate_sql_query", "validate_sql_query")
+            self.graph.add_conditional_edges(
+                "validate_sql_query",
+                self.after_sql_validation,
+                {
+                    "retry": "generate_sql_query",
+                    "continue": "guard_sql_query",
+                }
+            )
+        else:
+            self.graph.add_edge("generate_sql_query", "guard_sql_query")
+        # Rejected queries skip Athena; the final answer explains the rejection
+        self.graph.add_conditional_edges(
+            "guard_sql_query",
+            self.after_sql_guard,
+            {
+                "execute": "execute_sql_query",
+                "rejected": "fetch_table_prompt",
+            }
+        )
+        # Athena errors the LLM can fix (unknown column, syntax) are corrected the same way
+        self.graph.add_conditional_edges(
+            "execute_sql_query",
+            self.after_sql_execution,
+            {
+                "retry": "generate_sql_query",
+                "continue": "fetch_table_prompt",
+            }
+        )
         self.graph.add_edge("fetch_table_prompt", "generate_final_answer")
         # Both final nodes point to END
         self.graph.add_edge("generate_final_answer", END)
@@ -76,22 +150,47 @@ class ChatWorkflow:
         logger.info("Compiling the graph executor...")
         self.executor = self.graph.compile()
     
-    async def decide_next_step(self, state: ChatState) -> str:
+    def after_sql_guard(self, state: ChatState) -> str:
+        if state.sql_guard and state.sql_guard.get("action") == REJECT:
+            return "rejected"
+        return "execute"
+
+    def after_sql_validation(self, state: ChatState) -> str:
+        if state.sql_error and state.attempts < SQL_MAX_CORRECTIONS:
+            return "retry"
+        return "continue"
+
+    def after_sql_execution(self, state: ChatState) -> str:
+        if is_correctable(state.sql_error) and state.attempts < SQL_MAX_CORRECTIONS:
+            logger.info(f"Athena rejected the SQL query; asking for a correction: {state.sql_error}")
+            return "retry"
+        return "continue"
+
+    async def classify_query(self, query: str, embedding=None, use_local: bool = True) -> str:
         """
-        Uses the gpt-4o model to classify the user's query into a database query
-        or a general/RAG query. Returns the corresponding route.
+        Classifies the user's query as "database_query" or "general_query".
+        Confidently separable queries are decided by the local intent classifier
+        when an embedding is available; the rest use the gpt-4o model.
         """
+        if use_local and embedding is not None and self.intent_classifier is not None:
+            classification = self.intent_classifier.predict(embedding)
+            if classification:
+                logger.info(f"Query classified locally as: {classification}")
+                return classification
+            logger.info("Local intent classifier is not confident; falling back to the LLM.")
+
         # Fetch the prompt template from S3 for classification.
-        prompt_template = get_prompt('decide_next_step')
+        prompt_template = await async_get_prompt('decide_next_step')
 
-        prompt = prompt_template.format(query=state.query)
-        logger.info(f"Decide_next_step:==========> {prompt}")
+        prompt = prompt_template.format(query=query)
+        logger.opt(lazy=True).debug("Decide_next_step:==========> {}", lambda: prompt)
 
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-2024-11-20",
-                messages=[{"role": "user", "content": prompt}]
-            )
+            with dependency_timer("openai", "classify_query"):
+                response = await self.client.chat.completions.create(
+                    model="gpt-4o-2024-11-20",
+                    messages=[{"role": "user", "content": prompt}]
+                )
             classification = response.choices[0].message.content.strip()
             classification = classification.replace('"', '')
 
@@ -103,15 +202,78 @@ class ChatWorkflow:
         except Exception as e:
             logger.error(f"Error classifying query: {e}. Defaulting to database_query.")
             classification = "database_query"
+        return classification
+
+    async def _embed_for_classifier(self, state: ChatState) -> None:
+        """
+        Computes the query embedding up front when the local classifier can use it.
+        """
+        if self.intent_classifier is None or state.embedding is not None:
+            return
+        try:
+            state.embedding = await async_generate_embedding(state.query)
+        except Exception as e:
+            logger.error(f"Error embedding query for the intent classifier: {e}")
+
+    @observe_node
+    async def classify_user_query(self, state: ChatState) -> ChatState:
+        """
+        Entry node used when a local intent classifier is loaded. Embeds the query
+        (the embedding is reused by similarity_search) and classifies it.
+        """
+        state = await self.workflow_nodes.process_user_query(state)
+        await self._embed_for_classifier(state)
+        state.query_intent = await self.classify_query(state.query, state.embedding)
+        return state
+
+    @observe_node
+    async def speculative_process_user_query(self, state: ChatState) -> ChatState:
+        """
+        Entry node used in speculative mode. Classifies the query while the
+        embedding and kNN table search run concurrently. The table search is
+        cancelled (or its result discarded) if the query goes to the RAG route.
+        """
+        state = await self.workflow_nodes.process_user_query(state)
+        await self._embed_for_classifier(state)
+        logger.info("Starting speculative table search alongside query classification.")
+        search_task = asyncio.create_task(
+            self.workflow_nodes.search_similar_tables(state.query, state.embedding)
+        )
+        try:
+            classification = await self.classify_query(state.query, state.embedding)
+        except BaseException:
+            search_task.cancel()
+            raise
+        state.query_intent = classification
+
+        if classification != "database_query":
+            logger.info("Query routed to RAG; discarding speculative table search.")
+            search_task.cancel()
+            return state
+
+        try:
+            state.embedding, state.similar_tables = await search_task
+            logger.opt(lazy=True).info("Speculative similarity search found tables: {}", lambda: summarize_tables(state.similar_tables))
+        except Exception as e:
+            # Leave similar_tables unset so similarity_search retries the lookup.
+            logger.error(f"Speculative similarity search failed: {e}")
+        return state
+
+    async def decide_next_step(self, state: ChatState) -> str:
+        """
+        Routes the query to the database or RAG branch. Uses the classification
+        already stored in the state (speculative mode) or classifies it now.
+        """
+        classification = state.query_intent or await self.classify_query(state.query)
         
         # Store the classification in the state for future reference.
         state.query_intent = classification
         logger.info(f"Query classified as: {classification}")
+        get_stream_writer()({"event": "classification", "query_intent": classification})
         # Map to routing keys used in the conditional edges.
-        if classification == "database_query":
-            return "database_route"
-        else:
-            return "rag_route"
+        route = "database_route" if classification == "database_query" else "rag_route"
+        CHAT_ROUTES.labels(route=route).inc()
+        return route
     
     async def run(self, query: str, uuid: str = None) -> ChatState:
         """
@@ -126,17 +288,190 @@ class ChatWorkflow:
         """
         logger.info("Entering method: run")
         logger.info(f"Received query: {query}")
-        initial_state = ChatState(query=query, uuid=uuid)
+        initial_state, cached_state = await self._lookup_cached_answer(query, uuid)
+        if cached_state is not None:
+            logger.info("Returning cached answer; skipping the workflow.")
+            return cached_state
         logger.info("Invoking the executor with the initial state.")
         
         result_dict = await self.executor.ainvoke(initial_state)
         
         if isinstance(result_dict, dict):
             final_state = ChatState(**result_dict)
-            logger.info(f"Flow completed successfully. Final state: {final_state.model_dump()}")
+            log_state(logger, "Flow completed successfully. Final state", final_state)
         else:
             logger.error("LangGraph did not return a dictionary. Cannot convert to ChatState.")
             raise TypeError("LangGraph did not return a dictionary. Cannot convert to ChatState.")
     
+        self._store_cached_answer(final_state)
         logger.info("Exiting method: run")
         return final_state
+
+    async def stream(self, query: str, uuid: str = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Runs the chat flow and yields progress events as each node finishes,
+        followed by the final-answer tokens and a closing "final" event.
+
+        Args:
+            query (str): The user query.
+            uuid (str, optional): Optional client UUID.
+
+        Yields:
+            dict: An event with an "event" name and its payload fields.
+        """
+        logger.info("Entering method: stream")
+        logger.info(f"Received query: {query}")
+        initial_state, cached_state = await self._lookup_cached_answer(query, uuid)
+        if cached_state is not None:
+            yield {"event": "token", "text": cached_state.final_answer}
+            yield _final_event(cached_state)
+            return
+        final_values = None
+
+        async for mode, chunk in self.executor.astream(initial_state, stream_mode=["updates", "custom", "values"]):
+            if mode == "custom":
+                yield chunk
+            elif mode == "values":
+                final_values = chunk
+            else:
+                for node_name, update in chunk.items():
+                    event = _progress_event(node_name, update or {})
+                    if event:
+                        yield event
+
+        if not isinstance(final_values, dict):
+            logger.error("LangGraph did not return a dictionary. Cannot convert to ChatState.")
+            raise TypeError("LangGraph did not return a dictionary. Cannot convert to ChatState.")
+        final_state = ChatState(**final_values)
+        self._store_cached_answer(final_state)
+        yield _final_event(final_state)
+        logger.info("Exiting method: stream")
+
+    async def _lookup_cached_answer(self, query: str, uuid: str = None):
+        """
+        Builds the initial state and checks the semantic answer cache.
+
+        When the cache is enabled the query embedding is computed here and kept
+        on the initial state, so similarity_search does not embed it again.
+
+        Returns:
+            tuple: (initial_state, cached_state or None)
+        """
+        initial_state = ChatState(query=query, uuid=uuid)
+        if self.answer_cache is None:
+            return initial_state, None
+        try:
+            initial_state.embedding = await async_generate_embedding(query)
+        except Exception as e:
+            logger.error(f"Error embedding query for the answer cache: {e}")
+            return initial_state, None
+        cached_state = self.answer_cache.lookup(initial_state.embedding, uuid)
+        if cached_state is not None:
+            cached_state.uuid = uuid
+        return initial_state, cached_state
+
+    def _store_cached_answer(self, final_state: ChatState) -> None:
+        """
+        Stores a successful final state in the semantic answer cache.
+        """
+        if self.answer_cache is None or final_state.embedding is None:
+            return
+        if not final_state.final_answer or final_state.final_answer.startswith("Error generating"):
+            return
+        # Only the database route produces SQL; sql_query stays None on the RAG route.
+        intent = final_state.query_intent or ("database_query" if final_state.sql_query is not None else "general_query")
+        if intent == "database_query" and not isinstance(final_state.sql_result, (list, ResultSet)):
+            return
+        final_state.query_intent = intent
+        self.answer_cache.store(final_state.embedding, final_state, intent, final_state.uuid)
+
+
+def _final_event(state: ChatState) -> Dict[str, Any]:
+    return {
+        "event": "final",
+        "answer": state.final_answer,
+        "deeplink": state.deeplink,
+        "sql_query": state.sql_query,
+        "table_used": state.table_used,
+        "query_execution_id": state.query_execution_id,
+    }
+
+
+def _progress_event(node_name: str, update: Dict[str, Any]):
+    """
+    Maps a node's state update to the progress event sent to streaming clients.
+    """
+    if node_name == "similarity_search":
+        tables = update.get("similar_tables") or []
+        return {"event": "tables_found", "tables": [t["table_name"] for t in tables]}
+    if node_name == "generate_sql_query":
+        return {"event": "sql_generated", "sql_query": update.get("sql_query"), "attempt": update.get("attempts", 0)}
+    if node_name == "validate_sql_query":
+        if not update.get("sql_error"):
+            return None
+        return {"event": "sql_retry", "stage": "validation", "error": update.get("sql_error")}
+    if node_name == "guard_sql_query":
+        guard = update.get("sql_guard")
+        if not guard or guard["action"] == "pass":
+            return None
+        return {"event": "sql_guarded", "action": guard["action"], "reasons": guard["reasons"],
+                "sql_query": update.get("sql_query")}
+    if node_name == "execute_sql_query":
+        result = update.get("sql_result")
+        if isinstance(result, (list, ResultSet)):
+            return {"event": "sql_executed", "status": "SUCCEEDED", "row_count": len(result),
+                    "engine": update.get("sql_engine")}
+        return {"event": "sql_executed", "status": "FAILED", "row_count": 0, "detail": result or None,
+                "error": update.get("sql_error")}
+    if node_name == "answer_directly_with_rag":
+        # The RAG chain is not streamed, so the whole answer goes out as one token event.
+        return {"event": "token", "text": update.get("final_answer") or ""}
+    return None
+
+
+def _resolve_speculative(speculative: bool = None) -> bool:
+    if speculative is not None:
+        return speculative
+    return os.getenv("SPECULATIVE_ROUTING", "false").lower() in ("1", "true", "yes")
+
+
+# Process-wide registry of compiled workflows, keyed on the resolved configuration.
+# The compiled graph holds no per-request state, so one instance (and its warm
+# OpenAI connection pool) can serve every request in this worker.
+_workflow_registry: Dict[Tuple[str, str, str, bool], ChatWorkflow] = {}
+_workflow_registry_lock = threading.Lock()
+
+
+def get_chat_workflow(openai_api_key: str = None, text_to_sql_model: str = None, final_answer_model: str = None,
+                      speculative: bool = None) -> ChatWorkflow:
+    """
+    Returns the shared ChatWorkflow for the given configuration, building and
+    compiling it on first use.
+
+    Args:
+        openai_api_key (str, optional): Overrides OPENAI_API_KEY.
+        text_to_sql_model (str, optional): Overrides TEXT_TO_SQL_MODEL.
+        final_answer_model (str, optional): Overrides FINAL_ANSWER_MODEL.
+        speculative (bool, optional): Overrides SPECULATIVE_ROUTING.
+
+    Returns:
+        ChatWorkflow: A compiled workflow reused across requests.
+    """
+    key = (
+        openai_api_key or os.getenv("OPENAI_API_KEY"),
+        text_to_sql_model or os.getenv("TEXT_TO_SQL_MODEL"),
+        final_answer_model or os.getenv("FINAL_ANSWER_MODEL"),
+        _resolve_speculative(speculative),
+    )
+    workflow = _workflow_registry.get(key)
+    if workflow is None:
+        with _workflow_registry_lock:
+            workflow = _workflow_registry.get(key)
+            if workflow is None:
+                logger.info(
+                    f"Creating shared ChatWorkflow (text_to_sql_model={key[1]}, "
+                    f"final_answer_model={key[2]}, speculative={key[3]})"
+                )
+                workflow = ChatWorkflow(*key)
+                _workflow_registry[key] = workflow
+    return workflow
@@ -1,8 +1,34 @@
 import re
+import asyncio
+from contextlib import nullcontext
 from app.schemas.schema import ChatState
-from app.utils.s3_prompts_config import get_prompt
+from app.utils.s3_prompts_config import async_get_prompt
+from app.utils.conversation_summary import extract_keywords
+from app.utils.athena_client import (
+    ATHENA_CHAT_MAX_ROWS,
+    ATHENA_DATABASE,
+    ATHENA_QUERY_TIMEOUT,
+    AthenaQueryTimeout,
+    history_key_for,
+)
+from app.utils.athena_scheduler import PRIORITY_CHAT, AthenaQueueTimeout
+from app.utils.athena_result_set import ResultSet
+from app.utils.sql_guard import REJECT, REWRITE, explain_statement, parse_explain_io
+from app.utils.sql_validator import schema_from_tables, validate_sql
+from app.utils.table_vector_index import TABLE_INDEX
+from app.utils.table_retrieval import (
+    TABLE_RETRIEVAL_CANDIDATES,
+    TABLE_RETRIEVAL_MODE,
+    fuse,
+    knn_query,
+    lexical_query,
+    tables_from_hits,
+)
+from app.utils.metrics import SQL_QUERIES, dependency_timer, observe_node
+from app.utils.state_logging import log_state, summarize_rows, summarize_tables, truncate
 import app.utils as utils
 import datetime
+from langgraph.config import get_stream_writer
 
 class WorkflowNodes:
     def __init__(
@@ -12,152 +38,349 @@ class WorkflowNodes:
         text_to_sql_model: str,
         final_answer_model: str,
         run_athena_query,
-        wait_for_query_to_complete,
-        get_query_results,
+        wait_for_query_execution,
+        get_result_set,
         generate_embedding,
         logger,
+        sql_template_cache=None,
+        result_cache=None,
+        athena_scheduler=None,
+        sql_guard=None,
+        local_sql=None,
+        table_index=None,
+        column_index=None,
     ):
         self.client = client
         self.opensearch_client = opensearch_client
         self.text_to_sql_model = text_to_sql_model
         self.final_answer_model = final_answer_model
         self.run_athena_query = run_athena_query
-        self.wait_for_query_to_complete = wait_for_query_to_complete
-        self.get_query_results = get_query_results
+        self.wait_for_query_execution = wait_for_query_execution
+        self.get_result_set = get_result_set
         self.generate_embedding = generate_embedding
         self.logger = logger
+        # Optional cache of parameterized SQL for repeat questions
+        self.sql_template_cache = sql_template_cache
+        # Optional cache of Athena result rows keyed on the normalized SQL
+        self.result_cache = result_cache
+        # Optional AthenaScheduler bounding the queries this worker has running
+        self.athena_scheduler = athena_scheduler
+        # Optional SqlGuard checking generated SQL before it reaches Athena
+        self.sql_guard = sql_guard
+        # Optional LocalSqlTier answering queries on small tables without Athena
+        self.local_sql = local_sql
+        # Optional TableVectorIndex answering the table search in-process
+        self.table_index = table_index
+        # Optional ColumnIndex trimming large tables to the relevant columns in the SQL prompt
+        self.column_index = column_index
 
+    def _athena_slot(self):
+        """
+        Context manager holding an Athena slot; yields the query timeout left
+        once the slot is granted.
+        """
+        if self.athena_scheduler is None:
+            return nullcontext(ATHENA_QUERY_TIMEOUT)
+        return self.athena_scheduler.slot(PRIORITY_CHAT, ATHENA_QUERY_TIMEOUT)
+
+    @observe_node
     async def process_user_query(self, state: ChatState) -> ChatState:
         self.logger.info("Entering function: process_user_query")
         self.logger.info(f"Processing user query: {state.query}")
-        # (Business logic can be added here)
-        self.logger.info(f"State just before return in process_user_query: {state.model_dump()}")
+        state.keywords = extract_keywords(state.query)
+        log_state(self.logger, "State just before return in process_user_query", state)
         self.logger.info("Exiting function: process_user_query")
         return state
 
+    async def search_similar_tables(self, query: str, embedding=None):
+        """
+        Embeds the query (unless an embedding is given) and runs the kNN table
+        search, in-process when the table vector index is loaded and on
+        OpenSearch otherwise.
+
+        Returns:
+            tuple: (embedding, similar_tables)
+        """
+        if embedding is None:
+            embedding = await self.generate_embedding(query)
+        top_k = 5
+        if TABLE_RETRIEVAL_MODE == "hybrid":
+            return embedding, await self._hybrid_table_search(query, embedding, top_k)
+        if self.table_index is not None:
+            with dependency_timer("table_vector_index", "search"):
+                similar_tables = self.table_index.search(embedding, top_k)
+            if similar_tables is not None:
+                return embedding, similar_tables
+        with dependency_timer("opensearch", "search"):
+            response = await self.opensearch_client.search(index=TABLE_INDEX, body=knn_query(embedding, top_k))
+        return embedding, tables_from_hits(response["hits"]["hits"])
+
+    async def _hybrid_table_search(self, query: str, embedding, top_k: int):
+        """
+        Runs the lexical (BM25) and kNN table searches together, in one
+        msearch round trip (or kNN in-process when the table vector index is
+        loaded), and fuses the two rankings.
+        """
+        candidates = TABLE_RETRIEVAL_CANDIDATES
+        knn_tables = None
+        if self.table_index is not None:
+            with dependency_timer("table_vector_index", "search"):
+                knn_tables = self.table_index.search(embedding, candidates)
+        if knn_tables is None:
+            with dependency_timer("opensearch", "hybrid_search"):
+                response = await self.opensearch_client.msearch(body=[
+                    {"index": TABLE_INDEX}, knn_query(embedding, candidates),
+                    {"index": TABLE_INDEX}, lexical_query(query, candidates),
+                ])
+            knn_response, lexical_response = response["responses"]
+            if "error" in knn_response:
+                raise RuntimeError(f"kNN table search failed: {knn_response['error']}")
+            knn_tables = tables_from_hits(knn_response["hits"]["hits"])
+        else:
+            with dependency_timer("opensearch", "lexical_search"):
+                lexical_response = await self.opensearch_client.search(
+                    index=TABLE_INDEX, body=lexical_query(query, candidates)
+                )
+        if "error" in lexical_response:
+            # The vector ranking alone is still a usable answer
+            self.logger.warning(f"Lexical table search failed; using kNN only: {lexical_response['error']}")
+            lexical_tables = []
+        else:
+            lexical_tables = tables_from_hits(lexical_response["hits"]["hits"])
+        return fuse(knn_tables, lexical_tables, top_k)
+
+    @observe_node
     async def similarity_search(self, state: ChatState) -> ChatState:
         self.logger.info("Entering function: similarity_search")
-        self.logger.info("Generating embedding and performing cosine similarity search on OpenSearch.")
-        try:
-            embedding = self.generate_embedding(state.query)
-            top_k = 5
-            search_body = {
-                "size": top_k,
-                "query": {
-                    "knn": {
-                        "embedding": {
-                            "vector": embedding,
-                            "k": top_k
-                        }
-                    }
-                }
-            }
-            response = self.opensearch_client.search(index="data_service_index", body=search_body)
-            similar_tables = []
-            for hit in response["hits"]["hits"]:
-                similar_tables.append({
-                    "table_name": hit["_source"]["table_name"],
-                    "description": hit["_source"]["table_description"],
-                    "score": hit["_score"]
-                })
-            state.similar_tables = similar_tables
-            self.logger.info(f"Found similar tables: {similar_tables}")
-        except Exception as e:
-            self.logger.error(f"Error during similarity search: {e}")
-            state.similar_tables = []
+        if state.similar_tables is not None:
+            # Already fetched speculatively while the query was being classified.
+            self.logger.info("Using similar tables fetched during speculative routing.")
+        else:
+            self.logger.info("Generating embedding and performing cosine similarity search on OpenSearch.")
+            try:
+                state.embedding, state.similar_tables = await self.search_similar_tables(state.query, state.embedding)
+                self.logger.opt(lazy=True).info("Found similar tables: {}", lambda: summarize_tables(state.similar_tables))
+            except Exception as e:
+                self.logger.error(f"Error during similarity search: {e}")
+                state.similar_tables = []
     
-        self.logger.info(f"State just before return in similarity_search: {state.model_dump()}")
+        log_state(self.logger, "State just before return in similarity_search", state)
         self.logger.info("Exiting function: similarity_search")
         return state
 
+    async def build_sql_prompt(self, state: ChatState, today_date: str, correcting: bool = False) -> str:
+        """
+        Formats the text-to-SQL prompt for the state's question and tables.
+        With a column index, large tables show only the columns relevant to
+        the question; a correction shows the full DDL, since the failure may
+        be a column that was left out.
+        """
+        similar_tables = state.similar_tables
+        if similar_tables and self.column_index is not None and not correcting:
+            try:
+                similar_tables = await self.column_index.compact_tables(state.query, state.embedding, similar_tables)
+            except Exception as e:
+                self.logger.warning(f"Column retrieval failed; using the full table schema: {e}")
+        if similar_tables:
+            combined_schema = "\n".join(
+                [f"Table: {t['table_name']}\nDescription: {t['description']}" for t in similar_tables]
+            )
+        else:
+            combined_schema = "No relevant table schema available."
+
+        member_filter = f"id = '{state.uuid}'" if state.uuid else "/* id filter missing */"
+
+        prompt_template = await async_get_prompt('generate_sql_query')
+        # Format the template with the necessary dynamic values.
+        prompt = prompt_template.format(
+            combined_schema=combined_schema,
+            query=state.query,
+            member_filter=member_filter,
+            today_date=today_date
+        )
+        if correcting:
+            prompt += (
+                "\n\nThe previous SQL query failed:\n"
+                f"{state.sql_query}\n\n"
+                f"Error:\n{state.sql_error}\n\n"
+                "Return a corrected SQL query that uses only the tables and columns listed above."
+            )
+        return prompt
+
+    @observe_node
     async def generate_sql_query(self, state: ChatState) -> ChatState:
         self.logger.info("Entering function: generate_sql_query")
         self.logger.info("Generating SQL query using OpenAI.")
         try:
-            if state.similar_tables:
-                combined_schema = "\n".join(
-                    [f"Table: {t['table_name']}\nDescription: {t['description']}" for t in state.similar_tables]
-                )
-            else:
-                combined_schema = "No relevant table schema available."
-        
-            member_filter = f"id = '{state.uuid}'" if state.uuid else "/* id filter missing */"
-
             # add today's date
             today_date = datetime.datetime.now().strftime("%Y-%m-%d")
             self.logger.info(f"Today's date: {today_date}")
-            
-            prompt_template = get_prompt('generate_sql_query')
-            # Format the template with the necessary dynamic values.
-            prompt = prompt_template.format(
-                combined_schema=combined_schema,
-                query=state.query,
-                member_filter=member_filter,
-                today_date=today_date
-            )
 
-            self.logger.info(f"SQL PROMPT:==================>> \n\n{prompt}")
-            response = self.client.chat.completions.create(
-                model=self.text_to_sql_model,
-                messages=[{"role": "user", "content": prompt}]
-            )
+            # A retry after a validation or Athena error goes back to the LLM with the error
+            correcting = bool(state.sql_error and state.sql_query)
+
+            if self.sql_template_cache is not None and state.similar_tables and not correcting:
+                cached_sql = self.sql_template_cache.get(state.query, state.similar_tables, state.uuid, today_date)
+                if cached_sql:
+                    state.sql_query = cached_sql
+                    self.logger.opt(lazy=True).info("Reusing cached SQL query: {}", lambda: truncate(cached_sql))
+                    self.logger.info("Exiting function: generate_sql_query")
+                    return state
+
+            if correcting:
+                state.attempts += 1
+                self.logger.info(f"Correcting SQL query (attempt {state.attempts}): {truncate(state.sql_error)}")
+            prompt = await self.build_sql_prompt(state, today_date, correcting)
+
+            self.logger.opt(lazy=True).debug("SQL PROMPT:==================>> \n\n{}", lambda: prompt)
+            with dependency_timer("openai", "text_to_sql"):
+                response = await self.client.chat.completions.create(
+                    model=self.text_to_sql_model,
+                    messages=[{"role": "user", "content": prompt}]
+                )
             sql_query = response.choices[0].message.content
             sql_query = sql_query.replace("```sql", "").replace("```", "")
             state.sql_query = sql_query
-            self.logger.info(f"Generated SQL query: {sql_query}")
+            self.logger.opt(lazy=True).info("Generated SQL query: {}", lambda: truncate(sql_query))
         except Exception as e:
             self.logger.error(f"Error generating SQL query: {e}")
             state.sql_query = ""
         
-        self.logger.info(f"State just before return in generate_sql_query: {state.model_dump()}")
+        log_state(self.logger, "State just before return in generate_sql_query", state)
         self.logger.info("Exiting function: generate_sql_query")
         return state
 
+    @observe_node
+    async def validate_sql_query(self, state: ChatState) -> ChatState:
+        """
+        Checks the generated SQL against the DDL of the selected tables
+        (syntax, table and column names) before any Athena round trip. Errors
+        are stored in state.sql_error for the correction loop; the check is
+        advisory, so a query that still fails after the last correction runs
+        anyway.
+        """
+        self.logger.info("Entering function: validate_sql_query")
+        state.sql_error = None
+        if state.sql_query:
+            try:
+                errors = validate_sql(state.sql_query, schema_from_tables(state.similar_tables))
+                if errors:
+                    state.sql_error = "\n".join(errors)
+                    self.logger.warning(f"SQL validation failed: {state.sql_error}")
+            except Exception as e:
+                self.logger.error(f"Error validating SQL query: {e}")
+        self.logger.info("Exiting function: validate_sql_query")
+        return state
+
+    async def estimate_scan_bytes(self, sql: str):
+        """
+        Runs EXPLAIN (TYPE IO) for the query on Athena and returns the
+        estimated bytes scanned, or None if Athena has no estimate.
+        """
+        async with self._athena_slot() as timeout:
+            query_execution_id = await self.run_athena_query(explain_statement(sql))
+            execution = await self.wait_for_query_execution(query_execution_id, timeout)
+        if not execution.succeeded:
+            self.logger.warning(f"EXPLAIN did not succeed: {execution.state} ({execution.state_change_reason})")
+            return None
+        plan = await self.get_result_set(query_execution_id)
+        if not plan.columns:
+            return None
+        return parse_explain_io("\n".join(str(line) for line in plan.column(plan.columns[0])))
+
+    @observe_node
+    async def guard_sql_query(self, state: ChatState) -> ChatState:
+        self.logger.info("Entering function: guard_sql_query")
+        if self.sql_guard is not None and state.sql_query:
+            try:
+                decision = await self.sql_guard.review(state.sql_query, state.uuid, self.estimate_scan_bytes)
+                state.sql_guard = decision.to_dict()
+                if decision.action == REWRITE:
+                    state.sql_query = decision.sql
+                elif decision.action == REJECT:
+                    state.sql_result = f"Query rejected: {'; '.join(decision.reasons)}"
+                self.logger.info(f"SQL guard decision: {decision.action} {decision.reasons}")
+            except Exception as e:
+                self.logger.error(f"Error in SQL guard: {e}")
+        log_state(self.logger, "State just before return in guard_sql_query", state)
+        self.logger.info("Exiting function: guard_sql_query")
+        return state
+
+    @observe_node
     async def execute_sql_query(self, state: ChatState) -> ChatState:
         self.logger.info("Entering function: execute_sql_query")
         self.logger.info("Executing SQL query on Athena using existing athena_client logic.")
         try:
+            # Nothing from an earlier attempt may survive a retry answered by the cache or locally
+            state.sql_error = None
+            state.query_execution_id = None
+            state.sql_statistics = None
             if state.sql_query:
-                query_execution_id = self.run_athena_query(state.sql_query)
-                state_result = self.wait_for_query_to_complete(query_execution_id)
+                result, engine, execution = None, "athena", None
+                if self.result_cache is not None:
+                    result, engine = self.result_cache.get(state.sql_query, ATHENA_DATABASE, ATHENA_CHAT_MAX_ROWS), "cache"
+                if result is None and self.local_sql is not None:
+                    result, engine = await self.local_sql.try_execute(state.sql_query), "local"
+                if result is not None:
+                    state_result = 'SUCCEEDED'
+                else:
+                    engine = "athena"
+                    async with self._athena_slot() as timeout:
+                        query_execution_id = await self.run_athena_query(state.sql_query)
+                        execution = await self.wait_for_query_execution(
+                            query_execution_id, timeout, history_key=history_key_for(state.sql_query)
+                        )
+                    state.sql_statistics = execution.statistics
+                    state.query_execution_id = query_execution_id
+                    state_result = execution.state
                 if state_result != 'SUCCEEDED':
-                    self.logger.error(f"Query did not succeed: {state_result}")
+                    reason = execution.state_change_reason if execution is not None else None
+                    self.logger.error(f"Query did not succeed: {state_result} ({reason})")
                     state.sql_result = f"Query failed with state: {state_result}"
+                    state.sql_error = reason
                 else:
-                    result = self.get_query_results(query_execution_id)
-                    
-                    # Attempt to extract the deeplink from the SQL result.
-                    try:
-                        if isinstance(result, list) and result:
-                            # Extract the deeplink from the first row if available
-                            first_row = result[0]
-                            deeplink_val = first_row.get("deeplink")
-                            state.deeplink = deeplink_val if deeplink_val is not None else None
-                        else:
-                            state.deeplink = None
-                        
-                        # Remove the 'deeplink' key from all rows to avoid passing it to final answer generation.
-                        if isinstance(result, list):
-                            for row in result:
-                                if "deeplink" in row:
-                                    del row["deeplink"]
-                    except Exception as deeplink_error:
-                        self.logger.error(f"Error extracting deeplink: {deeplink_error}")
-                        state.deeplink = None
-                        
+                    if result is None:
+                        # Only a bounded prefix is fetched; it all ends up in the answer prompt
+                        result = await self.get_result_set(
+                            query_execution_id, max_rows=ATHENA_CHAT_MAX_ROWS, output_location=execution.output_location
+                        )
+                        if len(result) == ATHENA_CHAT_MAX_ROWS:
+                            self.logger.warning(f"SQL result truncated to the first {ATHENA_CHAT_MAX_ROWS} rows.")
+                        if self.result_cache is not None:
+                            self.result_cache.put(
+                                state.sql_query, ATHENA_DATABASE, result, ATHENA_CHAT_MAX_ROWS, execution.statistics
+                            )
+                    if self.sql_template_cache is not None and state.similar_tables:
+                        # Only SQL that ran successfully is kept as a template
+                        today_date = datetime.datetime.now().strftime("%Y-%m-%d")
+                        self.sql_template_cache.put(
+                            state.query, state.similar_tables, state.uuid, today_date, state.sql_query
+                        )
+
+                    # The deeplink is returned separately; it is projected out so it is
+                    # not passed to final answer generation.
+                    state.deeplink = result.first("deeplink")
+                    result = result.drop("deeplink")
                     state.sql_result = result
-                self.logger.info(f"SQL execution result: {state.sql_result}")
+                state.sql_engine = engine
+                SQL_QUERIES.labels(engine=engine).inc()
+                self.logger.info(f"SQL query answered by: {engine}")
+                self.logger.opt(lazy=True).info("SQL execution result: {}", lambda: summarize_rows(state.sql_result))
             else:
                 self.logger.error("No SQL query to execute.")
                 state.sql_result = ""
+        except (AthenaQueryTimeout, AthenaQueueTimeout) as e:
+            self.logger.error(f"Error executing SQL query: {e}")
+            state.sql_result = "Query failed with state: TIMED_OUT"
         except Exception as e:
             self.logger.error(f"Error executing SQL query: {e}")
             state.sql_result = ""
         
-        self.logger.info(f"State just before return in execute_sql_query: {state.model_dump()}")
+        log_state(self.logger, "State just before return in execute_sql_query", state)
         self.logger.info("Exiting function: execute_sql_query")
         return state
 
+    @observe_node
     async def fetch_table_prompt(self, state: ChatState) -> ChatState:
         self.logger.info("Entering function: fetch_table_prompt")
         self.logger.info("Fetching table prompt from s3 bucket.")
@@ -172,7 +395,7 @@ class WorkflowNodes:
                     state.table_used = table_name
             
             if table_name:
-                prompt = get_prompt(table_name)
+                prompt = await async_get_prompt(table_name)
                 if not prompt:
                     self.logger.error(f"No prompt found in S3 for table '{table_name}'. Using default prompt.")
                     prompt = "Default table prompt"
@@ -183,45 +406,60 @@ class WorkflowNodes:
                 prompt = "\n".join(prompt)
             
             state.table_prompt = prompt
-            self.logger.info(f"Fetched table prompt: {state.table_prompt}")
+            self.logger.opt(lazy=True).info("Fetched table prompt: {}", lambda: truncate(state.table_prompt))
         except Exception as e:
             self.logger.error(f"Error fetching table prompt: {e}")
             state.table_prompt = ""
     
-        self.logger.info(f"State before return in fetch_table_prompt: {state.model_dump()}")
+        log_state(self.logger, "State before return in fetch_table_prompt", state)
         self.logger.info("Exiting function: fetch_table_prompt")
         return state
 
+    @observe_node
     async def generate_final_answer(self, state: ChatState) -> ChatState:
         self.logger.info("Entering function: generate_final_answer")
         self.logger.info("Generating final answer using LangGraph flow.")
         try:
-            prompt_template = get_prompt('generate_final_answer')
+            prompt_template = await async_get_prompt('generate_final_answer')
             # Format the prompt template with dynamic state values.
             prompt = prompt_template.format(
                 query=state.query,
                 sql_query=state.sql_query,
-                sql_result=state.sql_result,
+                sql_result=state.sql_result.to_text() if isinstance(state.sql_result, ResultSet) else state.sql_result,
                 table_prompt=state.table_prompt
             )
     
-            response = self.client.chat.completions.create(
-                model=self.final_answer_model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.02
-            )
-            final_answer = response.choices[0].message.content
+            # Stream the completion so tokens can be forwarded to SSE clients as
+            # they arrive; the writer is a no-op unless custom streaming is on.
+            writer = get_stream_writer()
+            chunks = []
+            with dependency_timer("openai", "final_answer"):
+                stream = await self.client.chat.completions.create(
+                    model=self.final_answer_model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.02,
+                    stream=True
+                )
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        chunks.append(delta)
+                        writer({"event": "token", "text": delta.replace("```", "")})
+            final_answer = "".join(chunks)
             final_answer = final_answer.replace("```", "")
             state.final_answer = final_answer
-            self.logger.info(f"Final answer generated: {final_answer}")
+            self.logger.opt(lazy=True).info("Final answer generated: {}", lambda: truncate(final_answer))
         except Exception as e:
             self.logger.error(f"Error generating final answer: {e}")
             state.final_answer = "Error generating final answer."
         
-        self.logger.info(f"State just before return in generate_final_answer: {state.model_dump()}")
+        log_state(self.logger, "State just before return in generate_final_answer", state)
         self.logger.info("Exiting function: generate_final_answer")
         return state
 
+    @observe_node
     async def answer_directly_with_rag(self, state: ChatState) -> ChatState:
         """
         New node to handle general/RAG queries. It bypasses the SQL flow and
@@ -231,12 +469,13 @@ class WorkflowNodes:
         try:
             from app.modules.rag import GenerateChat
             rag_generator = GenerateChat()
-            answer = rag_generator.answer_question_with_rag_fusion(state.query)
+            # The RAG fusion chain is synchronous; run it off the event loop.
+            answer = await asyncio.to_thread(rag_generator.answer_question_with_rag_fusion, state.query)
             state.final_answer = answer
             self.logger.info("Generated answer using RAG fusion.")
         except Exception as e:
             self.logger.error(f"Error in answer_directly_with_rag: {e}")
             state.final_answer = "Error generating answer with RAG fusion."
-        self.logger.info(f"State just before return in answer_directly_with_rag: {state.model_dump()}")
+        log_state(self.logger, "State just before return in answer_directly_with_rag", state)
         self.logger.info("Exiting function: answer_directly_with_rag")
         return state
\ No newline at end of file
@@ -1,5 +1,6 @@
 import os
 import sys
+import time
 import warnings
 from contextlib import asynccontextmanager
 from datetime import datetime
@@ -11,6 +12,12 @@ from loguru import logger
 
 from app.routes import routes
 from app.routes import prompt_routes  # Newly created router
+from app.langgraph.chat_flow import get_chat_workflow
+from app.modules.opensearch_clients import close_opensearch_clients
+from app.utils.local_sql_tier import LOCAL_SQL_ENABLED, local_sql_tier
+from app.utils.table_vector_index import TABLE_VECTOR_INDEX_ENABLED, table_vector_index
+from app.utils.metrics import REQUEST_LATENCY
+from app.utils.state_logging import enable_full_state_logging_for_request
 
 request_id_header = "X-Request-ID"
 
@@ -54,15 +61,14 @@ def initialize_logger():
     )
 
     logger.remove()
+    # Add default value for request_id so format doesn't fail outside a request
+    logger.configure(extra={"request_id": "-"})
     logger.add(
         sys.stdout,
         format=logger_format,
         level=log_level,
         enqueue=True,
     )
-
-    # Add default value for request_id so format doesn't fail
-    logger = logger.bind(request_id="-")
     return logger
 
 
@@ -73,6 +79,12 @@ logger = initialize_logger()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("App is starting up...")
+    # Build and compile the default chat workflow once per worker
+    get_chat_workflow()
+    if LOCAL_SQL_ENABLED:
+        local_sql_tier.start()
+    if TABLE_VECTOR_INDEX_ENABLED:
+        await table_vector_index.start()
     try:
         yield
     except Exception as e:
@@ -80,6 +92,9 @@ async def lifespan(app: FastAPI):
         raise
     finally:
         logger.info("App is shutting down...")
+        await local_sql_tier.stop()
+        await table_vector_index.stop()
+        await close_opensearch_clients()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -96,18 +111,31 @@ app.add_middleware(
 async def add_request_id(request: Request, call_next):
     request_id = request.headers.get(request_id_header, str(uuid4()))
     request.state.request_id = request_id
-    with logger.bind(request_id=request_id):
+    enable_full_state_logging_for_request(request.headers)
+    with logger.contextualize(request_id=request_id):
         logger.info(f"Incoming request: {request.method} {request.url.path}")
+        start = time.perf_counter()
         try:
             response = await call_next(request)
         except Exception as exc:  # noqa: BLE001
             logger.exception(f"Unhandled error: {exc}")
+            _observe_request(request, start, 500)
             raise
+        _observe_request(request, start, response.status_code)
         logger.info(
             f"Completed request {request.method} {request.url.path} with status {response.status_code}"
         )
         return response
 
+def _observe_request(request: Request, start: float, status_code: int) -> None:
+    # Label by route template (e.g. /prompts/{prompt_name}) to keep cardinality bounded
+    route = request.scope.get("route")
+    route_path = getattr(route, "path", "unmatched")
+    REQUEST_LATENCY.labels(
+        method=request.method, route=route_path, status=str(status_code)
+    ).observe(time.perf_counter() - start)
+
+
 app.include_router(routes.router)
 app.include_router(prompt_routes.router)
 
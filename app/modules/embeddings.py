@@ -2,52 +2,67 @@ import os
 from dotenv import load_dotenv
 from langchain_community.vectorstores import OpenSearchVectorSearch
 from langchain_openai import OpenAIEmbeddings
-from opensearchpy import OpenSearch, OpenSearchException, RequestsHttpConnection
+from opensearchpy import OpenSearchException
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from app.modules.opensearch_clients import (
+    DOCS_CLUSTER,
+    OPENSEARCH_CLUSTERS,
+    get_async_opensearch_client,
+    get_opensearch_client,
+)
  
 load_dotenv()
+
+INDEX_NAME = "agent-platform-coda-service"
+
+# Vector stores shared by every handle_embeddings instance, by index name
+_vectorstores = {}
+
+
+def get_shared_vectorstore(index_name: str = INDEX_NAME):
+    """
+    Returns the process-wide vector store for `index_name`, created on first
+    use. Its clients are replaced with the shared docs-cluster clients, so
+    the store does not open a pool of its own.
+    """
+    vectorstore = _vectorstores.get(index_name)
+    if vectorstore is not None:
+        return vectorstore
+    settings = OPENSEARCH_CLUSTERS[DOCS_CLUSTER]
+    try:
+        vectorstore = OpenSearchVectorSearch(
+            embedding_function=OpenAIEmbeddings(
+                openai_api_key=os.getenv("OPENAI_API_KEY"),
+                model=os.getenv("EMBEDDING_MODEL")
+            ),
+            index_name=index_name,
+            http_auth=settings["http_auth"],
+            opensearch_url=settings["hosts"],
+            text_field="page_content",
+            metadata_field="metadata",
+            vector_field="vector_field",
+            search_type="painless_scripting",
+        )
+    except OpenSearchException as e:
+        print(f"Error creating vectorstore: {str(e)}")
+        return None
+    vectorstore.client = get_opensearch_client(DOCS_CLUSTER)
+    vectorstore.async_client = get_async_opensearch_client(DOCS_CLUSTER)
+    _vectorstores[index_name] = vectorstore
+    return vectorstore
+
  
 class handle_embeddings:
     def __init__(self):
-        self.index_name = "agent-platform-coda-service"
-        self.embedding_model = OpenAIEmbeddings(
-            openai_api_key=os.getenv("OPENAI_API_KEY"),
-            model=os.getenv("EMBEDDING_MODEL")
-        )
+        self.index_name = INDEX_NAME
         self.vectorstore = self.get_vectorstore()
-        self.client = OpenSearch(
-            hosts=os.getenv("CLUSTER_URL"),
-            http_auth=(os.getenv("USERNAME"),os.getenv("PASSWORD")),
-            verify_certs=True,
-            timeout=60,
-            max_retries=3,
-            retry_on_timeout=True,
-            connection_class=RequestsHttpConnection
-        )
+        self.embedding_model = self.vectorstore.embedding_function if self.vectorstore else None
+        self.client = get_opensearch_client(DOCS_CLUSTER)
  
     def get_vectorstore(self):
-        try:
-            return OpenSearchVectorSearch(
-                embedding_function=self.embedding_model,
-                index_name=self.index_name,
-                http_auth=(os.getenv("USERNAME"), os.getenv("PASSWORD")),
-                use_ssl=True,
-                verify_certs=True,
-                ssl_assert_hostname=False,
-                ssl_show_warn=False,
-                opensearch_url=os.getenv("CLUSTER_URL"),
-                text_field="page_content",
-                metadata_field="metadata",
-                vector_field="vector_field",
-                search_type="painless_scripting",
-                timeout=60,
-                retry_on_timeout=True,
-                max_retries=3
-            )
-        except OpenSearchException as e:
-            print(f"Error creating vectorstore: {str(e)}")
-            return None
+        return get_shared_vectorstore(self.index_name)
    
     def create_index_body(self, index_name):
         try:
@@ -0,0 +1,203 @@
+import os
+import threading
+from typing import Dict, Tuple
+
+import aiohttp
+from dotenv import load_dotenv
+from loguru import logger
+from opensearchpy import AIOHttpConnection, AsyncOpenSearch, OpenSearch, Urllib3HttpConnection
+
+from app.utils.metrics import (
+    OPENSEARCH_CONNECTIONS_OPENED,
+    OPENSEARCH_POOL_REQUESTS,
+    OPENSEARCH_POOL_SATURATED,
+    OPENSEARCH_POOL_SIZE,
+    OPENSEARCH_REQUESTS_IN_FLIGHT,
+)
+
+load_dotenv()
+
+# ------------------------ Configuration ------------------------
+
+# Table catalog cluster (table descriptions and embeddings)
+OPENSEARCH_HOST = os.getenv("OPENSEARCH_HOST")
+OPENSEARCH_PORT = os.getenv("OPENSEARCH_PORT")
+OPENSEARCH_USER = os.getenv("OPENSEARCH_USER")
+OPENSEARCH_PASS = os.getenv("OPENSEARCH_PASS")
+
+# Document cluster behind the RAG vector store
+CLUSTER_URL = os.getenv("CLUSTER_URL")
+CLUSTER_USERNAME = os.getenv("USERNAME")
+CLUSTER_PASSWORD = os.getenv("PASSWORD")
+
+# Connections per sync client. Sync calls run in the default thread pool
+# (asyncio.to_thread), so the default matches its size: every thread can hold
+# a pooled connection and none has to open a throwaway one.
+OPENSEARCH_POOL_MAXSIZE = int(os.getenv("OPENSEARCH_POOL_MAXSIZE", str(min(32, (os.cpu_count() or 1) + 4))))
+# Connections per async client; further requests queue for a free one
+OPENSEARCH_ASYNC_POOL_MAXSIZE = int(os.getenv("OPENSEARCH_ASYNC_POOL_MAXSIZE", "20"))
+
+CATALOG_CLUSTER = "catalog"
+DOCS_CLUSTER = "docs"
+
+OPENSEARCH_CLUSTERS = {
+    CATALOG_CLUSTER: {
+        "hosts": [{"host": OPENSEARCH_HOST, "port": OPENSEARCH_PORT}],
+        "http_auth": (OPENSEARCH_USER, OPENSEARCH_PASS),
+        "http_compress": True,
+        "use_ssl": True,
+        "verify_certs": True,
+        "timeout": 300,
+    },
+    DOCS_CLUSTER: {
+        "hosts": CLUSTER_URL,
+        "http_auth": (CLUSTER_USERNAME, CLUSTER_PASSWORD),
+        "use_ssl": True,
+        "verify_certs": True,
+        "ssl_assert_hostname": False,
+        "ssl_show_warn": False,
+        "timeout": 60,
+        "max_retries": 3,
+        "retry_on_timeout": True,
+    },
+}
+
+
+class PooledUrllib3Connection(Urllib3HttpConnection):
+    """
+    Urllib3HttpConnection that reports its pool's use: requests, connections
+    opened (the rest reused a pooled one), requests in flight, and requests
+    that found every pooled connection busy. urllib3 then opens a connection
+    it discards afterwards, so a steady saturation count means the pool is
+    too small.
+    """
+
+    def __init__(self, *args, pool_cluster: str = "default", **kwargs):
+        super().__init__(*args, **kwargs)
+        self._labels = {"cluster": pool_cluster, "client": "sync"}
+        self._maxsize = kwargs.get("pool_maxsize") or 1
+        self._in_flight = 0
+        self._opened = 0
+        self._counter_lock = threading.Lock()
+
+    def perform_request(self, *args, **kwargs):
+        with self._counter_lock:
+            saturated = self._in_flight >= self._maxsize
+            self._in_flight += 1
+        OPENSEARCH_POOL_REQUESTS.labels(**self._labels).inc()
+        if saturated:
+            OPENSEARCH_POOL_SATURATED.labels(**self._labels).inc()
+        in_flight = OPENSEARCH_REQUESTS_IN_FLIGHT.labels(**self._labels)
+        in_flight.inc()
+        try:
+            return super().perform_request(*args, **kwargs)
+        finally:
+            in_flight.dec()
+            with self._counter_lock:
+                self._in_flight -= 1
+                # urllib3 counts every connection the pool has opened
+                total = self.pool.num_connections if self.pool is not None else self._opened
+                opened, self._opened = max(total - self._opened, 0), max(total, self._opened)
+            if opened:
+                OPENSEARCH_CONNECTIONS_OPENED.labels(**self._labels).inc(opened)
+
+
+class PooledAIOHttpConnection(AIOHttpConnection):
+    """
+    AIOHttpConnection that reports the same pool metrics, taken from
+    aiohttp's connection tracing. A saturated request waits for a free
+    connection.
+    """
+
+    def __init__(self, *args, pool_cluster: str = "default", **kwargs):
+        super().__init__(*args, **kwargs)
+        self._labels = {"cluster": pool_cluster, "client": "async"}
+
+    async def _create_aiohttp_session(self) -> None:
+        await super()._create_aiohttp_session()
+        labels = self._labels
+
+        async def on_connection_opened(session, context, params):
+            OPENSEARCH_CONNECTIONS_OPENED.labels(**labels).inc()
+
+        async def on_connection_queued(session, context, params):
+            OPENSEARCH_POOL_SATURATED.labels(**labels).inc()
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(on_connection_opened)
+        trace_config.on_connection_queued_start.append(on_connection_queued)
+        trace_config.freeze()
+        self.session.trace_configs.append(trace_config)
+
+    async def perform_request(self, *args, **kwargs):
+        OPENSEARCH_POOL_REQUESTS.labels(**self._labels).inc()
+        in_flight = OPENSEARCH_REQUESTS_IN_FLIGHT.labels(**self._labels)
+        in_flight.inc()
+        try:
+            return await super().perform_request(*args, **kwargs)
+        finally:
+            in_flight.dec()
+
+
+_clients: Dict[Tuple[str, str], object] = {}
+_clients_lock = threading.Lock()
+
+
+def _get_client(cluster: str, kind: str):
+    key = (cluster, kind)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            settings = OPENSEARCH_CLUSTERS[cluster]
+            if kind == "sync":
+                client_class, connection_class, pool_maxsize = OpenSearch, PooledUrllib3Connection, OPENSEARCH_POOL_MAXSIZE
+            else:
+                client_class, connection_class, pool_maxsize = (
+                    AsyncOpenSearch, PooledAIOHttpConnection, OPENSEARCH_ASYNC_POOL_MAXSIZE
+                )
+            client = client_class(
+                **settings,
+                connection_class=connection_class,
+                pool_maxsize=pool_maxsize,
+                pool_cluster=cluster,
+            )
+            OPENSEARCH_POOL_SIZE.labels(cluster=cluster, client=kind).set(pool_maxsize)
+            _clients[key] = client
+            logger.info(f"Created shared {kind} OpenSearch client for the {cluster} cluster ({pool_maxsize} connections).")
+    return client
+
+
+def get_opensearch_client(cluster: str = CATALOG_CLUSTER) -> OpenSearch:
+    """
+    Returns the process-wide sync client for `cluster` ("catalog" or
+    "docs"), created on first use. All callers share its connection pool.
+    """
+    return _get_client(cluster, "sync")
+
+
+def get_async_opensearch_client(cluster: str = CATALOG_CLUSTER) -> AsyncOpenSearch:
+    """
+    Returns the process-wide async client for `cluster`, for the LangGraph
+    nodes and other code running on the event loop.
+    """
+    return _get_client(cluster, "async")
+
+
+async def close_opensearch_clients() -> None:
+    """
+    Closes every shared client; called from the application lifespan.
+    """
+    with _clients_lock:
+        clients = list(_clients.items())
+        _clients.clear()
+    for (cluster, kind), client in clients:
+        try:
+            if kind == "async":
+                await client.close()
+            else:
+                client.close()
+        except Exception as e:
+            logger.warning(f"Error closing the {kind} OpenSearch client for {cluster}: {e}")
@@ -1,40 +1,28 @@
 import os
 import boto3
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
-from opensearchpy import (
-    OpenSearch,
-    Urllib3AWSV4SignerAuth,
-    Urllib3HttpConnection,
-    exceptions as opensearch_exceptions,
-)
+from opensearchpy import exceptions as opensearch_exceptions
 from loguru import logger
 
+from app.modules.opensearch_clients import CATALOG_CLUSTER, get_async_opensearch_client, get_opensearch_client
+from app.utils.metrics import observe_dependency
+
 # Load Credentials
 load_dotenv()
 
 # ---------- Configuration ----------
 
-# OpenSearch connection settings
-OPENSEARCH_HOST = os.getenv("OPENSEARCH_HOST")
-OPENSEARCH_PORT = os.getenv("OPENSEARCH_PORT")
-OPENSEARCH_USER = os.getenv("OPENSEARCH_USER")
-OPENSEARCH_PASS = os.getenv("OPENSEARCH_PASS")
 OPENSEARCH_INDEX = os.getenv("OPENSEARCH_INDEX")
 
 
 # ---------- Initialize Clients ----------
 
-# Initialize the OpenSearch client with basic authentication (user/password)
-opensearch_client = OpenSearch(
-    hosts=[{'host': OPENSEARCH_HOST, 'port': OPENSEARCH_PORT}],
-    http_compress=True,
-    http_auth=(OPENSEARCH_USER, OPENSEARCH_PASS),  # Using user/password authentication
-    use_ssl=True,
-    verify_certs=True,
-    connection_class=Urllib3HttpConnection,
-    pool_maxsize=20,
-    timeout=300,
-)
+# Shared clients for the table catalog cluster; every module uses the same pools
+opensearch_client = get_opensearch_client(CATALOG_CLUSTER)
+
+# Async client for the LangGraph nodes, so searches do not block the event loop
+async_opensearch_client = get_async_opensearch_client(CATALOG_CLUSTER)
 
 # Check connection to OpenSearch
 try:
@@ -81,6 +69,7 @@ def create_index_if_not_exists(index_name: str, embedding_dimension: int):
         raise
 
 
+@observe_dependency("opensearch")
 def store_table_embedding_to_opensearch(table_name: str, table_description: str, embedding: list):
     """
     Stores the table metadata (DDL) and embedding in OpenSearch.
@@ -131,3 +120,56 @@ def store_table_embedding_to_opensearch(table_name: str, table_description: str,
     except opensearch_exceptions.OpenSearchException as e:
         logger.error(f"Error storing or updating embedding in OpenSearch: {e}")
         raise
+
+
+@observe_dependency("opensearch", "bulk")
+def bulk_store_table_embeddings(documents: List[dict]) -> Dict[str, Optional[str]]:
+    """
+    Upserts many table documents with one _bulk request, using the table name
+    as the document id so a write never needs a search first. Documents that
+    were indexed earlier under a generated id are deleted in the same request,
+    leaving one document per table.
+
+    Args:
+        documents (list): Dicts with table_name, table_description and embedding
+
+    Returns:
+        dict: table_name -> None on success, or the error reported for it
+    """
+    if not documents:
+        return {}
+    try:
+        create_index_if_not_exists(OPENSEARCH_INDEX, len(documents[0]["embedding"]))
+        table_names = [document["table_name"] for document in documents]
+        legacy = opensearch_client.search(
+            index=OPENSEARCH_INDEX,
+            body={"size": 10000, "_source": ["table_name"], "query": {"terms": {"table_name": table_names}}},
+        )
+        actions = []
+        for hit in legacy["hits"]["hits"]:
+            if hit["_id"] != hit["_source"]["table_name"]:
+                actions.append({"delete": {"_index": OPENSEARCH_INDEX, "_id": hit["_id"]}})
+        for document in documents:
+            actions.append({"index": {"_index": OPENSEARCH_INDEX, "_id": document["table_name"]}})
+            actions.append({
+                "table_name": document["table_name"],
+                "table_description": document["table_description"],
+                "embedding": document["embedding"],
+            })
+        response = opensearch_client.bulk(body=actions)
+    except opensearch_exceptions.OpenSearchException as e:
+        logger.error(f"Error bulk storing table embeddings in OpenSearch: {e}")
+        raise
+
+    results = {}
+    for item in response["items"]:
+        operation, outcome = next(iter(item.items()))
+        if operation != "index":
+            continue
+        error = outcome.get("error")
+        results[outcome["_id"]] = None if error is None else f"{error.get('type')}: {error.get('reason')}"
+    logger.info(
+        f"Bulk stored {sum(error is None for error in results.values())}/{len(documents)} table embeddings "
+        f"in OpenSearch (took {response.get('took')}ms)."
+    )
+    return results
\ No newline at end of file
@@ -4,6 +4,8 @@ import os
 from loguru import logger
 from dotenv import load_dotenv
 
+from app.utils.metrics import observe_dependency
+
 load_dotenv()
 
 S3_SCHEMA_BUCKET_NAME = os.getenv("S3_SCHEMA_BUCKET_NAME")
@@ -39,12 +41,14 @@ def upload_to_s3(content: str, object_key: str) -> None:
         raise
     
 
-def fetch_table_metadata_from_s3(table_name: str) -> str:
+@observe_dependency("s3")
+def fetch_table_metadata_from_s3(table_name: str, s3_client=None) -> str:
     """
     Fetch the metadata (DDL) from an S3 bucket for the given table name.
+    Pass `s3_client` to reuse one client across concurrent fetches.
     """
     try:
-        s3_client = get_s3_client()
+        s3_client = s3_client or get_s3_client()
         object_key = f"agentplatform/{table_name}.md"
         response = s3_client.get_object(Bucket=S3_SCHEMA_BUCKET_NAME, Key=object_key)
         content = response['Body'].read().decode('utf-8')
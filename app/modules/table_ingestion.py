@@ -0,0 +1,125 @@
+import os
+import asyncio
+from typing import Dict, List
+
+from botocore.exceptions import BotoCoreError, ClientError
+from dotenv import load_dotenv
+from loguru import logger
+from openai import OpenAIError
+from opensearchpy import exceptions as opensearch_exceptions
+
+from app.modules.opensearch_database import bulk_store_table_embeddings
+from app.modules.s3_config import fetch_table_metadata_from_s3, get_s3_client
+from app.utils.athena_result_cache import athena_result_cache
+from app.utils.llm import async_generate_embeddings
+from app.utils.sql_template_cache import sql_template_cache
+from app.utils.table_vector_index import TABLE_VECTOR_INDEX_ENABLED, table_vector_index
+
+load_dotenv()
+
+# ------------------------ Configuration ------------------------
+
+# Metadata files fetched from S3 at once
+BULK_INGEST_S3_CONCURRENCY = int(os.getenv("BULK_INGEST_S3_CONCURRENCY", "16"))
+# Descriptions per embeddings request, and a character budget per request to
+# stay well under the API's per-request token limit
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+EMBEDDING_BATCH_MAX_CHARS = int(os.getenv("EMBEDDING_BATCH_MAX_CHARS", "400000"))
+# Embedding requests in flight at once
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+
+
+def _embedding_batches(tables: List[str], descriptions: Dict[str, str]) -> List[List[str]]:
+    batches, batch, chars = [], [], 0
+    for table in tables:
+        size = len(descriptions[table])
+        if batch and (len(batch) >= EMBEDDING_BATCH_SIZE or chars + size > EMBEDDING_BATCH_MAX_CHARS):
+            batches.append(batch)
+            batch, chars = [], 0
+        batch.append(table)
+        chars += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+async def _fetch_descriptions(table_names: List[str], results: Dict[str, dict]) -> Dict[str, str]:
+    s3_client = get_s3_client()
+    semaphore = asyncio.Semaphore(BULK_INGEST_S3_CONCURRENCY)
+
+    async def fetch(table: str):
+        async with semaphore:
+            try:
+                return table, await asyncio.to_thread(fetch_table_metadata_from_s3, table, s3_client)
+            except (BotoCoreError, ClientError) as e:
+                results[table] = {"status": "error", "stage": "s3", "detail": str(e)}
+                return table, None
+
+    fetched = await asyncio.gather(*(fetch(table) for table in table_names))
+    return {table: description for table, description in fetched if description is not None}
+
+
+async def _embed_descriptions(descriptions: Dict[str, str], results: Dict[str, dict]) -> Dict[str, List[float]]:
+    semaphore = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
+    embeddings = {}
+
+    async def embed(batch: List[str]):
+        async with semaphore:
+            try:
+                vectors = await async_generate_embeddings([descriptions[table] for table in batch])
+                embeddings.update(zip(batch, vectors))
+            except OpenAIError as e:
+                for table in batch:
+                    results[table] = {"status": "error", "stage": "embedding", "detail": str(e)}
+
+    await asyncio.gather(*(embed(batch) for batch in _embedding_batches(list(descriptions), descriptions)))
+    return embeddings
+
+
+async def bulk_store_tables(table_names: List[str]) -> List[dict]:
+    """
+    Stores the descriptions and embeddings of many tables.
+
+    The metadata files are fetched from S3 concurrently, the descriptions are
+    embedded in batched requests, and all documents are written with one
+    OpenSearch _bulk request keyed on the table name. A failure affects only
+    the tables concerned.
+
+    Returns:
+        list: One {"table_name", "status", ...} result per requested table,
+        in request order.
+    """
+    table_names = list(dict.fromkeys(table_names))
+    results: Dict[str, dict] = {}
+
+    descriptions = await _fetch_descriptions(table_names, results)
+    embeddings = await _embed_descriptions(descriptions, results)
+    documents = [
+        {"table_name": table, "table_description": descriptions[table], "embedding": embeddings[table]}
+        for table in table_names if table in embeddings
+    ]
+
+    try:
+        errors = await asyncio.to_thread(bulk_store_table_embeddings, documents)
+    except opensearch_exceptions.OpenSearchException as e:
+        errors = {document["table_name"]: str(e) for document in documents}
+
+    stored = []
+    for document in documents:
+        table = document["table_name"]
+        error = errors.get(table, "missing from the bulk response")
+        if error is None:
+            results[table] = {"status": "stored", "dimensions": len(document["embedding"])}
+            stored.append(document)
+        else:
+            results[table] = {"status": "error", "stage": "opensearch", "detail": error}
+
+    for document in stored:
+        # SQL generated against the old descriptions is no longer trusted
+        sql_template_cache.invalidate_table(document["table_name"])
+        athena_result_cache.invalidate_table(document["table_name"])
+    if TABLE_VECTOR_INDEX_ENABLED and stored:
+        await asyncio.to_thread(table_vector_index.upsert_many, stored)
+
+    logger.info(f"Bulk table ingestion stored {len(stored)}/{len(table_names)} tables.")
+    return [{"table_name": table, **results[table]} for table in table_names]
@@ -1,20 +1,29 @@
 import os
 import json
+import asyncio
 import boto3
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import Response, StreamingResponse
 from botocore.exceptions import BotoCoreError, ClientError
 from openai import OpenAIError
 from app.modules.fetch import S3FileHandler
 from app.utils.llm import generate_embedding
 from app.modules.s3_config import fetch_table_metadata_from_s3
 from app.modules.opensearch_database import store_table_embedding_to_opensearch
-from app.schemas.schema import QuestionRequest, QuestionResponse, TableReq, TableResp, ChatRequest, ChatResponse
+from app.modules.table_ingestion import bulk_store_tables
+from app.schemas.schema import QuestionRequest, QuestionResponse, TableReq, TableResp, ChatRequest, ChatResponse, ExportRequest, BulkTableReq, BulkTableResp
 from app.modules.rag import GenerateChat
-from app.utils.conversation_summary import generate_conversation_summary
+from app.utils.conversation_summary import async_generate_conversation_summary, resolve_conversation_summary
 from app.utils.utility_functions import Utils
-from app.utils.athena_client import get_table_data
+from app.utils.athena_client import AthenaQueryTimeout, async_get_table_data
 from app.utils.llm import generate_table_description
-from app.langgraph.chat_flow import ChatWorkflow
+from app.langgraph.chat_flow import get_chat_workflow
+from app.utils.sql_template_cache import sql_template_cache
+from app.utils.athena_result_cache import athena_result_cache
+from app.utils.athena_scheduler import AthenaQueueTimeout
+from app.utils.table_vector_index import TABLE_VECTOR_INDEX_ENABLED, table_vector_index
+from app.utils.result_export import MEDIA_TYPES, ExportError, export_stream, resolve_export
+from app.utils.metrics import render_metrics
 from loguru import logger
  
 router = APIRouter()
@@ -25,6 +34,11 @@ __version__ = "1.0.2"
 async def home() -> dict:
     return {"health_check": "OK", "version": __version__}
 
+@router.get("/metrics")
+async def metrics() -> Response:
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
 @router.post("/inject_bronze_to_silver")
 async def inject_data():
     try:
@@ -70,9 +84,9 @@ async def query_rag(request: QuestionRequest):
 @router.post("/generate_table_description", response_model=TableResp)
 async def generate_description(request: TableReq) -> TableResp:
     try:
-        results = get_table_data(request.table_name)
-        logger.info(f"Results: {results}")
-        description = generate_table_description(results, request.table_name)
+        results = await async_get_table_data(request.table_name)
+        logger.opt(lazy=True).debug("Results: {}", lambda: results)
+        description = await asyncio.to_thread(generate_table_description, results, request.table_name)
         return TableResp(description=description)
     except (BotoCoreError, ClientError) as e:
         logger.error(
@@ -89,14 +103,19 @@ async def store_table_embedding(request: TableReq) -> TableResp:
     try:
         # Step 1: Fetch the table metadata from S3
         table_description = fetch_table_metadata_from_s3(request.table_name)
-        logger.info(f"Table Description: {table_description}")
+        logger.opt(lazy=True).debug("Table Description: {}", lambda: table_description)
         
         # Step 2: Generate embeddings for the DDL
         embedding = generate_embedding(table_description)
-        logger.info(f"Table embedding: {embedding}")
+        logger.info(f"Table embedding generated with {len(embedding)} dimensions.")
         
         # Step 3: Store the table metadata and embedding in OpenSearch
         store_table_embedding_to_opensearch(request.table_name, table_description, embedding)
+        # SQL generated against the old description is no longer trusted
+        sql_template_cache.invalidate_table(request.table_name)
+        athena_result_cache.invalidate_table(request.table_name)
+        if TABLE_VECTOR_INDEX_ENABLED:
+            await asyncio.to_thread(table_vector_index.upsert, request.table_name, table_description, embedding)
         
         return TableResp(description=f"Table {request.table_name} Description and embedding stored successfully.")
     
@@ -105,28 +124,139 @@ async def store_table_embedding(request: TableReq) -> TableResp:
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
+@router.post("/store_table_embeddings", response_model=BulkTableResp)
+async def store_table_embeddings(request: BulkTableReq) -> BulkTableResp:
+    """
+    Bulk variant of /store_table_embedding: fetches the metadata of many
+    tables concurrently, embeds them in batches and writes them with one
+    OpenSearch _bulk request. Returns a result per table; failures of some
+    tables do not fail the request.
+    """
+    if not request.table_names:
+        raise HTTPException(status_code=400, detail="table_names is empty")
+    results = await bulk_store_tables(request.table_names)
+    stored = sum(result["status"] == "stored" for result in results)
+    return BulkTableResp(stored=stored, failed=len(results) - stored, results=results)
+
+
+@router.post("/invalidate_table_results", response_model=TableResp)
+async def invalidate_table_results(request: TableReq) -> TableResp:
+    """
+    Drops cached Athena results for a table after its data has been reloaded.
+    """
+    removed = athena_result_cache.invalidate_table(request.table_name)
+    return TableResp(description=f"Removed {removed} cached results for table {request.table_name}.")
+
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
+    summary_task = None
     try:
         conversation_summary = ""
-        # If this is the first message, generate a concise conversation summary using the utility function
+        # If this is the first message, summarize it concurrently with the chat workflow
         if request.is_first_message:
-            conversation_summary = generate_conversation_summary(request.question)
+            summary_task = asyncio.create_task(async_generate_conversation_summary(request.question))
         
-        # Initialize ChatWorkflow and execute the main chat process
-        chat_workflow = ChatWorkflow()
+        # Reuse the worker's compiled ChatWorkflow and execute the main chat process
+        chat_workflow = get_chat_workflow()
         final_state = await chat_workflow.run(query=request.question, uuid=request.uuid)
         
         if final_state.final_answer:
+            if summary_task is not None:
+                conversation_summary = await resolve_conversation_summary(summary_task, request.question)
+                # Resolved, or left to finish in the background so it is memoized
+                summary_task = None
             return ChatResponse(
                 answer=final_state.final_answer,
                 conversation_summary=conversation_summary,
                 deeplink=final_state.deeplink,
                 sql_query=final_state.sql_query,
                 table_used=final_state.table_used,
+                query_execution_id=final_state.query_execution_id,
             )
         else:
             raise HTTPException(status_code=500, detail="Failed to generate final answer.")
     except OpenAIError as e:
         logger.error(f"Error in chat endpoint: {e}")
-        raise HTTPException(status_code=500, detail="Internal Server Error")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+    finally:
+        # Failed before the answer; don't leave the summary running
+        if summary_task is not None and not summary_task.done():
+            summary_task.cancel()
+
+
+def _sse(event: dict) -> str:
+    """
+    Formats an event dict as a Server-Sent Events message.
+    """
+    payload = {key: value for key, value in event.items() if key != "event"}
+    return f"event: {event['event']}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """
+    Streaming variant of /chat. Emits per-node progress events, the final-answer
+    tokens as they are generated, and a closing "final" event with the same
+    fields as ChatResponse.
+    """
+    summary_task = None
+    if request.is_first_message:
+        summary_task = asyncio.create_task(async_generate_conversation_summary(request.question))
+
+    async def event_stream():
+        nonlocal summary_task
+        try:
+            async for event in get_chat_workflow().stream(query=request.question, uuid=request.uuid):
+                if event["event"] == "final" and summary_task is not None:
+                    event["conversation_summary"] = await resolve_conversation_summary(summary_task, request.question)
+                    summary_task = None
+                yield _sse(event)
+        except Exception as e:
+            logger.error(f"Error in chat stream endpoint: {e}")
+            yield _sse({"event": "error", "detail": "Internal Server Error"})
+        finally:
+            # Also covers a client that disconnects mid-stream
+            if summary_task is not None and not summary_task.done():
+                summary_task.cancel()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/export_sql_result")
+async def export_sql_result(request: ExportRequest):
+    """
+    Streams the full result of a chat query as NDJSON or CSV with constant
+    memory, straight from Athena's result file in S3 (or its result pages).
+
+    Pass the query_execution_id from ChatResponse to export the result that
+    was already computed, or a sql_query to run it again without the chat
+    row limit (EXPORT_MAX_ROWS applies instead).
+    """
+    if request.format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported format {request.format}; use ndjson or csv.")
+    try:
+        execution = await resolve_export(request.query_execution_id, request.sql_query, request.uuid)
+    except ExportError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except (AthenaQueryTimeout, AthenaQueueTimeout) as e:
+        logger.error(f"Export query timed out: {e}")
+        raise HTTPException(status_code=504, detail="Query timed out")
+    except (BotoCoreError, ClientError) as e:
+        logger.error(f"Error starting export: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+    source = "execution" if request.query_execution_id else "query"
+    filename = f"{execution.query_execution_id}.{request.format}"
+    return StreamingResponse(
+        export_stream(execution, request.format, source),
+        media_type=MEDIA_TYPES[request.format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Query-Execution-Id": execution.query_execution_id,
+        },
+    )
@@ -1,5 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional, Dict,  Any
+from app.utils.athena_result_set import ResultSet
 
 class QuestionRequest(BaseModel):
     question: str
@@ -13,6 +14,21 @@ class TableReq(BaseModel):
 class TableResp(BaseModel):
     description: str
 
+class BulkTableReq(BaseModel):
+    table_names: List[str]
+
+class BulkTableResult(BaseModel):
+    table_name: str
+    status: str  # "stored" or "error"
+    stage: Optional[str] = None  # Where it failed: "s3", "embedding" or "opensearch"
+    detail: Optional[str] = None
+    dimensions: Optional[int] = None
+
+class BulkTableResp(BaseModel):
+    stored: int
+    failed: int
+    results: List[BulkTableResult]
+
 class ChatRequest(BaseModel):
     question: str
     uuid: Optional[str] = None
@@ -24,6 +40,15 @@ class ChatResponse(BaseModel):
     deeplink: Optional[str] = None  # Added deeplink field
     sql_query: Optional[str] = None
     table_used: Optional[str] = None
+    query_execution_id: Optional[str] = None  # Athena execution whose full result /export_sql_result can stream
+
+class ExportRequest(BaseModel):
+    # Either the execution id from ChatResponse (no re-run) or a SQL query to run;
+    # uuid is required and the exported SQL must filter on it
+    query_execution_id: Optional[str] = None
+    sql_query: Optional[str] = None
+    uuid: Optional[str] = None
+    format: str = "ndjson"  # "ndjson" or "csv"
 
 class PromptUpdate(BaseModel):
     prompt_name: str
@@ -32,6 +57,9 @@ class PromptUpdate(BaseModel):
 
 # New schema to hold the state for the LangGraph chat flow
 class ChatState(BaseModel):
+    # sql_result holds an Athena ResultSet on success
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     uuid: Optional[str] = None  # Optional UUID from client if provided
     model_id: Optional[str] = None  # Optional model id if applicable
     query: str
@@ -39,10 +67,15 @@ class ChatState(BaseModel):
     embedding: Optional[List[float]] = None
     similar_tables: Optional[List[dict]] = None
     sql_query: Optional[str] = None
-    sql_result: Optional[List[Dict[str, Any]]] | Optional[str] = None
+    sql_result: Optional[ResultSet] | Optional[List[Dict[str, Any]]] | Optional[str] = None
     table_prompt: Optional[str] = None
     final_answer: Optional[str] = None
     query_intent: Optional[str] = None  # New field to store the classification ("database_query" or "general_query")
-    attempts: int = 0
+    attempts: int = 0  # SQL corrections made after a validation or Athena error
     deeplink: Optional[str] = None  # Added deeplink field
-    table_used: Optional[str] = None  # Added table_used field
\ No newline at end of file
+    table_used: Optional[str] = None  # Added table_used field
+    sql_statistics: Optional[Dict[str, Any]] = None  # Athena QueryExecution.Statistics of the last run
+    sql_guard: Optional[Dict[str, Any]] = None  # SqlGuard decision: action, reasons, original_sql, estimates
+    sql_engine: Optional[str] = None  # Where the SQL ran: "cache", "local" or "athena"
+    sql_error: Optional[str] = None  # Validation errors or Athena StateChangeReason of the last SQL attempt
+    query_execution_id: Optional[str] = None  # Athena execution id when the SQL ran on Athena
\ No newline at end of file
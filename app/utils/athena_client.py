@@ -1,32 +1,191 @@
 import os
+import re
 import time
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Optional
 import boto3
 from botocore.exceptions import BotoCoreError, ClientError
 from dotenv import load_dotenv
 from loguru import logger
 
+from app.utils.metrics import observe_dependency, record_cache_lookup
+from app.utils.athena_result_cache import ATHENA_RESULT_CACHE_ENABLED, athena_result_cache
+from app.utils.athena_s3_reader import iter_s3_query_results, iter_s3_result_rows, use_s3_reader
+from app.utils.athena_result_set import ResultSet, ResultSetBuilder
+from app.utils.athena_scheduler import PRIORITY_TABLE_DESCRIPTION, get_athena_scheduler
+
 # Load variables from .env file
 load_dotenv()
 
 # Validate required environment variables
 ATHENA_DATABASE = os.getenv('ATHENA_DATABASE')
 ATHENA_OUTPUT_S3_LOCATION = os.getenv('ATHENA_OUTPUT_S3_LOCATION')
+# Optional workgroup; queries run in the account's primary workgroup when unset
+ATHENA_WORKGROUP = os.getenv('ATHENA_WORKGROUP')
 
 # Create a session with your desired profile this is to test locally
 # ATHENA_CLIENT = boto3.Session(profile_name='YASH').client('athena')
 
 ATHENA_CLIENT = boto3.client('athena', region_name='us-east-1')
 
+# Polling: first poll after ATHENA_POLL_MIN_INTERVAL (or a share of the table's
+# typical duration), then back off exponentially up to ATHENA_POLL_MAX_INTERVAL.
+ATHENA_POLL_MIN_INTERVAL = float(os.getenv('ATHENA_POLL_MIN_INTERVAL', '0.2'))
+ATHENA_POLL_MAX_INTERVAL = float(os.getenv('ATHENA_POLL_MAX_INTERVAL', '2'))
+ATHENA_POLL_BACKOFF = float(os.getenv('ATHENA_POLL_BACKOFF', '1.5'))
+ATHENA_QUERY_TIMEOUT = float(os.getenv('ATHENA_QUERY_TIMEOUT', '60'))
+
+TERMINAL_STATES = ('SUCCEEDED', 'FAILED', 'CANCELLED')
+
+# Rows requested per GetQueryResults page (Athena allows at most 1000)
+ATHENA_RESULT_PAGE_SIZE = int(os.getenv('ATHENA_RESULT_PAGE_SIZE', '1000'))
+# Most rows a chat answer reads from a result set; the rest are never fetched
+ATHENA_CHAT_MAX_ROWS = int(os.getenv('ATHENA_CHAT_MAX_ROWS', '500'))
+# Let Athena return the stored result of an identical query run within this
+# many minutes (ResultReuseConfiguration, engine v3 only). 0 disables reuse.
+ATHENA_RESULT_REUSE_MAX_AGE_MINUTES = int(os.getenv('ATHENA_RESULT_REUSE_MAX_AGE_MINUTES', '0'))
+
+
+class AthenaQueryTimeout(Exception):
+    """
+    Raised when a query does not finish within its timeout. The query has
+    already been stopped on Athena when this is raised.
+    """
+
+
+@dataclass
+class QueryExecution:
+    query_execution_id: str
+    state: str
+    state_change_reason: Optional[str] = None
+    # QueryExecution.Statistics: EngineExecutionTimeInMillis, DataScannedInBytes,
+    # QueryQueueTimeInMillis, TotalExecutionTimeInMillis, ...
+    statistics: Dict[str, int] = field(default_factory=dict)
+    # s3:// URI of the result CSV
+    output_location: Optional[str] = None
+    # The SQL that was run
+    query: Optional[str] = None
+
+    @property
+    def succeeded(self) -> bool:
+        return self.state == 'SUCCEEDED'
+
+
+class QueryDurationHistory:
+    """
+    Exponentially weighted average of total execution time per table, used to
+    delay the first poll until the query is likely to be nearly done.
+    """
+
+    def __init__(self, alpha: float = 0.3):
+        self.alpha = alpha
+        self._durations: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def expected(self, key: Optional[str]) -> Optional[float]:
+        return self._durations.get(key) if key else None
+
+    def record(self, key: Optional[str], seconds: float) -> None:
+        if not key:
+            return
+        with self._lock:
+            previous = self._durations.get(key)
+            self._durations[key] = seconds if previous is None else (
+                self.alpha * seconds + (1 - self.alpha) * previous
+            )
+
+
+query_duration_history = QueryDurationHistory()
+
+
+def history_key_for(query: str) -> Optional[str]:
+    """
+    Returns the first table referenced in the query, used to group durations.
+    """
+    match = re.search(r'FROM\s+([^\s;()]+)', query, re.IGNORECASE)
+    return match.group(1).strip('"`').lower() if match else None
+
+
+def poll_delays(history_key: Optional[str] = None):
+    """
+    Yields the wait before each status poll: a first delay of about half the
+    table's typical duration (or the minimum interval), then exponential backoff.
+    """
+    expected = query_duration_history.expected(history_key)
+    delay = ATHENA_POLL_MIN_INTERVAL
+    if expected:
+        yield min(max(expected * 0.5, ATHENA_POLL_MIN_INTERVAL), ATHENA_POLL_MAX_INTERVAL * 4)
+    while True:
+        yield delay
+        delay = min(delay * ATHENA_POLL_BACKOFF, ATHENA_POLL_MAX_INTERVAL)
+
+
+def _to_query_execution(response: dict) -> QueryExecution:
+    execution = response['QueryExecution']
+    return QueryExecution(
+        query_execution_id=execution['QueryExecutionId'],
+        state=execution['Status']['State'],
+        state_change_reason=execution['Status'].get('StateChangeReason'),
+        statistics=execution.get('Statistics', {}),
+        output_location=execution.get('ResultConfiguration', {}).get('OutputLocation'),
+        query=execution.get('Query'),
+    )
+
+
+def _record_duration(execution: QueryExecution, history_key: Optional[str]) -> None:
+    total_ms = execution.statistics.get('TotalExecutionTimeInMillis')
+    reuse = execution.statistics.get('ResultReuseInformation')
+    if reuse is not None and ATHENA_RESULT_REUSE_MAX_AGE_MINUTES > 0:
+        record_cache_lookup("athena_result_reuse", bool(reuse.get('ReusedPreviousResult')))
+        if reuse.get('ReusedPreviousResult'):
+            # A reused result says nothing about how long the query takes
+            return
+    if execution.succeeded and total_ms is not None:
+        query_duration_history.record(history_key, total_ms / 1000)
 
+
+def stop_query(query_execution_id: str) -> None:
+    """
+    Asks Athena to stop a running query. Errors are logged, not raised.
+    """
+    try:
+        ATHENA_CLIENT.stop_query_execution(QueryExecutionId=query_execution_id)
+        logger.info(f"Stopped Athena query {query_execution_id}.")
+    except (BotoCoreError, ClientError) as e:
+        logger.error(f"Error stopping Athena query {query_execution_id}: {e}")
+
+
+@observe_dependency("athena", "get_query_execution")
+def get_query_execution(query_execution_id: str) -> QueryExecution:
+    """
+    Returns the current state of a query without waiting for it.
+    """
+    return _to_query_execution(ATHENA_CLIENT.get_query_execution(QueryExecutionId=query_execution_id))
+
+
+@observe_dependency("athena")
 def run_athena_query(query: str):
     """
     Run a query in Athena and return the QueryExecutionId.
     """
+    kwargs = {}
+    if ATHENA_WORKGROUP:
+        kwargs['WorkGroup'] = ATHENA_WORKGROUP
+    if ATHENA_RESULT_REUSE_MAX_AGE_MINUTES > 0:
+        kwargs['ResultReuseConfiguration'] = {
+            'ResultReuseByAgeConfiguration': {
+                'Enabled': True,
+                'MaxAgeInMinutes': ATHENA_RESULT_REUSE_MAX_AGE_MINUTES,
+            }
+        }
     try:
         response = ATHENA_CLIENT.start_query_execution(
             QueryString=query,
             QueryExecutionContext={'Database': ATHENA_DATABASE},
-            ResultConfiguration={'OutputLocation': ATHENA_OUTPUT_S3_LOCATION}
+            ResultConfiguration={'OutputLocation': ATHENA_OUTPUT_S3_LOCATION},
+            **kwargs
         )
         query_execution_id = response['QueryExecutionId']
         logger.info(f"Started Athena query with execution ID: {query_execution_id}")
@@ -35,49 +194,168 @@ def run_athena_query(query: str):
         logger.exception(f"Error starting Athena query: {e}")
         raise
 
-def wait_for_query_to_complete(query_execution_id: str, sleep_time: int = 2, max_attempts: int = 30):
+@observe_dependency("athena")
+def wait_for_query_to_complete(query_execution_id: str, timeout: float = ATHENA_QUERY_TIMEOUT,
+                               history_key: Optional[str] = None):
     """
-    Wait for the Athena query to complete.
-    Keep while true and sleep time 2 secs
-    If state suceed only return the response otherwise print error
-    Separate ti states
+    Wait for the Athena query to complete and return its final state.
+    Polls on the adaptive schedule from poll_delays(); the query is stopped and
+    AthenaQueryTimeout raised if it is still running after `timeout` seconds.
     """
-    attempts = 0
+    deadline = time.monotonic() + timeout
+    delays = poll_delays(history_key)
     try:
-        while attempts < max_attempts:
+        while True:
             response = ATHENA_CLIENT.get_query_execution(QueryExecutionId=query_execution_id)
-            state = response['QueryExecution']['Status']['State']
-            logger.info(f"The response of the SQL execution: ==========>> {response}")
-            if state in ['SUCCEEDED', 'FAILED', 'CANCELLED']:
-                logger.info(f"Query {query_execution_id} finished with state: {state}")
-                return state
-            time.sleep(sleep_time)
-            attempts += 1
+            execution = _to_query_execution(response)
+            logger.opt(lazy=True).debug("The response of the SQL execution: ==========>> {}", lambda: response)
+            if execution.state in TERMINAL_STATES:
+                logger.info(f"Query {query_execution_id} finished with state: {execution.state}")
+                _record_duration(execution, history_key)
+                return execution.state
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(next(delays), remaining))
     except (BotoCoreError, ClientError) as e:
         logger.exception(
             f"Error while waiting for query {query_execution_id} to complete: {e}"
         )
         raise
-    raise Exception("Query did not complete in the expected time.")
+    stop_query(query_execution_id)
+    raise AthenaQueryTimeout(f"Query {query_execution_id} did not complete within {timeout}s.")
+
+@observe_dependency("athena", "get_query_results")
+def _get_result_page(query_execution_id: str, max_results: int, next_token: Optional[str] = None) -> dict:
+    kwargs = {'QueryExecutionId': query_execution_id, 'MaxResults': max_results}
+    if next_token:
+        kwargs['NextToken'] = next_token
+    return ATHENA_CLIENT.get_query_results(**kwargs)
 
-def get_query_results(query_execution_id: str):
+def _page_size(page_size: int, remaining: Optional[int], first_page: bool) -> int:
+    if remaining is None:
+        return page_size
+    # The header row counts against MaxResults on the first page
+    return max(1, min(page_size, remaining + (1 if first_page else 0)))
+
+def _column_info(response: dict):
+    """
+    Returns (names, types) from a GetQueryResults page's ResultSetMetadata.
+    """
+    info = response['ResultSet'].get('ResultSetMetadata', {}).get('ColumnInfo', [])
+    return [column['Name'] for column in info], [column['Type'] for column in info]
+
+def _row_values(rows: list) -> list:
+    return [[col.get('VarCharValue') for col in row.get('Data', [])] for row in rows]
+
+def _iter_pages(query_execution_id: str, page_size: int, max_rows: Optional[int]):
+    """
+    Yields (response, values) for each GetQueryResults page, following
+    NextToken. `values` holds the page's rows as lists of strings, without the
+    header row (first row of the first page) and cut off at `max_rows` overall;
+    no further pages are requested once `max_rows` rows have been produced.
+    """
+    next_token, produced, first_page = None, 0, True
+    while True:
+        remaining = None if max_rows is None else max_rows - produced
+        if remaining is not None and remaining <= 0:
+            return
+        response = _get_result_page(
+            query_execution_id, _page_size(page_size, remaining, first_page), next_token
+        )
+        values = _row_values(response['ResultSet']['Rows'][1 if first_page else 0:])[:remaining]
+        first_page = False
+        produced += len(values)
+        yield response, values
+        next_token = response.get('NextToken')
+        if not next_token:
+            return
+
+async def _aiter_pages(query_execution_id: str, page_size: int, max_rows: Optional[int]):
+    """
+    Async variant of _iter_pages. Each page is fetched in a worker thread only
+    when the consumer has used up the previous one.
+    """
+    next_token, produced, first_page = None, 0, True
+    while True:
+        remaining = None if max_rows is None else max_rows - produced
+        if remaining is not None and remaining <= 0:
+            return
+        response = await asyncio.to_thread(
+            _get_result_page, query_execution_id, _page_size(page_size, remaining, first_page), next_token
+        )
+        values = _row_values(response['ResultSet']['Rows'][1 if first_page else 0:])[:remaining]
+        first_page = False
+        produced += len(values)
+        yield response, values
+        next_token = response.get('NextToken')
+        if not next_token:
+            return
+
+def iter_query_results(query_execution_id: str, page_size: int = ATHENA_RESULT_PAGE_SIZE,
+                       max_rows: Optional[int] = None):
+    """
+    Yield result rows as dictionaries, following NextToken across pages.
+    Stops after `max_rows` rows without requesting further pages.
+    """
+    headers = None
+    try:
+        for response, values in _iter_pages(query_execution_id, page_size, max_rows):
+            if headers is None:
+                headers, _ = _column_info(response)
+            for row in values:
+                yield dict(zip(headers, row))
+    except (BotoCoreError, ClientError) as e:
+        logger.exception(
+            f"Error fetching query results for execution ID {query_execution_id}: {e}"
+        )
+        raise
+
+def get_query_results(query_execution_id: str, max_rows: Optional[int] = None,
+                      output_location: Optional[str] = None):
     """
     Retrieve query results from Athena and convert them to a list of dictionaries.
+    All pages are read unless `max_rows` caps the number of rows. When the
+    result CSV's `output_location` is given and the result is large, the CSV
+    is streamed from S3 instead of paging through GetQueryResults.
+    """
+    if use_s3_reader(output_location, max_rows, ATHENA_RESULT_PAGE_SIZE):
+        logger.info(f"Reading results of {query_execution_id} from {output_location}.")
+        result = list(iter_s3_query_results(output_location, max_rows=max_rows))
+    else:
+        result = list(iter_query_results(query_execution_id, max_rows=max_rows))
+    if not result:
+        logger.error("No rows returned in query results.")
+    return result
+
+def get_result_metadata(query_execution_id: str):
+    """
+    Returns (column names, column types) of a finished query. A one-row page
+    is the cheapest way to get them.
+    """
+    return _column_info(_get_result_page(query_execution_id, 1))
+
+def _read_s3_result_set(query_execution_id: str, output_location: str, max_rows: Optional[int]) -> ResultSet:
+    logger.info(f"Reading results of {query_execution_id} from {output_location}.")
+    columns, types = get_result_metadata(query_execution_id)
+    return ResultSet.from_rows(columns, types, iter_s3_result_rows(output_location, max_rows))
+
+def get_result_set(query_execution_id: str, max_rows: Optional[int] = None,
+                   output_location: Optional[str] = None) -> ResultSet:
+    """
+    Retrieve query results as a typed, column-oriented ResultSet. Column names
+    and types come from ResultSetMetadata; reading follows the same rules as
+    get_query_results.
     """
     try:
-        result_response = ATHENA_CLIENT.get_query_results(QueryExecutionId=query_execution_id)
-        rows = result_response['ResultSet']['Rows']
-        if not rows:
-            logger.error("No rows returned in query results.")
-            return []
-        # The first row is assumed to be header with column names
-        headers = [col.get('VarCharValue', '') for col in rows[0]['Data']]
-        result = []
-        for row in rows[1:]:
-            data = row.get('Data', [])
-            row_dict = {header: col.get('VarCharValue', None) for header, col in zip(headers, data)}
-            result.append(row_dict)
-        return result
+        if use_s3_reader(output_location, max_rows, ATHENA_RESULT_PAGE_SIZE):
+            return _read_s3_result_set(query_execution_id, output_location, max_rows)
+        builder = None
+        for response, values in _iter_pages(query_execution_id, ATHENA_RESULT_PAGE_SIZE, max_rows):
+            if builder is None:
+                builder = ResultSetBuilder(*_column_info(response))
+            builder.add_rows(values)
+        return builder.build() if builder is not None else ResultSet([], [], [])
     except (BotoCoreError, ClientError) as e:
         logger.exception(
             f"Error fetching query results for execution ID {query_execution_id}: {e}"
@@ -89,13 +367,164 @@ def get_table_data(table_name: str, num_rows: int = 5):
     Get the first few rows of the given table from Athena and return them as a list of dictionaries.
     """
     query = f'SELECT * FROM "{table_name}" LIMIT {num_rows};'
+    if ATHENA_RESULT_CACHE_ENABLED:
+        cached = athena_result_cache.get(query, ATHENA_DATABASE, num_rows)
+        if cached is not None:
+            return cached.to_dicts()
     try:
         query_execution_id = run_athena_query(query)
-        state = wait_for_query_to_complete(query_execution_id)
+        state = wait_for_query_to_complete(query_execution_id, history_key=table_name.lower())
         if state != 'SUCCEEDED':
             raise Exception(f"Query did not succeed, final state: {state}")
-        rows = get_query_results(query_execution_id)
+        rows = get_query_results(query_execution_id, max_rows=num_rows)
+        logger.info(f"Fetched {len(rows)} rows from table {table_name}.")
+        if ATHENA_RESULT_CACHE_ENABLED:
+            # The cache holds ResultSets only; the rows are VarChar strings, so the round trip is exact
+            athena_result_cache.put(query, ATHENA_DATABASE, ResultSet.from_dicts(rows), num_rows)
+        return rows
+    except (BotoCoreError, ClientError) as e:
+        logger.exception(f"Error fetching data from table {table_name}: {e}")
+        raise
+
+
+# ------------------------ Async API ------------------------
+# boto3 has no native asyncio support, so each Athena call is executed in a
+# worker thread and the polling interval is awaited instead of slept.
+
+async def async_run_athena_query(query: str):
+    """
+    Async variant of run_athena_query.
+    """
+    return await asyncio.to_thread(run_athena_query, query)
+
+@observe_dependency("athena", "wait_for_query_to_complete")
+async def async_wait_for_query_execution(query_execution_id: str, timeout: float = ATHENA_QUERY_TIMEOUT,
+                                         history_key: Optional[str] = None) -> QueryExecution:
+    """
+    Polls the query on the adaptive schedule from poll_delays() until it
+    reaches a terminal state, without blocking the event loop.
+
+    If `timeout` elapses, or the awaiting task is cancelled (e.g. the client
+    disconnected), the query is stopped on Athena so it stops consuming
+    capacity; AthenaQueryTimeout or CancelledError is then raised.
+
+    Returns:
+        QueryExecution: Final state, StateChangeReason and Statistics.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    delays = poll_delays(history_key)
+    try:
+        while True:
+            response = await asyncio.to_thread(
+                ATHENA_CLIENT.get_query_execution, QueryExecutionId=query_execution_id
+            )
+            execution = _to_query_execution(response)
+            logger.opt(lazy=True).debug("The response of the SQL execution: ==========>> {}", lambda: response)
+            if execution.state in TERMINAL_STATES:
+                logger.info(
+                    f"Query {query_execution_id} finished with state: {execution.state} "
+                    f"(engine={execution.statistics.get('EngineExecutionTimeInMillis')}ms, "
+                    f"queue={execution.statistics.get('QueryQueueTimeInMillis')}ms, "
+                    f"scanned={execution.statistics.get('DataScannedInBytes')}B)"
+                )
+                _record_duration(execution, history_key)
+                return execution
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(next(delays), remaining))
+    except asyncio.CancelledError:
+        logger.warning(f"Wait for query {query_execution_id} was cancelled; stopping the query.")
+        await asyncio.shield(asyncio.to_thread(stop_query, query_execution_id))
+        raise
+    except (BotoCoreError, ClientError) as e:
+        logger.exception(
+            f"Error while waiting for query {query_execution_id} to complete: {e}"
+        )
+        raise
+    await asyncio.to_thread(stop_query, query_execution_id)
+    raise AthenaQueryTimeout(f"Query {query_execution_id} did not complete within {timeout}s.")
+
+async def async_wait_for_query_to_complete(query_execution_id: str, timeout: float = ATHENA_QUERY_TIMEOUT,
+                                           history_key: Optional[str] = None):
+    """
+    Async variant of wait_for_query_to_complete; returns only the final state.
+    """
+    execution = await async_wait_for_query_execution(query_execution_id, timeout, history_key)
+    return execution.state
+
+async def aiter_query_results(query_execution_id: str, page_size: int = ATHENA_RESULT_PAGE_SIZE,
+                              max_rows: Optional[int] = None):
+    """
+    Async variant of iter_query_results.
+    """
+    headers = None
+    try:
+        async for response, values in _aiter_pages(query_execution_id, page_size, max_rows):
+            if headers is None:
+                headers, _ = _column_info(response)
+            for row in values:
+                yield dict(zip(headers, row))
+    except (BotoCoreError, ClientError) as e:
+        logger.exception(
+            f"Error fetching query results for execution ID {query_execution_id}: {e}"
+        )
+        raise
+
+async def async_get_query_results(query_execution_id: str, max_rows: Optional[int] = None,
+                                  output_location: Optional[str] = None):
+    """
+    Async variant of get_query_results.
+    """
+    if await asyncio.to_thread(use_s3_reader, output_location, max_rows, ATHENA_RESULT_PAGE_SIZE):
+        logger.info(f"Reading results of {query_execution_id} from {output_location}.")
+        return await asyncio.to_thread(lambda: list(iter_s3_query_results(output_location, max_rows=max_rows)))
+    return [row async for row in aiter_query_results(query_execution_id, max_rows=max_rows)]
+
+async def async_get_result_set(query_execution_id: str, max_rows: Optional[int] = None,
+                               output_location: Optional[str] = None) -> ResultSet:
+    """
+    Async variant of get_result_set.
+    """
+    if await asyncio.to_thread(use_s3_reader, output_location, max_rows, ATHENA_RESULT_PAGE_SIZE):
+        return await asyncio.to_thread(_read_s3_result_set, query_execution_id, output_location, max_rows)
+    try:
+        builder = None
+        async for response, values in _aiter_pages(query_execution_id, ATHENA_RESULT_PAGE_SIZE, max_rows):
+            if builder is None:
+                builder = ResultSetBuilder(*_column_info(response))
+            builder.add_rows(values)
+        return builder.build() if builder is not None else ResultSet([], [], [])
+    except (BotoCoreError, ClientError) as e:
+        logger.exception(
+            f"Error fetching query results for execution ID {query_execution_id}: {e}"
+        )
+        raise
+
+async def async_get_table_data(table_name: str, num_rows: int = 5):
+    """
+    Async variant of get_table_data.
+    """
+    query = f'SELECT * FROM "{table_name}" LIMIT {num_rows};'
+    if ATHENA_RESULT_CACHE_ENABLED:
+        cached = athena_result_cache.get(query, ATHENA_DATABASE, num_rows)
+        if cached is not None:
+            return cached.to_dicts()
+    try:
+        # Previews for table descriptions yield to interactive chat queries
+        async with get_athena_scheduler(ATHENA_WORKGROUP).slot(PRIORITY_TABLE_DESCRIPTION,
+                                                               ATHENA_QUERY_TIMEOUT * 2) as timeout:
+            query_execution_id = await async_run_athena_query(query)
+            execution = await async_wait_for_query_execution(
+                query_execution_id, timeout, history_key=table_name.lower()
+            )
+        if not execution.succeeded:
+            raise Exception(f"Query did not succeed, final state: {execution.state}")
+        rows = await async_get_query_results(query_execution_id, max_rows=num_rows)
         logger.info(f"Fetched {len(rows)} rows from table {table_name}.")
+        if ATHENA_RESULT_CACHE_ENABLED:
+            athena_result_cache.put(query, ATHENA_DATABASE, ResultSet.from_dicts(rows), num_rows, execution.statistics)
         return rows
     except (BotoCoreError, ClientError) as e:
         logger.exception(f"Error fetching data from table {table_name}: {e}")
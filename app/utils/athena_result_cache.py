@@ -0,0 +1,185 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Optional
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from app.utils.athena_result_set import ResultSet
+from app.utils.metrics import ATHENA_SCAN_BYTES_SAVED, record_cache_lookup
+
+load_dotenv()
+
+# ------------------------ Configuration ------------------------
+
+ATHENA_RESULT_CACHE_ENABLED = os.getenv("ATHENA_RESULT_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+# Upper bound on the memory held by cached rows (approximate, in bytes)
+ATHENA_RESULT_CACHE_MAX_BYTES = int(os.getenv("ATHENA_RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+ATHENA_RESULT_CACHE_TTL = int(os.getenv("ATHENA_RESULT_CACHE_TTL", "300"))
+# Per-table overrides, e.g. "reference_codes=86400,transactions=60"
+ATHENA_RESULT_CACHE_TABLE_TTLS = os.getenv("ATHENA_RESULT_CACHE_TABLE_TTLS", "")
+
+_STRING_LITERAL = re.compile(r"('(?:[^']|'')*')")
+_TABLE_REFERENCE = re.compile(r"\b(?:FROM|JOIN)\s+([^\s;(),]+)", re.IGNORECASE)
+
+
+def parse_table_ttls(value: str) -> Dict[str, int]:
+    ttls = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        table, ttl = item.split("=", 1)
+        try:
+            ttls[table.strip().strip('"`').lower()] = int(ttl)
+        except ValueError:
+            logger.warning(f"Ignoring invalid Athena result cache TTL: {item!r}")
+    return ttls
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Collapses whitespace, drops the trailing semicolon and lowercases
+    everything outside string literals, so cosmetic differences in generated
+    SQL map to the same key while literal values stay distinct.
+    """
+    parts = _STRING_LITERAL.split(sql.strip().rstrip(";").strip())
+    return "".join(
+        part if index % 2 else re.sub(r"\s+", " ", part.lower())
+        for index, part in enumerate(parts)
+    )
+
+
+def referenced_tables(sql: str) -> FrozenSet[str]:
+    return frozenset(match.strip('"`').split(".")[-1].strip('"`').lower() for match in _TABLE_REFERENCE.findall(sql))
+
+
+@dataclass
+class CachedResult:
+    rows: ResultSet
+    tables: FrozenSet[str]
+    size: int
+    expires_at: float
+    # DataScannedInBytes of the run that produced the rows
+    data_scanned: int = 0
+
+
+class AthenaResultCache:
+    """
+    In-process cache of Athena result rows keyed on database + normalized SQL.
+
+    Entries expire after the shortest TTL of the tables the query reads and
+    are evicted least recently used first once the cached rows exceed
+    `max_bytes`. Rows are stored as ResultSets, which are immutable and
+    shared with callers.
+    """
+
+    def __init__(self, max_bytes: int = ATHENA_RESULT_CACHE_MAX_BYTES, ttl: int = ATHENA_RESULT_CACHE_TTL,
+                 table_ttls: Optional[Dict[str, int]] = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.table_ttls = parse_table_ttls(ATHENA_RESULT_CACHE_TABLE_TTLS) if table_ttls is None else table_ttls
+        self.hits = 0
+        self.misses = 0
+        self.saved_bytes_scanned = 0
+        self._bytes = 0
+        self._entries: "OrderedDict[tuple, CachedResult]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(sql: str, database: Optional[str], max_rows: Optional[int]) -> tuple:
+        return (database, normalize_sql(sql), max_rows)
+
+    def ttl_for(self, tables: FrozenSet[str]) -> int:
+        return min((self.table_ttls.get(table, self.ttl) for table in tables), default=self.ttl)
+
+    def _remove(self, key: tuple) -> None:
+        self._bytes -= self._entries.pop(key).size
+
+    def get(self, sql: str, database: Optional[str],
+            max_rows: Optional[int] = None) -> Optional[ResultSet]:
+        """
+        Returns the cached rows, or None on a miss.
+        """
+        key = self._key(sql, database, max_rows)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                record_cache_lookup("athena_result", False)
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_bytes_scanned += entry.data_scanned
+        record_cache_lookup("athena_result", True)
+        ATHENA_SCAN_BYTES_SAVED.inc(entry.data_scanned)
+        logger.info(f"Athena result cache hit ({len(entry.rows)} rows, {entry.data_scanned} bytes not scanned).")
+        return entry.rows
+
+    def put(self, sql: str, database: Optional[str], rows: ResultSet, max_rows: Optional[int] = None,
+            statistics: Optional[dict] = None) -> bool:
+        """
+        Stores the rows of a successful query. Returns False if the query is
+        not cacheable (no tables, zero TTL or larger than the whole cache).
+        """
+        tables = referenced_tables(sql)
+        ttl = self.ttl_for(tables)
+        size = rows.estimated_size()
+        if not tables or ttl <= 0 or size > self.max_bytes:
+            return False
+        entry = CachedResult(
+            rows=rows,
+            tables=tables,
+            size=size,
+            expires_at=time.monotonic() + ttl,
+            data_scanned=(statistics or {}).get("DataScannedInBytes", 0),
+        )
+        key = self._key(sql, database, max_rows)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+        return True
+
+    def invalidate_table(self, table_name: str) -> int:
+        """
+        Drops every cached result that reads the given table. Returns the
+        number of entries removed.
+        """
+        table_name = table_name.strip('"`').lower()
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if table_name in entry.tables]
+            for key in stale:
+                self._remove(key)
+        if stale:
+            logger.info(f"Invalidated {len(stale)} cached Athena results for table {table_name}.")
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_bytes_scanned": self.saved_bytes_scanned,
+            }
+
+
+# Process-wide cache shared by the chat workflow and the table preview
+athena_result_cache = AthenaResultCache()
@@ -0,0 +1,213 @@
+import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+# Athena (Trino) column types that are converted to native Python values; any
+# other type (varchar, char, array, map, row, json, ...) is kept as a string.
+_INTEGER_TYPES = ("tinyint", "smallint", "integer", "int", "bigint")
+_FLOAT_TYPES = ("double", "float", "real")
+
+
+def _parse_timestamp(value: str) -> datetime.datetime:
+    # Athena renders timestamps as "2024-05-01 12:00:00.000"
+    return datetime.datetime.fromisoformat(value.replace(" UTC", ""))
+
+
+def _parse_decimal(value: str) -> Decimal:
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValueError(value)
+
+
+def converter_for(athena_type: str) -> Optional[Callable[[str], Any]]:
+    """
+    Returns the function turning an Athena VarCharValue of the given type into
+    a native value, or None if the string is kept as is.
+    """
+    athena_type = (athena_type or "").lower()
+    if athena_type in _INTEGER_TYPES:
+        return int
+    if athena_type in _FLOAT_TYPES:
+        return float
+    if athena_type.startswith("decimal"):
+        return _parse_decimal
+    if athena_type == "boolean":
+        return lambda value: value.lower() == "true"
+    if athena_type == "date":
+        return datetime.date.fromisoformat
+    if athena_type.startswith("timestamp"):
+        return _parse_timestamp
+    return None
+
+
+def _convert_column(values: List[Optional[str]], athena_type: str) -> List[Any]:
+    convert = converter_for(athena_type)
+    if convert is None:
+        return values
+    converted = []
+    for value in values:
+        if value is None:
+            converted.append(None)
+            continue
+        try:
+            converted.append(convert(value))
+        except ValueError:
+            # Leave unexpected renderings (e.g. "NaN", "Infinity" for decimals) untouched
+            converted.append(value)
+    return converted
+
+
+class ResultSetBuilder:
+    """
+    Accumulates rows of VarCharValue strings page by page, column-wise, and
+    converts them to a ResultSet once all pages are in.
+    """
+
+    def __init__(self, columns: Sequence[str], types: Sequence[str]):
+        self.columns = list(columns)
+        self.types = list(types)
+        self._data: List[List[Optional[str]]] = [[] for _ in self.columns]
+
+    def add_rows(self, rows: Iterable[Sequence[Optional[str]]]) -> None:
+        width = len(self._data)
+        for row in rows:
+            if len(row) < width:
+                row = list(row) + [None] * (width - len(row))
+            for index, column in enumerate(self._data):
+                column.append(row[index])
+
+    def build(self) -> "ResultSet":
+        data = [_convert_column(values, t) for values, t in zip(self._data, self.types)]
+        self._data = [[] for _ in self.columns]
+        return ResultSet(self.columns, self.types, data)
+
+
+class ResultSet:
+    """
+    Column-oriented Athena result: names and types from ResultSetMetadata and
+    one list of native values per column.
+
+    A ResultSet is immutable. Projection and slicing return new result sets
+    that share the underlying lists where possible, so dropping a column such
+    as the deeplink costs nothing per row. Rows are only materialized as dicts
+    or text on request.
+    """
+
+    __slots__ = ("columns", "types", "_data", "_start", "_stop")
+
+    def __init__(self, columns: Sequence[str], types: Sequence[str], data: Sequence[List[Any]],
+                 start: int = 0, stop: Optional[int] = None):
+        self.columns = tuple(columns)
+        self.types = tuple(types)
+        self._data = tuple(data)
+        length = len(self._data[0]) if self._data else 0
+        self._start = start
+        self._stop = length if stop is None else min(stop, length)
+
+    # ------------------------ Construction ------------------------
+
+    @classmethod
+    def from_rows(cls, columns: Sequence[str], types: Sequence[str], rows: Iterable[Sequence[Optional[str]]]):
+        """
+        Builds a result set from rows of VarCharValue strings (None for NULL),
+        converting each column to its native type.
+        """
+        builder = ResultSetBuilder(columns, types)
+        builder.add_rows(rows)
+        return builder.build()
+
+    @classmethod
+    def from_dicts(cls, rows: List[Dict[str, Any]], types: Optional[Sequence[str]] = None):
+        columns = list(rows[0].keys()) if rows else []
+        types = types or ["varchar"] * len(columns)
+        return cls.from_rows(columns, types, ([row.get(c) for c in columns] for row in rows))
+
+    # ------------------------ Access ------------------------
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.to_dicts())
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ResultSet):
+            return NotImplemented
+        return self.columns == other.columns and self.to_tuples() == other.to_tuples()
+
+    def __repr__(self) -> str:
+        return f"<ResultSet {len(self)} rows columns={list(self.columns)}>"
+
+    def __deepcopy__(self, memo) -> "ResultSet":
+        # Immutable; copies of a ChatState can share it
+        return self
+
+    def column(self, name: str) -> List[Any]:
+        return self._data[self.columns.index(name)][self._start:self._stop]
+
+    def first(self, name: str, default: Any = None) -> Any:
+        """
+        Returns the column's value in the first row, or `default` if the
+        column is missing or the result is empty.
+        """
+        if name not in self.columns or not self:
+            return default
+        return self._data[self.columns.index(name)][self._start]
+
+    # ------------------------ Projection and slicing ------------------------
+
+    def select(self, names: Sequence[str]) -> "ResultSet":
+        indexes = [self.columns.index(name) for name in names if name in self.columns]
+        return ResultSet(
+            [self.columns[i] for i in indexes],
+            [self.types[i] for i in indexes],
+            [self._data[i] for i in indexes],
+            self._start,
+            self._stop,
+        )
+
+    def drop(self, *names: str) -> "ResultSet":
+        return self.select([name for name in self.columns if name not in names])
+
+    def slice(self, start: int = 0, stop: Optional[int] = None) -> "ResultSet":
+        begin, end, _ = slice(start, stop).indices(len(self))
+        return ResultSet(self.columns, self.types, self._data, self._start + begin, self._start + max(begin, end))
+
+    def head(self, count: int) -> "ResultSet":
+        return self.slice(0, count)
+
+    # ------------------------ Conversion ------------------------
+
+    def to_tuples(self) -> List[tuple]:
+        return list(zip(*(values[self._start:self._stop] for values in self._data)))
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        return [dict(zip(self.columns, row)) for row in self.to_tuples()]
+
+    def to_text(self, max_rows: Optional[int] = None, separator: str = " | ") -> str:
+        """
+        Renders the rows as a header line plus one line per row, e.g. for an
+        LLM prompt. Much shorter than the repr of a list of dicts because
+        column names appear once.
+        """
+        rows = self if max_rows is None else self.head(max_rows)
+        lines = [separator.join(rows.columns)]
+        for row in rows.to_tuples():
+            lines.append(separator.join("NULL" if value is None else str(value) for value in row))
+        if len(rows) < len(self):
+            lines.append(f"... {len(self) - len(rows)} more rows")
+        return "\n".join(lines)
+
+    def estimated_size(self) -> int:
+        """
+        Approximate memory held by the values, in bytes.
+        """
+        size = 0
+        for values in self._data:
+            for value in values[self._start:self._stop]:
+                size += len(value) if isinstance(value, str) else 8
+        return size
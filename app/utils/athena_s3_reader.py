@@ -0,0 +1,231 @@
+import io
+import os
+import csv
+from itertools import islice
+from typing import Iterator, Optional, Tuple
+from urllib.parse import urlparse
+
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+from dotenv import load_dotenv
+from loguru import logger
+
+from app.utils.metrics import observe_dependency
+
+load_dotenv()
+
+# ------------------------ Configuration ------------------------
+
+# Result files at least this large are streamed from S3 instead of paged
+# through GetQueryResults. Set to 0 to always use the API.
+ATHENA_S3_RESULT_MIN_BYTES = int(os.getenv("ATHENA_S3_RESULT_MIN_BYTES", str(512 * 1024)))
+
+S3_CLIENT = boto3.client('s3', region_name='us-east-1')
+
+
+def split_s3_uri(uri: str) -> Tuple[str, str]:
+    parsed = urlparse(uri)
+    return parsed.netloc, parsed.path.lstrip("/")
+
+
+@observe_dependency("s3", "athena_result_head")
+def result_object_size(output_location: str) -> Optional[int]:
+    """
+    Returns the size in bytes of a query's output CSV, or None if it cannot
+    be read (missing object, no permission, DDL statements without a CSV).
+    """
+    bucket, key = split_s3_uri(output_location)
+    try:
+        return S3_CLIENT.head_object(Bucket=bucket, Key=key)['ContentLength']
+    except (BotoCoreError, ClientError) as e:
+        logger.warning(f"Cannot read Athena result object {output_location}: {e}")
+        return None
+
+
+def use_s3_reader(output_location: Optional[str], max_rows: Optional[int], page_size: int) -> bool:
+    """
+    Decides whether a result set should be streamed from S3.
+
+    Results that fit in a single GetQueryResults page are always fetched from
+    the API (one round trip); otherwise S3 is used once the CSV is at least
+    ATHENA_S3_RESULT_MIN_BYTES.
+    """
+    if not output_location or ATHENA_S3_RESULT_MIN_BYTES <= 0:
+        return False
+    if max_rows is not None and max_rows < page_size:
+        return False
+    if not output_location.endswith('.csv'):
+        return False
+    size = result_object_size(output_location)
+    return size is not None and size >= ATHENA_S3_RESULT_MIN_BYTES
+
+
+def _parse_csv(lines) -> Iterator[dict]:
+    """
+    Parses Athena's output CSV. Every value is quoted, so an unquoted empty
+    field is a NULL; it is mapped to None like a missing VarCharValue. Quoted
+    empty strings are indistinguishable to the csv module and also become None.
+    """
+    reader = csv.reader(lines)
+    headers = next(reader, None)
+    if headers is None:
+        return
+    for record in reader:
+        yield {header: (value if value != "" else None) for header, value in zip(headers, record)}
+
+
+@observe_dependency("s3", "athena_result_csv")
+def _open_result_object(output_location: str):
+    bucket, key = split_s3_uri(output_location)
+    return S3_CLIENT.get_object(Bucket=bucket, Key=key)['Body']
+
+
+def iter_s3_query_results(output_location: str, max_rows: Optional[int] = None) -> Iterator[dict]:
+    """
+    Streams a query's output CSV from S3 and yields rows as dictionaries,
+    parsed incrementally. The download is closed as soon as `max_rows` rows
+    have been produced.
+    """
+    body = _open_result_object(output_location)
+    try:
+        # newline='' keeps line breaks inside quoted values intact for csv
+        rows = _parse_csv(io.TextIOWrapper(body, encoding='utf-8', newline=''))
+        yield from (rows if max_rows is None else islice(rows, max_rows))
+    except (BotoCoreError, ClientError) as e:
+        logger.exception(f"Error streaming Athena results from {output_location}: {e}")
+        raise
+    finally:
+        body.close()
+
+
+def iter_s3_result_rows(output_location: str, max_rows: Optional[int] = None) -> Iterator[list]:
+    """
+    Like iter_s3_query_results, but yields each row as a list of strings
+    (None for NULL) in column order, without the header row.
+    """
+    body = _open_result_object(output_location)
+    try:
+        reader = csv.reader(io.TextIOWrapper(body, encoding='utf-8', newline=''))
+        next(reader, None)
+        rows = ([value if value != "" else None for value in record] for record in reader)
+        yield from (rows if max_rows is None else islice(rows, max_rows))
+    except (BotoCoreError, ClientError) as e:
+        logger.exception(f"Error streaming Athena results from {output_location}: {e}")
+        raise
+    finally:
+        body.close()
+
+
+def iter_result_object_chunks(output_location: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    Yields the raw bytes of a query's output CSV in chunks of at most
+    `chunk_size`, for passing the file through unchanged.
+    """
+    body = _open_result_object(output_location)
+    try:
+        yield from body.iter_chunks(chunk_size)
+    except (BotoCoreError, ClientError) as e:
+        logger.exception(f"Error streaming Athena results from {output_location}: {e}")
+        raise
+    finally:
+        body.close()
+
+
+@observe_dependency("s3", "athena_result_download")
+def download_result_object(output_location: str, path: str) -> None:
+    """
+    Downloads a query's output CSV to a local file.
+    """
+    bucket, key = split_s3_uri(output_location)
+    S3_CLIENT.download_file(bucket, key, path)
+
+
+def _benchmark(sizes=(1000, 10000, 100000), api_latency: float = 0.15, s3_latency: float = 0.03,
+               s3_bandwidth: float = 50e6) -> None:
+    """
+    Compares reading results through paged GetQueryResults with streaming the
+    CSV from S3, against in-process stand-ins for both services. Each request
+    costs a fixed latency; S3 reads also pay for transferred bytes.
+
+    Run with: python -m app.utils.athena_s3_reader [--api-latency S] [--s3-latency S]
+    """
+    import time
+    from unittest import mock
+    from botocore.response import StreamingBody
+    import app.utils.athena_client as athena_client
+
+    columns = ["id", "name", "amount", "status", "created_at", "deeplink"]
+
+    def make_rows(count):
+        return [
+            [f"{i:08d}", f"member name {i}", f"{i * 3.17:.2f}", "CLOSED" if i % 3 else "OPEN",
+             "2024-05-01 12:00:00.000", f"https://example.com/tx/{i}"]
+            for i in range(count)
+        ]
+
+    class FakeAthena:
+        def __init__(self, rows):
+            self.rows = rows
+
+        def get_query_results(self, QueryExecutionId, MaxResults, NextToken=None):
+            time.sleep(api_latency)
+            start = int(NextToken or 0)
+            header = [] if start else [{'Data': [{'VarCharValue': c} for c in columns]}]
+            end = min(start + MaxResults - len(header), len(self.rows))
+            page = header + [{'Data': [{'VarCharValue': v} for v in row]} for row in self.rows[start:end]]
+            response = {'ResultSet': {
+                'Rows': page,
+                'ResultSetMetadata': {'ColumnInfo': [{'Name': c, 'Type': 'varchar'} for c in columns]},
+            }}
+            if end < len(self.rows):
+                response['NextToken'] = str(end)
+            return response
+
+    class SlowStream(io.BytesIO):
+        def read(self, size=-1):
+            data = super().read(size)
+            time.sleep(len(data) / s3_bandwidth)
+            return data
+
+    class FakeS3:
+        def __init__(self, payload):
+            self.payload = payload
+
+        def head_object(self, Bucket, Key):
+            time.sleep(s3_latency)
+            return {'ContentLength': len(self.payload)}
+
+        def get_object(self, Bucket, Key):
+            time.sleep(s3_latency)
+            return {'Body': StreamingBody(SlowStream(self.payload), len(self.payload))}
+
+    for count in sizes:
+        rows = make_rows(count)
+        out = io.StringIO()
+        csv.writer(out, quoting=csv.QUOTE_ALL, lineterminator="\n").writerows([columns] + rows)
+        payload = out.getvalue().encode("utf-8")
+        with mock.patch.object(athena_client, "ATHENA_CLIENT", FakeAthena(rows)), \
+                mock.patch(__name__ + ".S3_CLIENT", FakeS3(payload)):
+            start = time.perf_counter()
+            api_rows = list(athena_client.iter_query_results("bench"))
+            api_elapsed = time.perf_counter() - start
+            start = time.perf_counter()
+            s3_rows = list(iter_s3_query_results("s3://bench/results/bench.csv"))
+            s3_elapsed = time.perf_counter() - start
+        assert api_rows == s3_rows
+        print(
+            f"{count:>7} rows ({len(payload) / 1e6:6.2f} MB): "
+            f"GetQueryResults {api_elapsed:7.3f}s, S3 CSV {s3_elapsed:7.3f}s, "
+            f"speedup {api_elapsed / s3_elapsed:5.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the Athena S3 result reader against GetQueryResults.")
+    parser.add_argument("--api-latency", type=float, default=0.15, help="Seconds per GetQueryResults call")
+    parser.add_argument("--s3-latency", type=float, default=0.03, help="Seconds to first byte per S3 request")
+    parser.add_argument("--s3-bandwidth", type=float, default=50e6, help="S3 download bytes per second")
+    args = parser.parse_args()
+    _benchmark(api_latency=args.api_latency, s3_latency=args.s3_latency, s3_bandwidth=args.s3_bandwidth)
@@ -0,0 +1,191 @@
+import os
+import time
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from app.utils.metrics import ATHENA_QUERIES_IN_FLIGHT, ATHENA_QUEUE_TIME
+
+load_dotenv()
+
+# ------------------------ Configuration ------------------------
+
+# Queries this deployment may have running on Athena at once (per workgroup); 0 disables the limit.
+# Each gunicorn worker gets an equal share (at least 1); with several replicas, divide by them too.
+ATHENA_MAX_CONCURRENT_QUERIES = int(os.getenv("ATHENA_MAX_CONCURRENT_QUERIES", "10"))
+# Per-workgroup overrides, e.g. "primary=10,reporting=2"
+ATHENA_WORKGROUP_QUOTAS = os.getenv("ATHENA_WORKGROUP_QUOTAS", "")
+# Worker processes sharing the quota; gunicorn reads the same variable for its worker count
+WEB_CONCURRENCY = max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+# Seconds after which a queued query is served ahead of every priority class
+ATHENA_QUEUE_AGING = float(os.getenv("ATHENA_QUEUE_AGING", "10"))
+
+# Priority classes; lower values are served first
+PRIORITY_CHAT = 0
+PRIORITY_TABLE_DESCRIPTION = 1
+PRIORITY_BACKGROUND = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_CHAT: "chat",
+    PRIORITY_TABLE_DESCRIPTION: "table_description",
+    PRIORITY_BACKGROUND: "background",
+}
+
+
+class AthenaQueueTimeout(Exception):
+    """
+    Raised when a caller's deadline passes while its query is still queued.
+    The query was never started on Athena.
+    """
+
+
+@dataclass
+class _Waiter:
+    priority: int
+    sequence: int
+    enqueued_at: float
+    future: asyncio.Future = field(repr=False)
+
+
+class AthenaScheduler:
+    """
+    Bounds the number of Athena queries a worker has in flight.
+
+    Callers wait for a slot in priority order (chat before table-description
+    jobs) and first-come first-served within a class. A waiter that has been
+    queued for longer than `aging` seconds is served before any newer waiter
+    regardless of class, so background jobs are delayed but never starved.
+    """
+
+    def __init__(self, max_in_flight: int = ATHENA_MAX_CONCURRENT_QUERIES, aging: float = ATHENA_QUEUE_AGING,
+                 workgroup: str = "default"):
+        self.max_in_flight = max_in_flight
+        self.aging = aging
+        self.workgroup = workgroup
+        self.in_flight = 0
+        self._waiters: List[_Waiter] = []
+        self._sequence = itertools.count()
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        now = time.monotonic()
+        pending = [waiter for waiter in self._waiters if not waiter.future.done()]
+        if not pending:
+            self._waiters.clear()
+            return None
+        waiter = min(
+            pending,
+            key=lambda w: (w.priority if now - w.enqueued_at < self.aging else -1, w.sequence),
+        )
+        self._waiters.remove(waiter)
+        return waiter
+
+    def _release(self) -> None:
+        waiter = self._next_waiter()
+        if waiter is None:
+            self.in_flight -= 1
+            ATHENA_QUERIES_IN_FLIGHT.dec()
+            return
+        # The slot passes straight to the waiter; in_flight is unchanged
+        waiter.future.set_result(None)
+
+    async def _acquire(self, priority: int, timeout: Optional[float]) -> None:
+        if self.max_in_flight <= 0 or (self.in_flight < self.max_in_flight and not self._waiters):
+            self.in_flight += 1
+            ATHENA_QUERIES_IN_FLIGHT.inc()
+            return
+        waiter = _Waiter(priority, next(self._sequence), time.monotonic(), asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter.future, timeout)
+        except asyncio.TimeoutError:
+            raise AthenaQueueTimeout(
+                f"No Athena slot in workgroup {self.workgroup} within {timeout:.1f}s "
+                f"({self.in_flight} running, {len(self._waiters)} queued)."
+            ) from None
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # The slot was handed over just as the caller gave up
+                self._release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_CHAT, timeout: Optional[float] = None):
+        """
+        Holds one in-flight slot for the duration of the block, which should
+        cover starting the query and waiting for it to finish.
+
+        Yields the part of `timeout` left after queueing, to be passed on as
+        the query's own timeout so the caller's overall deadline holds (the
+        poller stops the query on Athena when it runs out).
+        """
+        start = time.monotonic()
+        try:
+            await self._acquire(priority, timeout)
+        finally:
+            ATHENA_QUEUE_TIME.labels(priority=PRIORITY_NAMES.get(priority, str(priority))).observe(
+                time.monotonic() - start
+            )
+        queued = time.monotonic() - start
+        if queued > 0.5:
+            logger.info(f"Athena query waited {queued:.2f}s for a slot in workgroup {self.workgroup}.")
+        try:
+            yield None if timeout is None else max(timeout - queued, 0.0)
+        finally:
+            self._release()
+
+    def snapshot(self) -> dict:
+        return {
+            "workgroup": self.workgroup,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "max_in_flight": self.max_in_flight,
+        }
+
+
+def _parse_quotas(value: str) -> Dict[str, int]:
+    quotas = {}
+    for item in value.split(","):
+        if "=" in item:
+            workgroup, quota = item.split("=", 1)
+            quotas[workgroup.strip()] = int(quota)
+    return quotas
+
+
+def worker_share(quota: int, workers: int = WEB_CONCURRENCY) -> int:
+    """
+    The part of a workgroup quota one worker may use, so that all workers
+    together stay within it.
+    """
+    if quota <= 0:
+        return quota
+    return max(quota // workers, 1)
+
+
+_schedulers: Dict[str, AthenaScheduler] = {}
+
+
+def get_athena_scheduler(workgroup: Optional[str] = None) -> AthenaScheduler:
+    """
+    Returns the worker's scheduler for the given workgroup, creating it with
+    this worker's share of the workgroup's quota on first use.
+    """
+    workgroup = workgroup or "primary"
+    scheduler = _schedulers.get(workgroup)
+    if scheduler is None:
+        quota = _parse_quotas(ATHENA_WORKGROUP_QUOTAS).get(workgroup, ATHENA_MAX_CONCURRENT_QUERIES)
+        share = worker_share(quota)
+        if quota > 0 and share * WEB_CONCURRENCY > quota:
+            logger.warning(
+                f"Athena quota {quota} for workgroup {workgroup} is below the {WEB_CONCURRENCY} workers; "
+                f"each may still run one query."
+            )
+        scheduler = _schedulers[workgroup] = AthenaScheduler(share, workgroup=workgroup)
+    return scheduler
@@ -0,0 +1,284 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import datetime
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+from loguru import logger
+
+from app.utils.conversation_summary import extract_keywords
+from app.utils.llm import async_generate_embedding, async_generate_embeddings
+from app.utils.metrics import record_cache_lookup
+from app.utils.sql_validator import DdlColumn, DdlTable, parse_ddl, schema_from_tables, validate_sql
+
+try:
+    import tiktoken
+except ImportError:  # only used by the offline report; falls back to ~4 characters per token
+    tiktoken = None
+
+load_dotenv()
+
+# ------------------------ Configuration ------------------------
+
+COLUMN_RETRIEVAL_ENABLED = os.getenv("COLUMN_RETRIEVAL_ENABLED", "false").lower() in ("1", "true", "yes")
+# Columns picked by similarity per table, on top of keys, partition and always-kept columns
+COLUMN_RETRIEVAL_TOP_N = int(os.getenv("COLUMN_RETRIEVAL_TOP_N", "12"))
+# Tables with at most this many columns are always shown whole
+COLUMN_RETRIEVAL_MIN_COLUMNS = int(os.getenv("COLUMN_RETRIEVAL_MIN_COLUMNS", "15"))
+# Minimum cosine similarity between the question and a column for it to be picked
+COLUMN_RETRIEVAL_MIN_SIMILARITY = float(os.getenv("COLUMN_RETRIEVAL_MIN_SIMILARITY", "0.2"))
+# Columns shown whenever a table has them (the member filter and the deeplink)
+COLUMN_RETRIEVAL_ALWAYS_KEEP = {
+    c.strip().lower() for c in os.getenv("COLUMN_RETRIEVAL_ALWAYS_KEEP", "id,deeplink").split(",") if c.strip()
+}
+# Tables whose column embeddings are kept in memory
+COLUMN_INDEX_MAX_TABLES = int(os.getenv("COLUMN_INDEX_MAX_TABLES", "64"))
+
+
+@dataclass
+class _TableColumns:
+    fingerprint: str
+    ddl: DdlTable
+    # One normalized row per column, in DDL order
+    matrix: np.ndarray
+
+
+def _fingerprint(description: str) -> str:
+    return hashlib.sha256(description.encode("utf-8")).hexdigest()
+
+
+def column_text(table_name: str, column: DdlColumn) -> str:
+    """
+    The text embedded for a column: its name (with underscores as spaces),
+    type, table and comment.
+    """
+    text = f"{column.name.replace('_', ' ')} ({column.type}) in table {table_name}"
+    return f"{text}: {column.comment}" if column.comment else text
+
+
+def render_ddl(header: str, ddl: DdlTable, columns: List[DdlColumn]) -> str:
+    """
+    Renders a compact CREATE TABLE with only the given columns; `header` is
+    the original statement up to the column list (e.g. "CREATE EXTERNAL
+    TABLE `db`.`t` ").
+    """
+    def line(column: DdlColumn) -> str:
+        comment = " COMMENT '{}'".format(column.comment.replace("'", "''")) if column.comment else ""
+        return f"  {column.name} {column.type}{comment}"
+
+    rendered = header.rstrip() + " (\n" + ",\n".join(line(c) for c in columns if not c.partition)
+    omitted = len(ddl.columns) - len(columns)
+    if omitted:
+        rendered += f"\n  -- {omitted} other columns not shown"
+    rendered += "\n)"
+    partition = [line(c) for c in columns if c.partition]
+    if partition:
+        rendered += " PARTITIONED BY (\n" + ",\n".join(partition) + "\n)"
+    return rendered
+
+
+class ColumnIndex:
+    """
+    Column-level index over the DDL in the table descriptions, used to show
+    the text-to-SQL model only the columns relevant to the question.
+
+    Each column (name, type and comment) is embedded once, in one batched
+    request per set of new tables, and cached by the description's hash, so a
+    changed description is re-embedded on its next use. For each selected
+    table the prompt keeps the keys, partition columns, always-kept columns,
+    columns named in the question and the top-N columns by cosine similarity
+    to the question; small tables are shown whole.
+    """
+
+    def __init__(self, embed_batch=async_generate_embeddings, top_n: int = COLUMN_RETRIEVAL_TOP_N,
+                 min_columns: int = COLUMN_RETRIEVAL_MIN_COLUMNS,
+                 min_similarity: float = COLUMN_RETRIEVAL_MIN_SIMILARITY,
+                 max_tables: int = COLUMN_INDEX_MAX_TABLES):
+        self.embed_batch = embed_batch
+        self.top_n = top_n
+        self.min_columns = min_columns
+        self.min_similarity = min_similarity
+        self.max_tables = max_tables
+        self._tables: "OrderedDict[str, _TableColumns]" = OrderedDict()
+
+    async def _columns_for(self, similar_tables: List[dict]) -> Dict[str, _TableColumns]:
+        """
+        Returns the indexed columns of each table with DDL, embedding the
+        columns of tables not yet indexed (or whose description changed).
+        """
+        found, pending = {}, []
+        for table in similar_tables:
+            name, description = table["table_name"], table.get("description") or ""
+            fingerprint = _fingerprint(description)
+            entry = self._tables.get(name)
+            if entry is not None and entry.fingerprint == fingerprint:
+                self._tables.move_to_end(name)
+                found[name] = entry
+                record_cache_lookup("column_index", True)
+                continue
+            ddl = parse_ddl(description)
+            if ddl is None or len(ddl.columns) <= self.min_columns:
+                continue
+            record_cache_lookup("column_index", False)
+            pending.append((name, fingerprint, ddl))
+
+        if pending:
+            texts = [column_text(name, column) for name, _, ddl in pending for column in ddl.columns]
+            vectors = np.asarray(await self.embed_batch(texts), dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1.0, norms)
+            offset = 0
+            for name, fingerprint, ddl in pending:
+                entry = _TableColumns(fingerprint, ddl, vectors[offset:offset + len(ddl.columns)])
+                offset += len(ddl.columns)
+                self._tables[name] = found[name] = entry
+            while len(self._tables) > self.max_tables:
+                self._tables.popitem(last=False)
+        return found
+
+    def _select(self, entry: _TableColumns, query: str, query_vector: np.ndarray) -> List[DdlColumn]:
+        columns = entry.ddl.columns
+        words = set(re.findall(r"[a-z0-9]+", query.lower())) | set(extract_keywords(query, max_keywords=20))
+        keep = set()
+        for index, column in enumerate(columns):
+            parts = set(column.name.split("_"))
+            if (column.key or column.partition or column.name in COLUMN_RETRIEVAL_ALWAYS_KEEP
+                    or column.name.endswith("_id") or column.name in words or parts & words - {"id"}):
+                keep.add(index)
+        scores = entry.matrix @ query_vector
+        ranked = [int(i) for i in np.argsort(-scores) if scores[i] >= self.min_similarity and int(i) not in keep]
+        keep.update(ranked[:self.top_n])
+        return [column for index, column in enumerate(columns) if index in keep]
+
+    async def compact_tables(self, query: str, embedding: Optional[List[float]],
+                             similar_tables: List[dict]) -> List[dict]:
+        """
+        Returns copies of `similar_tables` whose DDL keeps only the columns
+        relevant to `query`. Tables without parseable DDL, or small ones, are
+        returned unchanged.
+        """
+        if embedding is None:
+            embedding = await async_generate_embedding(query)
+        query_vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query_vector)
+        query_vector = query_vector / norm if norm else query_vector
+
+        indexed = await self._columns_for(similar_tables)
+        compacted = []
+        for table in similar_tables:
+            entry = indexed.get(table["table_name"])
+            if entry is None or entry.matrix.shape[1] != query_vector.shape[0]:
+                compacted.append(table)
+                continue
+            columns = self._select(entry, query, query_vector)
+            description, ddl = table["description"], entry.ddl
+            header = description[ddl.start:description.index("(", ddl.start)]
+            description = description[:ddl.start] + render_ddl(header, ddl, columns) + description[ddl.end:]
+            compacted.append({**table, "description": description})
+        return compacted
+
+    def clear(self) -> None:
+        self._tables.clear()
+
+
+# Process-wide index; used by the SQL generation node when enabled
+column_index = ColumnIndex()
+
+
+# ------------------------ Offline report ------------------------
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Tokens in `text` under o200k_base, or about len/4 when tiktoken or its
+    encoding file is unavailable (the lookup is tried once).
+    """
+    global _encoding
+    if _encoding is None:
+        _encoding = False
+        if tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding("o200k_base")
+            except Exception as e:
+                logger.warning(f"tiktoken encoding unavailable; estimating tokens as characters / 4: {e}")
+    return len(_encoding.encode(text)) if _encoding else len(text) // 4
+
+
+async def _athena_rows(sql: str) -> Optional[set]:
+    from app.utils.athena_client import async_get_result_set, async_run_athena_query, async_wait_for_query_execution
+
+    query_execution_id = await async_run_athena_query(sql)
+    execution = await async_wait_for_query_execution(query_execution_id)
+    if not execution.succeeded:
+        return None
+    result = await async_get_result_set(query_execution_id, output_location=execution.output_location)
+    return set(result.drop("deeplink").to_tuples())
+
+
+async def report(input_path: str, execute: bool = False) -> dict:
+    """
+    Builds the text-to-SQL prompt with full DDL and with retrieved columns
+    for each question, and compares prompt tokens, LLM latency and SQL
+    accuracy. SQL is valid when it passes the local validator against the
+    full schema; with `execute`, it is correct when its Athena result equals
+    that of the question's "expected_sql".
+    """
+    from app.langgraph.chat_flow import get_chat_workflow
+    from app.schemas.schema import ChatState
+
+    with open(input_path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    nodes = get_chat_workflow().workflow_nodes
+    nodes.sql_template_cache = None
+    modes = {"full": None, "columns": column_index}
+    today_date = datetime.datetime.now().strftime("%Y-%m-%d")
+    totals = {mode: {"tokens": 0, "llm_seconds": 0.0, "valid": 0, "correct": 0, "executed": 0} for mode in modes}
+
+    for row in rows:
+        state = await nodes.similarity_search(ChatState(query=row["query"], uuid=row.get("uuid")))
+        schema = schema_from_tables(state.similar_tables)
+        expected = await _athena_rows(row["expected_sql"]) if execute and row.get("expected_sql") else None
+        for mode, index in modes.items():
+            nodes.column_index = index
+            totals[mode]["tokens"] += count_tokens(await nodes.build_sql_prompt(state, today_date))
+            attempt = state.model_copy(deep=True)
+            start = time.perf_counter()
+            attempt = await nodes.generate_sql_query(attempt)
+            totals[mode]["llm_seconds"] += time.perf_counter() - start
+            totals[mode]["valid"] += bool(attempt.sql_query) and not validate_sql(attempt.sql_query, schema)
+            if expected is not None:
+                totals[mode]["executed"] += 1
+                totals[mode]["correct"] += bool(attempt.sql_query) and await _athena_rows(attempt.sql_query) == expected
+
+    count = max(len(rows), 1)
+    result = {"questions": len(rows)}
+    for mode, total in totals.items():
+        result[mode] = {
+            "mean_prompt_tokens": total["tokens"] / count,
+            "mean_llm_seconds": total["llm_seconds"] / count,
+            "valid_sql_rate": total["valid"] / count,
+        }
+        if total["executed"]:
+            result[mode]["correct_result_rate"] = total["correct"] / total["executed"]
+    if totals["full"]["tokens"]:
+        result["prompt_token_reduction"] = 1 - totals["columns"]["tokens"] / totals["full"]["tokens"]
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare full-DDL and column-retrieval text-to-SQL prompts.")
+    parser.add_argument("--input", required=True, help="JSONL with 'query' and optional 'uuid' and 'expected_sql'")
+    parser.add_argument("--execute", action="store_true", help="Run the SQL on Athena and compare results")
+    args = parser.parse_args()
+    logger.remove()
+    print(json.dumps(asyncio.run(report(args.input, args.execute)), indent=2))
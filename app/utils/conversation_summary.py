@@ -1,12 +1,61 @@
-from openai import OpenAI, OpenAIError
+from openai import AsyncOpenAI, OpenAI, OpenAIError
 import os
+import re
+import asyncio
+from collections import OrderedDict
 from loguru import logger
-from typing import Optional
+from typing import List, Optional
+
+from app.utils.sql_template_cache import normalize_question
+from app.utils.metrics import dependency_timer
 
 # Initialize OpenAI API key (adjust if you have a different setup)
 openai_api_key = os.getenv("OPENAI_API_KEY")
 
 client = OpenAI(api_key=openai_api_key)
+async_client = AsyncOpenAI(api_key=openai_api_key)
+
+# Seconds to wait for the LLM summary, once the answer is ready, before using the extractive fallback
+CONVERSATION_SUMMARY_TIMEOUT = float(os.getenv("CONVERSATION_SUMMARY_TIMEOUT", "3"))
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "1024"))
+
+# LLM summaries memoized per normalized question
+_summary_cache: "OrderedDict[str, str]" = OrderedDict()
+# Summaries still running after their response was sent; referenced until done
+_background_summaries = set()
+
+STOPWORDS = {
+    "a", "about", "all", "am", "an", "and", "any", "are", "as", "at", "be", "been", "by", "can", "could",
+    "did", "do", "does", "for", "from", "get", "give", "had", "has", "have", "how", "i", "in", "is", "it",
+    "its", "list", "me", "my", "of", "on", "or", "please", "show", "so", "tell", "than", "that", "the",
+    "their", "them", "there", "these", "this", "those", "to", "us", "was", "we", "were", "what", "when",
+    "where", "which", "who", "why", "will", "with", "would", "you", "your",
+}
+
+
+def extract_keywords(question: str, max_keywords: int = 4) -> List[str]:
+    """
+    Returns the first distinct non-stopword terms of the question, in order.
+    """
+    keywords = []
+    for word in re.findall(r"[A-Za-z0-9][A-Za-z0-9'-]*", question.lower()):
+        if word in STOPWORDS or len(word) < 2 or word in keywords:
+            continue
+        keywords.append(word)
+        if len(keywords) == max_keywords:
+            break
+    return keywords
+
+
+def extractive_summary(question: str) -> str:
+    """
+    Builds a short summary from the question's keywords without an LLM call.
+    """
+    keywords = extract_keywords(question)
+    if not keywords:
+        return question
+    return " ".join(word.capitalize() for word in keywords)
+
 
 def generate_conversation_summary(question: str) -> Optional[str]:
     """
@@ -36,4 +85,68 @@ def generate_conversation_summary(question: str) -> Optional[str]:
 
     except OpenAIError as e:
         logger.error(f"Failed to generate conversation summary: {e}")
-        return question
\ No newline at end of file
+        return question
+
+
+async def async_generate_conversation_summary(question: str) -> str:
+    """
+    Async, memoized variant of generate_conversation_summary.
+
+    Summaries are cached per normalized question. On an OpenAI error or an
+    empty completion the keyword-based summary is returned instead and
+    nothing is cached.
+
+    Args:
+        question (str): The user's question.
+
+    Returns:
+        str: The conversation summary.
+    """
+    key = normalize_question(question)
+    cached = _summary_cache.get(key)
+    if cached is not None:
+        _summary_cache.move_to_end(key)
+        logger.info(f"Conversation Summary (cached) :=======>> {cached}")
+        return cached
+
+    prompt_text = (
+        f"Summarize the core topic of the following user query in exactly 3-4 words: {question}"
+    )
+    try:
+        with dependency_timer("openai", "conversation_summary"):
+            response = await async_client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": prompt_text}],
+                max_tokens=10,
+                temperature=0.9,
+            )
+        summary_text = (response.choices[0].message.content or "").strip()
+    except OpenAIError as e:
+        logger.error(f"Failed to generate conversation summary: {e}")
+        return extractive_summary(question)
+    if not summary_text:
+        # An empty completion is a failure too; don't memoize it
+        logger.warning("Empty conversation summary from the LLM; using extractive summary.")
+        return extractive_summary(question)
+
+    logger.info(f"Conversation Summary :=======>> {summary_text}")
+    _summary_cache[key] = summary_text
+    while len(_summary_cache) > SUMMARY_CACHE_MAX_ENTRIES:
+        _summary_cache.popitem(last=False)
+    return summary_text
+
+
+async def resolve_conversation_summary(summary_task: asyncio.Task, question: str,
+                                       timeout: float = CONVERSATION_SUMMARY_TIMEOUT) -> str:
+    """
+    Awaits a summary started alongside the chat workflow, waiting at most
+    `timeout` more seconds. If it is still running, the extractive summary is
+    returned; the LLM call keeps running so its result is still memoized.
+    """
+    try:
+        return await asyncio.wait_for(asyncio.shield(summary_task), timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Conversation summary not ready after {timeout}s; using extractive summary.")
+        _background_summaries.add(summary_task)
+        summary_task.add_done_callback(_background_summaries.discard)
+        return extractive_summary(question)
@@ -0,0 +1,249 @@
+"""
+Local nearest-centroid intent classifier used as a fast path for
+ChatWorkflow.decide_next_step.
+
+The classifier holds one L2-normalized centroid per label, built from the
+embeddings of labelled past queries. A query is decided locally only when the
+cosine-similarity margin between the best and second-best centroid is at least
+`margin`; otherwise the caller falls back to the LLM prompt.
+
+Rebuild offline from a JSONL file of past queries (one {"query": ..., "label": ...}
+object per line; rows without a label, and every held-out row, are labelled
+with the LLM prompt):
+
+    python -m app.utils.intent_classifier --input queries.jsonl --output intent_classifier.npz
+"""
+import os
+import json
+import random
+import argparse
+import asyncio
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+
+# ------------------------ Configuration ------------------------
+
+INTENT_CLASSIFIER_PATH = os.getenv("INTENT_CLASSIFIER_PATH")
+# Overrides the margin calibrated at build time when set
+INTENT_CLASSIFIER_MARGIN = os.getenv("INTENT_CLASSIFIER_MARGIN")
+
+LABELS = ("database_query", "general_query")
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _margin_for_precision(correct: np.ndarray, margins: np.ndarray, target_precision: float) -> float:
+    """
+    The smallest margin at which the decisions at or above it are correct at
+    least `target_precision` of the time.
+    """
+    order = np.argsort(-margins)
+    precision = np.cumsum(correct[order]) / np.arange(1, len(order) + 1)
+    passing = np.nonzero(precision >= target_precision)[0]
+    # Keep every example down to the last point where precision still holds
+    return float(margins[order][passing[-1]]) if len(passing) else float(margins.max()) + 1e-6
+
+
+class IntentClassifier:
+    def __init__(self, labels: Sequence[str], centroids: np.ndarray, margin: float):
+        self.labels = list(labels)
+        self.centroids = _normalize_rows(np.asarray(centroids, dtype=np.float32))
+        self.margin = float(margin)
+
+    @classmethod
+    def fit(cls, embeddings: np.ndarray, labels: Sequence[str], margin: float = 0.0) -> "IntentClassifier":
+        """
+        Builds one centroid per label from the given query embeddings.
+        """
+        embeddings = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        labels = np.asarray(labels)
+        names = [label for label in LABELS if np.any(labels == label)]
+        if len(names) < 2:
+            raise ValueError("Both database_query and general_query examples are required.")
+        centroids = np.stack([embeddings[labels == name].mean(axis=0) for name in names])
+        return cls(names, centroids, margin)
+
+    def scores(self, embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the best label index and the margin over the runner-up for each row.
+        """
+        sims = _normalize_rows(np.atleast_2d(np.asarray(embeddings, dtype=np.float32))) @ self.centroids.T
+        ordered = np.sort(sims, axis=1)
+        return np.argmax(sims, axis=1), ordered[:, -1] - ordered[:, -2]
+
+    def predict(self, embedding: List[float]) -> Optional[str]:
+        """
+        Returns the label for a confidently separable query, or None if the
+        query is ambiguous and should go to the LLM.
+        """
+        best, margins = self.scores(np.asarray(embedding))
+        if margins[0] >= self.margin:
+            return self.labels[int(best[0])]
+        return None
+
+    def calibrate(self, embeddings: np.ndarray, labels: Sequence[str], target_precision: float = 0.99) -> float:
+        """
+        Sets the smallest margin at which local decisions on the given examples
+        agree with their labels at least `target_precision` of the time.
+        """
+        best, margins = self.scores(embeddings)
+        correct = np.asarray([self.labels[i] for i in best]) == np.asarray(labels)
+        self.margin = _margin_for_precision(correct, margins, target_precision)
+        return self.margin
+
+    def evaluate(self, embeddings: np.ndarray, labels: Sequence[str]) -> dict:
+        """
+        Reports coverage (share decided locally) and agreement with the labels.
+        """
+        best, margins = self.scores(embeddings)
+        predicted = np.asarray([self.labels[i] for i in best])
+        labels = np.asarray(labels)
+        confident = margins >= self.margin
+        covered = int(confident.sum())
+        return {
+            "examples": len(labels),
+            "coverage": covered / len(labels) if len(labels) else 0.0,
+            "local_accuracy": float((predicted[confident] == labels[confident]).mean()) if covered else None,
+            "nearest_centroid_accuracy": float((predicted == labels).mean()) if len(labels) else None,
+            "margin": self.margin,
+        }
+
+    def save(self, path: str) -> None:
+        np.savez(path, labels=np.asarray(self.labels), centroids=self.centroids, margin=np.float32(self.margin))
+
+    @classmethod
+    def load(cls, path: str) -> "IntentClassifier":
+        data = np.load(path)
+        return cls([str(label) for label in data["labels"]], data["centroids"], float(data["margin"]))
+
+
+def cross_validated_margin(embeddings: np.ndarray, labels: Sequence[str], target_precision: float = 0.99,
+                           folds: int = 5, seed: int = 7) -> float:
+    """
+    Calibrates the margin on out-of-fold decisions: each fold is scored by
+    centroids fitted on the other folds. Calibrating on the examples the
+    centroids were fitted on overstates their margins and lets too many
+    ambiguous queries skip the LLM.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    labels = np.asarray(labels)
+    indices = list(range(len(labels)))
+    random.Random(seed).shuffle(indices)
+    folds = max(2, min(folds, len(indices)))
+    correct, margins = [], []
+    for fold in range(folds):
+        held = indices[fold::folds]
+        skipped = set(held)
+        rest = [i for i in indices if i not in skipped]
+        model = IntentClassifier.fit(embeddings[rest], labels[rest])
+        best, fold_margins = model.scores(embeddings[held])
+        correct.append(np.asarray(model.labels)[best] == labels[held])
+        margins.append(fold_margins)
+    return _margin_for_precision(np.concatenate(correct), np.concatenate(margins), target_precision)
+
+
+def load_intent_classifier(path: str = INTENT_CLASSIFIER_PATH) -> Optional[IntentClassifier]:
+    """
+    Loads the classifier configured by INTENT_CLASSIFIER_PATH, or returns None
+    if none is configured or it cannot be read.
+    """
+    if not path:
+        return None
+    try:
+        classifier = IntentClassifier.load(path)
+    except (OSError, KeyError, ValueError) as e:
+        logger.error(f"Error loading intent classifier from {path}: {e}")
+        return None
+    if INTENT_CLASSIFIER_MARGIN:
+        classifier.margin = float(INTENT_CLASSIFIER_MARGIN)
+    logger.info(f"Loaded intent classifier from {path} (margin={classifier.margin:.4f})")
+    return classifier
+
+
+# ------------------------ Offline build ------------------------
+
+def _embed_batch(texts: List[str], batch_size: int = 100) -> np.ndarray:
+    import openai
+    from app.utils.llm import EMBEDDING_MODEL
+
+    vectors = []
+    for i in range(0, len(texts), batch_size):
+        response = openai.embeddings.create(input=texts[i:i + batch_size], model=EMBEDDING_MODEL)
+        vectors.extend(item.embedding for item in response.data)
+    return np.asarray(vectors, dtype=np.float32)
+
+
+async def _label_with_llm(queries: List[str]) -> List[str]:
+    from app.langgraph.chat_flow import get_chat_workflow
+
+    workflow = get_chat_workflow()
+    return await asyncio.gather(*(workflow.classify_query(query, use_local=False) for query in queries))
+
+
+def build(input_path: str, output_path: str, test_fraction: float = 0.2,
+          target_precision: float = 0.99, seed: int = 7) -> dict:
+    """
+    Builds the classifier from labelled past queries and saves it, fitted on
+    every example with a cross-validated margin.
+
+    The held-out split is labelled with the LLM prompt, whatever the file
+    says, and the accuracy is reported against those labels, since the local
+    classifier stands in for that prompt. The model evaluated there is fitted
+    and calibrated on the training split only. Rows of the training split
+    without a label are labelled with the LLM too.
+    """
+    with open(input_path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    queries = [row["query"] for row in rows]
+    labels = [row.get("label") for row in rows]
+    supplied = list(labels)
+
+    indices = list(range(len(queries)))
+    random.Random(seed).shuffle(indices)
+    split = int(len(indices) * (1 - test_fraction))
+    train, test = indices[:split], indices[split:]
+
+    to_label = sorted(set(test) | {i for i in train if labels[i] not in LABELS})
+    if to_label:
+        logger.info(f"Labelling {len(to_label)} queries with the LLM classifier...")
+        llm_labels = asyncio.run(_label_with_llm([queries[i] for i in to_label]))
+        for i, label in zip(to_label, llm_labels):
+            labels[i] = label
+
+    embeddings = _embed_batch(queries)
+
+    report = {}
+    if test:
+        train_labels = [labels[i] for i in train]
+        held_out = IntentClassifier.fit(embeddings[train], train_labels)
+        held_out.margin = cross_validated_margin(embeddings[train], train_labels, target_precision, seed=seed)
+        report = held_out.evaluate(embeddings[test], [labels[i] for i in test])
+        checked = [i for i in test if supplied[i] in LABELS]
+        if checked:
+            report["supplied_label_agreement"] = sum(supplied[i] == labels[i] for i in checked) / len(checked)
+
+    classifier = IntentClassifier.fit(embeddings, labels)
+    classifier.margin = cross_validated_margin(embeddings, labels, target_precision, seed=seed)
+    classifier.save(output_path)
+    report["saved_margin"] = classifier.margin
+    report["output"] = output_path
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the local intent classifier from labelled past queries.")
+    parser.add_argument("--input", required=True, help="JSONL file with 'query' and optional 'label' fields")
+    parser.add_argument("--output", default="intent_classifier.npz")
+    parser.add_argument("--test-fraction", type=float, default=0.2)
+    parser.add_argument("--target-precision", type=float, default=0.99)
+    args = parser.parse_args()
+    print(json.dumps(build(args.input, args.output, args.test_fraction, args.target_precision), indent=2))
@@ -1,10 +1,12 @@
 import os
 import textwrap
+from typing import List
 from dotenv import load_dotenv
 from loguru import logger
 import openai  # Import the OpenAI package for embeddings
-from openai import OpenAI, OpenAIError  # Used for the OpenRouter client and error handling
+from openai import AsyncOpenAI, OpenAI, OpenAIError  # Used for the OpenRouter client and error handling
 from app.modules.s3_config import upload_to_s3
+from app.utils.metrics import observe_dependency
 
 load_dotenv()
 
@@ -24,6 +26,9 @@ OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 # Set the OpenAI API key for the embeddings call
 openai.api_key = OPENAI_API_KEY
 
+# Shared async client for callers running on the event loop
+async_openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+
 # ------------------------ GENERATE TABLE DESCRIPTION ------------------------
 
 def generate_table_description(result, table_name: str):
@@ -110,6 +115,7 @@ def generate_table_description(result, table_name: str):
         return "Error generating description from OpenAI model."
 
 
+@observe_dependency("openai", "embedding")
 def generate_embedding(text: str):
     """
     Given text, returns the embedding using the OpenAI API (text-embedding-3-small model).
@@ -126,3 +132,40 @@ def generate_embedding(text: str):
     except OpenAIError as e:
         logger.error(f"Error generating embedding: {e}")
         raise
+
+
+@observe_dependency("openai", "embedding")
+async def async_generate_embedding(text: str):
+    """
+    Async variant of generate_embedding that does not block the event loop.
+    """
+    try:
+        response = await async_openai_client.embeddings.create(
+            input=text,
+            model=EMBEDDING_MODEL
+        )
+        embedding = response.data[0].embedding
+        logger.info("Embedding generated successfully using OpenAI.")
+        return embedding
+    except OpenAIError as e:
+        logger.error(f"Error generating embedding: {e}")
+        raise
+
+
+@observe_dependency("openai", "embedding_batch")
+async def async_generate_embeddings(texts: List[str]) -> List[List[float]]:
+    """
+    Embeds several texts in one request. The embeddings are returned in the
+    order of `texts`.
+    """
+    try:
+        response = await async_openai_client.embeddings.create(
+            input=texts,
+            model=EMBEDDING_MODEL
+        )
+        embeddings = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        logger.info(f"Generated {len(embeddings)} embeddings in one request using OpenAI.")
+        return embeddings
+    except OpenAIError as e:
+        logger.error(f"Error generating embeddings: {e}")
+        raise
@@ -0,0 +1,267 @@
+import os
+import re
+import time
+import asyncio
+import threading
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from app.utils.athena_client import (
+    ATHENA_CHAT_MAX_ROWS,
+    ATHENA_DATABASE,
+    ATHENA_QUERY_TIMEOUT,
+    ATHENA_WORKGROUP,
+    async_run_athena_query,
+    async_wait_for_query_execution,
+    get_result_metadata,
+)
+from app.utils.athena_result_cache import referenced_tables
+from app.utils.athena_result_set import ResultSet
+from app.utils.athena_s3_reader import download_result_object
+from app.utils.athena_scheduler import PRIORITY_BACKGROUND, get_athena_scheduler
+from app.utils.metrics import dependency_timer
+
+try:
+    import duckdb
+except ImportError:  # optional dependency, only needed when the tier is enabled
+    duckdb = None
+
+load_dotenv()
+
+# ------------------------ Configuration ------------------------
+
+LOCAL_SQL_ENABLED = os.getenv("LOCAL_SQL_ENABLED", "false").lower() in ("1", "true", "yes")
+# Small, hot tables kept as local snapshots, e.g. "branch_codes,product_catalog"
+LOCAL_SQL_TABLES = [t.strip().lower() for t in os.getenv("LOCAL_SQL_TABLES", "").split(",") if t.strip()]
+LOCAL_SQL_SNAPSHOT_DIR = os.getenv("LOCAL_SQL_SNAPSHOT_DIR", "/tmp/local_sql_snapshots")
+# Seconds between snapshot exports
+LOCAL_SQL_REFRESH_INTERVAL = int(os.getenv("LOCAL_SQL_REFRESH_INTERVAL", "3600"))
+# Snapshots older than this are not queried; the query goes to Athena instead
+LOCAL_SQL_MAX_STALENESS = int(os.getenv("LOCAL_SQL_MAX_STALENESS", "7200"))
+# Seconds an export query may run on Athena
+LOCAL_SQL_EXPORT_TIMEOUT = float(os.getenv("LOCAL_SQL_EXPORT_TIMEOUT", str(ATHENA_QUERY_TIMEOUT * 5)))
+
+ENGINE_LOCAL = "local"
+ENGINE_ATHENA = "athena"
+
+_DECIMAL = re.compile(r"decimal\(\d+,\s*\d+\)")
+
+# Known cases where DuckDB runs Athena (Trino) SQL without error but answers
+# differently; these do not fall back. Integer division is made to match
+# (SET integer_division); the rest remain:
+#   - division by zero returns NULL where Athena fails the query
+#   - date_trunc on a DATE returns a TIMESTAMP rather than a DATE
+#   - sum() of integers is HUGEINT (INT128) rather than BIGINT; the values match
+
+
+def duckdb_type(athena_type: str) -> str:
+    """
+    Maps an Athena column type to the DuckDB type used to read the export CSV.
+    Complex types (array, map, row, json) are kept as text.
+    """
+    athena_type = (athena_type or "").lower()
+    simple = {
+        "boolean": "BOOLEAN", "tinyint": "TINYINT", "smallint": "SMALLINT", "integer": "INTEGER",
+        "int": "INTEGER", "bigint": "BIGINT", "real": "FLOAT", "float": "FLOAT", "double": "DOUBLE",
+        "date": "DATE", "timestamp": "TIMESTAMP",
+    }
+    if athena_type in simple:
+        return simple[athena_type]
+    if _DECIMAL.fullmatch(athena_type):
+        return athena_type.upper()
+    return "VARCHAR"
+
+
+def _quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _quote_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+class LocalSqlTier:
+    """
+    Runs generated SQL against local Parquet snapshots of small Athena tables
+    with DuckDB, avoiding Athena's start-and-poll overhead.
+
+    Snapshots are exported from Athena on a schedule (the result CSV is
+    downloaded from S3 and rewritten as Parquet with the Athena column types)
+    and exposed as views named after the tables, in both the default schema
+    and a schema named after ATHENA_DATABASE. A query is only run locally when
+    every table it reads has a fresh snapshot; anything DuckDB cannot run
+    (Athena-only functions, syntax differences) falls back to Athena. SQL that
+    DuckDB runs with different semantics does not fall back; the known cases
+    are listed next to duckdb_type.
+    """
+
+    def __init__(self, tables: List[str] = LOCAL_SQL_TABLES, snapshot_dir: str = LOCAL_SQL_SNAPSHOT_DIR,
+                 max_staleness: int = LOCAL_SQL_MAX_STALENESS, database: Optional[str] = ATHENA_DATABASE):
+        self.tables = list(tables)
+        self.snapshot_dir = snapshot_dir
+        self.max_staleness = max_staleness
+        self.database = database
+        self._connection = None
+        # table name -> snapshot time (epoch seconds)
+        self._snapshots: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def available(self) -> bool:
+        return duckdb is not None and bool(self.tables)
+
+    def _snapshot_path(self, table: str) -> str:
+        return os.path.join(self.snapshot_dir, f"{table}.parquet")
+
+    def load_snapshots(self) -> None:
+        """
+        (Re)opens the DuckDB connection over the snapshot files on disk. Files
+        written by another worker are picked up here as well.
+        """
+        if not self.available:
+            return
+        connection = duckdb.connect(":memory:")
+        # Athena divides integers as integers (7/2 = 3); DuckDB returns 3.5 unless told
+        # otherwise. GLOBAL so the per-query cursors inherit it.
+        connection.execute("SET GLOBAL integer_division = true")
+        snapshots = {}
+        schemas = ["main"]
+        if self.database:
+            connection.execute(f"CREATE SCHEMA IF NOT EXISTS {_quote_identifier(self.database)}")
+            schemas.append(self.database)
+        for table in self.tables:
+            path = self._snapshot_path(table)
+            if not os.path.exists(path):
+                continue
+            for schema in schemas:
+                connection.execute(
+                    f"CREATE VIEW {_quote_identifier(schema)}.{_quote_identifier(table)} AS "
+                    f"SELECT * FROM read_parquet({_quote_literal(path)})"
+                )
+            snapshots[table] = os.path.getmtime(path)
+        with self._lock:
+            previous, self._connection, self._snapshots = self._connection, connection, snapshots
+        if previous is not None:
+            previous.close()
+        logger.info(f"Loaded local SQL snapshots: {sorted(snapshots)}")
+
+    def is_fresh(self, table: str) -> bool:
+        snapshot_time = self._snapshots.get(table)
+        return snapshot_time is not None and time.time() - snapshot_time <= self.max_staleness
+
+    def eligible(self, sql: str) -> bool:
+        tables = referenced_tables(sql)
+        return bool(tables) and all(self.is_fresh(table) for table in tables)
+
+    def _execute(self, sql: str) -> ResultSet:
+        with self._lock:
+            # A cursor is a separate DuckDB connection to the same database, safe to use from this thread
+            cursor = self._connection.cursor()
+        try:
+            cursor.execute(sql)
+            columns = [column[0] for column in cursor.description]
+            types = [str(column[1]).lower() for column in cursor.description]
+            # Same row cap as the Athena path, whatever LIMIT the query has
+            rows = cursor.fetchmany(ATHENA_CHAT_MAX_ROWS)
+        finally:
+            cursor.close()
+        data = [list(values) for values in zip(*rows)] if rows else [[] for _ in columns]
+        return ResultSet(columns, types, data)
+
+    async def try_execute(self, sql: str) -> Optional[ResultSet]:
+        """
+        Runs the query locally when every table it reads has a fresh snapshot.
+        Returns None (the caller then uses Athena) if the query is not
+        eligible or DuckDB cannot run it.
+        """
+        if self._connection is None or not self.eligible(sql):
+            return None
+        try:
+            with dependency_timer("duckdb", "query"):
+                return await asyncio.to_thread(self._execute, sql)
+        except duckdb.Error as e:
+            logger.info(f"Local SQL tier cannot run the query, using Athena: {e}")
+            return None
+
+    async def export_table(self, table: str) -> None:
+        """
+        Exports one table from Athena and atomically replaces its snapshot.
+        """
+        async with get_athena_scheduler(ATHENA_WORKGROUP).slot(PRIORITY_BACKGROUND, LOCAL_SQL_EXPORT_TIMEOUT) as timeout:
+            query_execution_id = await async_run_athena_query(f"SELECT * FROM {_quote_identifier(table)}")
+            execution = await async_wait_for_query_execution(query_execution_id, timeout, history_key=table)
+        if not execution.succeeded or not execution.output_location:
+            raise RuntimeError(f"Export of {table} did not succeed: {execution.state} ({execution.state_change_reason})")
+        columns, types = await asyncio.to_thread(get_result_metadata, query_execution_id)
+        await asyncio.to_thread(self._write_snapshot, table, execution.output_location, columns, types)
+        logger.info(f"Refreshed local SQL snapshot of {table}.")
+
+    def _write_snapshot(self, table: str, output_location: str, columns: List[str], types: List[str]) -> None:
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        csv_path = os.path.join(self.snapshot_dir, f".{table}.{os.getpid()}.csv")
+        parquet_path = os.path.join(self.snapshot_dir, f".{table}.{os.getpid()}.parquet")
+        try:
+            download_result_object(output_location, csv_path)
+            column_types = ", ".join(
+                f"{_quote_literal(name)}: {_quote_literal(duckdb_type(t))}" for name, t in zip(columns, types)
+            )
+            with duckdb.connect(":memory:") as connection:
+                # Athena writes NULL as an unquoted empty field and '' as ""
+                connection.execute(
+                    f"COPY (SELECT * FROM read_csv({_quote_literal(csv_path)}, header = true, "
+                    f"columns = {{{column_types}}}, allow_quoted_nulls = false)) "
+                    f"TO {_quote_literal(parquet_path)} (FORMAT PARQUET)"
+                )
+            os.replace(parquet_path, self._snapshot_path(table))
+        finally:
+            for path in (csv_path, parquet_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    async def refresh(self, force: bool = False) -> None:
+        """
+        Exports every table whose snapshot is older than the refresh interval
+        (or all of them with `force`) and reloads the connection.
+        """
+        for table in self.tables:
+            path = self._snapshot_path(table)
+            if not force and os.path.exists(path) and time.time() - os.path.getmtime(path) < LOCAL_SQL_REFRESH_INTERVAL:
+                continue
+            try:
+                await self.export_table(table)
+            except Exception as e:
+                logger.error(f"Error refreshing local SQL snapshot of {table}: {e}")
+        await asyncio.to_thread(self.load_snapshots)
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await self.refresh()
+            await asyncio.sleep(LOCAL_SQL_REFRESH_INTERVAL / 4)
+
+    def start(self) -> None:
+        """
+        Loads the existing snapshots and starts the background refresh loop.
+        """
+        if not self.available:
+            if self.tables and duckdb is None:
+                logger.warning("LOCAL_SQL_TABLES is set but duckdb is not installed; the local SQL tier is off.")
+            return
+        self.load_snapshots()
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+
+# Process-wide tier; started from the application lifespan when enabled
+local_sql_tier = LocalSqlTier()
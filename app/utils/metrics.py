@@ -0,0 +1,177 @@
+import os
+import time
+import functools
+import inspect
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+# When PROMETHEUS_MULTIPROC_DIR is set (gunicorn with several workers) every
+# worker writes its samples to that directory and /metrics aggregates them.
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Latency buckets (seconds) spanning cache hits to slow Athena scans
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+NODE_LATENCY = Histogram(
+    "workflow_node_duration_seconds",
+    "Latency of each LangGraph workflow node",
+    ["node"],
+    buckets=LATENCY_BUCKETS,
+)
+DEPENDENCY_LATENCY = Histogram(
+    "dependency_duration_seconds",
+    "Latency of calls to external dependencies",
+    ["dependency", "operation", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+CHAT_ROUTES = Counter(
+    "chat_route_total",
+    "Chat queries by routing decision",
+    ["route"],
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by cache and result",
+    ["cache", "result"],
+)
+SQL_QUERIES = Counter(
+    "sql_queries_total",
+    "Chat SQL queries by where they ran (result cache, local tier or Athena)",
+    ["engine"],
+)
+ATHENA_QUEUE_TIME = Histogram(
+    "athena_queue_duration_seconds",
+    "Time spent waiting for an Athena in-flight slot",
+    ["priority"],
+    buckets=LATENCY_BUCKETS,
+)
+ATHENA_QUERIES_IN_FLIGHT = Gauge(
+    "athena_queries_in_flight",
+    "Athena queries currently holding a scheduler slot",
+    multiprocess_mode="livesum",
+)
+RESULT_EXPORTS = Counter(
+    "sql_result_exports_total",
+    "Streamed SQL result exports by format and source (execution id or re-run query)",
+    ["format", "source"],
+)
+OPENSEARCH_POOL_SIZE = Gauge(
+    "opensearch_pool_max_connections",
+    "Connections each shared OpenSearch pool keeps open, by cluster and client (sync or async)",
+    ["cluster", "client"],
+    multiprocess_mode="livesum",
+)
+OPENSEARCH_REQUESTS_IN_FLIGHT = Gauge(
+    "opensearch_requests_in_flight",
+    "OpenSearch requests currently holding a pooled connection",
+    ["cluster", "client"],
+    multiprocess_mode="livesum",
+)
+OPENSEARCH_POOL_REQUESTS = Counter(
+    "opensearch_pool_requests_total",
+    "OpenSearch requests sent through the shared pools",
+    ["cluster", "client"],
+)
+OPENSEARCH_CONNECTIONS_OPENED = Counter(
+    "opensearch_connections_opened_total",
+    "OpenSearch connections opened; requests minus these reused a pooled connection",
+    ["cluster", "client"],
+)
+OPENSEARCH_POOL_SATURATED = Counter(
+    "opensearch_pool_saturated_total",
+    "OpenSearch requests that found every pooled connection busy (queued, or sent on a throwaway connection)",
+    ["cluster", "client"],
+)
+ATHENA_SCAN_BYTES_SAVED = Counter(
+    "athena_scan_bytes_saved_total",
+    "Bytes Athena did not scan because a cached result was served",
+)
+
+
+def _observe(histogram: Histogram, start: float, **labels) -> None:
+    histogram.labels(**labels).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def dependency_timer(dependency: str, operation: str):
+    """
+    Times a block of code that calls an external dependency.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        _observe(DEPENDENCY_LATENCY, start, dependency=dependency, operation=operation, outcome="error")
+        raise
+    _observe(DEPENDENCY_LATENCY, start, dependency=dependency, operation=operation, outcome="success")
+
+
+def observe_dependency(dependency: str, operation: str = None):
+    """
+    Decorator that records the latency of a sync or async dependency call.
+    The operation label defaults to the function name.
+    """
+    def decorator(func):
+        name = operation or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with dependency_timer(dependency, name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with dependency_timer(dependency, name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def observe_node(func):
+    """
+    Decorator for async WorkflowNodes methods that records per-node latency.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _observe(NODE_LATENCY, start, node=func.__name__)
+    return wrapper
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def render_metrics():
+    """
+    Returns (payload, content_type) for the /metrics endpoint, aggregating
+    every worker's samples in multiprocess mode.
+    """
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
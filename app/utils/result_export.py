@@ -0,0 +1,197 @@
+import io
+import os
+import csv
+import json
+import asyncio
+from itertools import islice
+from typing import AsyncIterator, Iterator, List, Optional
+
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+from loguru import logger
+
+from app.utils.athena_client import (
+    ATHENA_QUERY_TIMEOUT,
+    ATHENA_WORKGROUP,
+    QueryExecution,
+    aiter_query_results,
+    async_run_athena_query,
+    async_wait_for_query_execution,
+    get_query_execution,
+    get_result_metadata,
+    history_key_for,
+)
+from app.utils.athena_result_set import converter_for
+from app.utils.athena_s3_reader import iter_result_object_chunks, iter_s3_result_rows
+from app.utils.athena_scheduler import PRIORITY_BACKGROUND, get_athena_scheduler
+from app.utils.metrics import RESULT_EXPORTS
+from app.utils.sql_guard import REJECT, SqlGuard
+
+load_dotenv()
+
+# ------------------------ Configuration ------------------------
+
+# LIMIT the guard enforces on exported queries (chat queries use SQL_GUARD_MAX_LIMIT)
+EXPORT_MAX_ROWS = int(os.getenv("EXPORT_MAX_ROWS", "1000000"))
+# Seconds an export query may run on Athena
+EXPORT_QUERY_TIMEOUT = float(os.getenv("EXPORT_QUERY_TIMEOUT", str(ATHENA_QUERY_TIMEOUT * 5)))
+# Rows converted and sent per chunk
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "1000"))
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+class ExportError(Exception):
+    """
+    Raised when an export cannot be started; carries the HTTP status code.
+    """
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+async def _get_execution(query_execution_id: str) -> QueryExecution:
+    try:
+        return await asyncio.to_thread(get_query_execution, query_execution_id)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "InvalidRequestException":
+            raise ExportError(404, f"Unknown query execution {query_execution_id}.") from None
+        raise
+
+
+async def resolve_export(query_execution_id: Optional[str] = None, sql_query: Optional[str] = None,
+                         uuid: Optional[str] = None) -> QueryExecution:
+    """
+    Returns the finished query execution whose result is exported.
+
+    An execution id reuses the result file Athena already wrote, so nothing
+    is re-run; its SQL must still pass the guard for `uuid`. Otherwise
+    `sql_query` is guarded (with EXPORT_MAX_ROWS as the row limit) and run
+    at background priority.
+
+    Exports always belong to a member: without `uuid` nothing is looked up
+    or run, and the guard is enforced even when SQL_GUARD_MODE is "warn".
+    """
+    if not uuid:
+        raise ExportError(400, "uuid is required to export a result.")
+    guard = SqlGuard(max_limit=EXPORT_MAX_ROWS, explain=False, mode="enforce")
+    if query_execution_id:
+        execution = await _get_execution(query_execution_id)
+        decision = guard.check(execution.query or "", uuid)
+        if decision.action == REJECT:
+            raise ExportError(403, f"Export not allowed: {'; '.join(decision.reasons)}")
+        if not execution.succeeded:
+            raise ExportError(409, f"Query {query_execution_id} is {execution.state}, not SUCCEEDED.")
+        return execution
+
+    if not sql_query:
+        raise ExportError(400, "Either query_execution_id or sql_query is required.")
+    decision = await guard.review(sql_query, uuid)
+    if decision.action == REJECT:
+        raise ExportError(403, f"Export not allowed: {'; '.join(decision.reasons)}")
+    async with get_athena_scheduler(ATHENA_WORKGROUP).slot(PRIORITY_BACKGROUND, EXPORT_QUERY_TIMEOUT) as timeout:
+        query_execution_id = await async_run_athena_query(decision.sql)
+        execution = await async_wait_for_query_execution(
+            query_execution_id, timeout, history_key=history_key_for(decision.sql)
+        )
+    if not execution.succeeded:
+        raise ExportError(400, f"Query failed with state: {execution.state} ({execution.state_change_reason})")
+    return execution
+
+
+async def _aiter_in_thread(iterator: Iterator, batch_size: int) -> AsyncIterator[List]:
+    """
+    Drains a blocking iterator in worker threads, one batch at a time, so
+    only one batch is held in memory.
+    """
+    try:
+        while True:
+            batch = await asyncio.to_thread(lambda: list(islice(iterator, batch_size)))
+            if not batch:
+                return
+            yield batch
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            await asyncio.to_thread(close)
+
+
+def _has_result_file(execution: QueryExecution) -> bool:
+    return bool(execution.output_location) and execution.output_location.endswith(".csv")
+
+
+async def _aiter_row_batches(execution: QueryExecution):
+    """
+    Yields (columns, types, rows) per batch; rows are lists of strings
+    (None for NULL). Read from the S3 result file when there is one,
+    otherwise paged through GetQueryResults.
+    """
+    columns, types = await asyncio.to_thread(get_result_metadata, execution.query_execution_id)
+    if _has_result_file(execution):
+        rows = iter_s3_result_rows(execution.output_location)
+        async for batch in _aiter_in_thread(rows, EXPORT_BATCH_ROWS):
+            yield columns, types, batch
+        return
+    batch = []
+    async for row in aiter_query_results(execution.query_execution_id, page_size=EXPORT_BATCH_ROWS):
+        batch.append([row.get(column) for column in columns])
+        if len(batch) >= EXPORT_BATCH_ROWS:
+            yield columns, types, batch
+            batch = []
+    if batch:
+        yield columns, types, batch
+
+
+async def aiter_ndjson(execution: QueryExecution) -> AsyncIterator[bytes]:
+    """
+    Streams the result as one JSON object per line, with values converted
+    to their Athena column types (decimals, dates and timestamps as strings).
+    """
+    converters = None
+    async for columns, types, rows in _aiter_row_batches(execution):
+        if converters is None:
+            converters = [converter_for(t) for t in types]
+        lines = []
+        for row in rows:
+            record = {}
+            for column, convert, value in zip(columns, converters, row):
+                if value is not None and convert is not None:
+                    try:
+                        value = convert(value)
+                    except ValueError:
+                        pass
+                record[column] = value
+            lines.append(json.dumps(record, default=str))
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+async def aiter_csv(execution: QueryExecution) -> AsyncIterator[bytes]:
+    """
+    Streams the result as CSV. Athena's own result file is passed through
+    byte for byte; results without one are written from the API pages.
+    """
+    if _has_result_file(execution):
+        chunks = iter_result_object_chunks(execution.output_location)
+        async for batch in _aiter_in_thread(chunks, 1):
+            yield batch[0]
+    else:
+        header_written = False
+        async for columns, _, rows in _aiter_row_batches(execution):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, quoting=csv.QUOTE_ALL, lineterminator="\n")
+            if not header_written:
+                writer.writerow(columns)
+                header_written = True
+            writer.writerows(["" if value is None else value for value in row] for row in rows)
+            yield buffer.getvalue().encode("utf-8")
+
+
+def export_stream(execution: QueryExecution, export_format: str, source: str) -> AsyncIterator[bytes]:
+    logger.info(f"Exporting result of {execution.query_execution_id} as {export_format}.")
+    RESULT_EXPORTS.labels(format=export_format, source=source).inc()
+    return aiter_csv(execution) if export_format == "csv" else aiter_ndjson(execution)
@@ -1,8 +1,11 @@
 import os
+import asyncio
 import logging
 import boto3
 from botocore.exceptions import BotoCoreError, ClientError
 
+from app.utils.metrics import observe_dependency
+
 # S3 bucket name is expected to be set as an environment variable.
 S3_PROMPT_BUCKET_NAME = os.getenv("S3_PROMPT_BUCKET_NAME")
 
@@ -10,6 +13,7 @@ S3_PROMPT_BUCKET_NAME = os.getenv("S3_PROMPT_BUCKET_NAME")
 
 s3_client = boto3.client("s3")
 
+@observe_dependency("s3")
 def get_prompt(prompt_name: str) -> str:
     """
     Fetches the content of the specified prompt from S3.
@@ -25,6 +29,13 @@ def get_prompt(prompt_name: str) -> str:
         logging.error(f"Error fetching prompt '{prompt_name}' from S3: {e}")
         return ""
 
+async def async_get_prompt(prompt_name: str) -> str:
+    """
+    Async variant of get_prompt. The boto3 call runs in a worker thread so the
+    event loop stays free while S3 responds.
+    """
+    return await asyncio.to_thread(get_prompt, prompt_name)
+
 def update_prompt(prompt_name: str, content: str) -> bool:
     """
     Updates or uploads the prompt content to S3.
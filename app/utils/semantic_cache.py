@@ -0,0 +1,159 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+from loguru import logger
+
+from app.schemas.schema import ChatState
+from app.utils.metrics import record_cache_lookup
+
+load_dotenv()
+
+# ------------------------ Configuration ------------------------
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+# Minimum cosine similarity between two queries for a cached answer to be reused
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+# Freshness windows (seconds) per route; member data changes faster than the knowledge base
+SEMANTIC_CACHE_DATABASE_TTL = int(os.getenv("SEMANTIC_CACHE_DATABASE_TTL", "300"))
+SEMANTIC_CACHE_GENERAL_TTL = int(os.getenv("SEMANTIC_CACHE_GENERAL_TTL", "3600"))
+
+# Answers from the knowledge base do not depend on the member, so they share one scope
+GLOBAL_SCOPE = "__global__"
+
+
+@dataclass
+class CacheEntry:
+    embedding: np.ndarray
+    state: ChatState
+    expires_at: float
+
+
+class SemanticCache:
+    """
+    In-memory answer cache keyed on the query embedding and the member scope.
+
+    A lookup returns the stored ChatState of the most similar unexpired query
+    whose cosine similarity is at least `threshold`. Database answers are scoped
+    to the member `uuid`; general/RAG answers are shared by all members. Entries
+    are evicted least-recently-used once `max_entries` is reached.
+    """
+
+    def __init__(
+        self,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+        database_ttl: int = SEMANTIC_CACHE_DATABASE_TTL,
+        general_ttl: int = SEMANTIC_CACHE_GENERAL_TTL,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttls = {"database_query": database_ttl, "general_query": general_ttl}
+        # Counters reported by snapshot()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.hits_by_intent: Dict[str, int] = {}
+        # Keyed on (scope, entry_id); the order doubles as the LRU order
+        self._entries: "OrderedDict[tuple, CacheEntry]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @staticmethod
+    def _scope_for(intent: str, uuid: Optional[str]) -> str:
+        if intent == "general_query":
+            return GLOBAL_SCOPE
+        return f"member:{uuid or ''}"
+
+    def lookup(self, embedding: List[float], uuid: Optional[str] = None) -> Optional[ChatState]:
+        """
+        Returns a copy of the cached final state for a semantically matching
+        query in the member's scope, or None on a miss.
+        """
+        query_vector = self._normalize(embedding)
+        scopes = (self._scope_for("database_query", uuid), GLOBAL_SCOPE)
+        now = time.monotonic()
+        with self._lock:
+            keys, vectors = [], []
+            for key, entry in list(self._entries.items()):
+                if entry.expires_at <= now:
+                    del self._entries[key]
+                    self.expirations += 1
+                elif key[0] in scopes:
+                    keys.append(key)
+                    vectors.append(entry.embedding)
+
+            if vectors:
+                scores = np.stack(vectors) @ query_vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    key = keys[best]
+                    self._entries.move_to_end(key)
+                    state = self._entries[key].state
+                    self.hits += 1
+                    intent = state.query_intent or "database_query"
+                    self.hits_by_intent[intent] = self.hits_by_intent.get(intent, 0) + 1
+                    logger.info(f"Semantic cache hit (similarity={scores[best]:.4f}, scope={key[0]})")
+                    record_cache_lookup("semantic_answer", True)
+                    return state.model_copy(deep=True)
+
+            self.misses += 1
+            record_cache_lookup("semantic_answer", False)
+            return None
+
+    def store(self, embedding: List[float], state: ChatState, intent: str, uuid: Optional[str] = None) -> None:
+        """
+        Caches a final state under the freshness window of its route.
+        """
+        ttl = self.ttls.get(intent, self.ttls["database_query"])
+        if ttl <= 0:
+            return
+        scope = self._scope_for(intent, uuid)
+        entry = CacheEntry(
+            embedding=self._normalize(embedding),
+            state=state.model_copy(deep=True),
+            expires_at=time.monotonic() + ttl,
+        )
+        with self._lock:
+            self._next_id += 1
+            self._entries[(scope, self._next_id)] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def snapshot(self) -> dict:
+        """
+        Returns the current counters and size for monitoring.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hits_by_intent": dict(self.hits_by_intent),
+            }
+
+
+# Process-wide cache shared by every ChatWorkflow in this worker
+semantic_cache = SemanticCache()
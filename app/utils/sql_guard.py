@@ -0,0 +1,232 @@
+import os
+import re
+import json
+import math
+from dataclasses import asdict, dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from app.utils.athena_client import ATHENA_CHAT_MAX_ROWS, history_key_for, query_duration_history
+from app.utils.athena_result_cache import referenced_tables
+
+load_dotenv()
+
+# ------------------------ Configuration ------------------------
+
+SQL_GUARD_ENABLED = os.getenv("SQL_GUARD_ENABLED", "true").lower() in ("1", "true", "yes")
+# "enforce" rejects queries that break a rule; "warn" only records the decision
+SQL_GUARD_MODE = os.getenv("SQL_GUARD_MODE", "enforce").lower()
+# LIMIT added to queries without one and the ceiling for explicit limits
+SQL_GUARD_MAX_LIMIT = int(os.getenv("SQL_GUARD_MAX_LIMIT", str(ATHENA_CHAT_MAX_ROWS)))
+# Estimated bytes a query may scan (checked only when EXPLAIN is enabled)
+SQL_GUARD_MAX_SCAN_BYTES = int(os.getenv("SQL_GUARD_MAX_SCAN_BYTES", str(10 * 1024 ** 3)))
+# Seconds a query may be expected to run, from the table's past durations; 0 disables
+SQL_GUARD_MAX_EXPECTED_SECONDS = float(os.getenv("SQL_GUARD_MAX_EXPECTED_SECONDS", "0"))
+# Run EXPLAIN (TYPE IO) on Athena to estimate the scan before executing
+SQL_GUARD_EXPLAIN = os.getenv("SQL_GUARD_EXPLAIN", "false").lower() in ("1", "true", "yes")
+# Partition columns that must be filtered on, e.g. "transactions=dt;events=year,month"
+SQL_GUARD_PARTITION_COLUMNS = os.getenv("SQL_GUARD_PARTITION_COLUMNS", "")
+
+PASS = "pass"
+REWRITE = "rewrite"
+REJECT = "reject"
+
+_LITERAL_OR_COMMENT = re.compile(r"'(?:[^']|'')*'|--[^\n]*|/\*.*?\*/", re.DOTALL)
+_TRAILING_LIMIT = re.compile(r"\blimit\s+(\d+|all)\s*$", re.IGNORECASE)
+# The standard form of LIMIT; the row count defaults to 1
+_TRAILING_FETCH = re.compile(r"\bfetch\s+(?:first|next)\s+(?:(\d+)\s+)?rows?\s+only\s*$", re.IGNORECASE)
+
+
+def parse_partition_columns(value: str) -> Dict[str, List[str]]:
+    columns = {}
+    for item in value.split(";"):
+        if "=" in item:
+            table, names = item.split("=", 1)
+            columns[table.strip().lower()] = [name.strip().lower() for name in names.split(",") if name.strip()]
+    return columns
+
+
+def mask_sql(sql: str) -> str:
+    """
+    Replaces string literals and comments with spaces of the same length, so
+    keyword positions in the result match the original.
+    """
+    return _LITERAL_OR_COMMENT.sub(lambda match: " " * len(match.group(0)), sql)
+
+
+def top_level(masked: str) -> str:
+    """
+    Blanks out everything inside parentheses (subqueries, function calls).
+    """
+    out, depth = [], 0
+    for char in masked:
+        if char == "(":
+            depth += 1
+        out.append(char if depth == 0 else " ")
+        if char == ")":
+            depth = max(depth - 1, 0)
+    return "".join(out)
+
+
+@dataclass
+class GuardDecision:
+    action: str
+    sql: str
+    reasons: List[str] = field(default_factory=list)
+    original_sql: Optional[str] = None
+    estimated_scan_bytes: Optional[int] = None
+    expected_seconds: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        decision = asdict(self)
+        decision.pop("sql")
+        return decision
+
+
+class SqlGuard:
+    """
+    Pre-flight checks for generated SQL before it is sent to Athena.
+
+    Only a single SELECT (or WITH ... SELECT) statement is accepted. The
+    outermost LIMIT is added or lowered to `max_limit`. Queries for a member
+    must filter on that member's id, and queries on tables with configured
+    partition columns must filter on one of them. Optionally EXPLAIN (TYPE IO)
+    estimates the bytes scanned, and the table's past durations give the
+    expected run time; both are checked against their budgets.
+    """
+
+    def __init__(self, max_limit: int = SQL_GUARD_MAX_LIMIT, max_scan_bytes: int = SQL_GUARD_MAX_SCAN_BYTES,
+                 max_expected_seconds: float = SQL_GUARD_MAX_EXPECTED_SECONDS, explain: bool = SQL_GUARD_EXPLAIN,
+                 mode: str = SQL_GUARD_MODE, partition_columns: Optional[Dict[str, List[str]]] = None):
+        self.max_limit = max_limit
+        self.max_scan_bytes = max_scan_bytes
+        self.max_expected_seconds = max_expected_seconds
+        self.explain = explain
+        self.mode = mode
+        self.partition_columns = (
+            parse_partition_columns(SQL_GUARD_PARTITION_COLUMNS) if partition_columns is None else partition_columns
+        )
+
+    def _apply_limit(self, sql: str, masked: str):
+        """
+        Returns (sql, reason) with the outermost LIMIT (or FETCH FIRST) added
+        or tightened; reason is None when the query already complies. A new
+        LIMIT goes after the last token, before any trailing comment.
+        """
+        top = top_level(masked).rstrip()
+        fetch = _TRAILING_FETCH.search(top)
+        if fetch is not None:
+            count = int(fetch.group(1) or 1)
+            if count <= self.max_limit:
+                return sql, None
+            return (
+                f"{sql[:fetch.start()]}FETCH FIRST {self.max_limit} ROWS ONLY{sql[fetch.end():]}",
+                f"lowered FETCH FIRST {count} to {self.max_limit}",
+            )
+        match = _TRAILING_LIMIT.search(top)
+        if match is None:
+            # End of the last token; literals count, trailing comments do not
+            end = len(_LITERAL_OR_COMMENT.sub(
+                lambda m: m.group(0) if m.group(0).startswith("'") else " " * len(m.group(0)), sql
+            ).rstrip())
+            return f"{sql[:end]} LIMIT {self.max_limit}{sql[end:]}", f"added LIMIT {self.max_limit}"
+        value = match.group(1).lower()
+        if value != "all" and int(value) <= self.max_limit:
+            return sql, None
+        return (
+            f"{sql[:match.start()]}LIMIT {self.max_limit}{sql[match.end():]}",
+            f"lowered LIMIT {value.upper()} to {self.max_limit}",
+        )
+
+    def check(self, sql: str, uuid: Optional[str] = None) -> GuardDecision:
+        """
+        Static checks and the LIMIT rewrite; no calls to Athena.
+        """
+        original = sql
+        sql = sql.strip().rstrip(";").strip()
+        masked = mask_sql(sql)
+        lowered = masked.lower()
+        decision = GuardDecision(action=PASS, sql=sql)
+
+        if ";" in masked or not re.match(r"\s*(select|with)\b", lowered):
+            decision.reasons.append("only a single SELECT statement is allowed")
+            decision.action = REJECT
+            return decision
+
+        rewritten, reason = self._apply_limit(sql, masked)
+        if reason:
+            decision.reasons.append(reason)
+            decision.sql = rewritten
+            decision.original_sql = original
+
+        has_where = re.search(r"\bwhere\b", lowered) is not None
+        if uuid and not (has_where and f"'{uuid.replace(chr(39), chr(39) * 2)}'" in sql):
+            decision.reasons.append("missing member filter")
+            decision.action = REJECT
+
+        for table in referenced_tables(masked):
+            required = self.partition_columns.get(table)
+            if required and not (has_where and any(re.search(rf"\b{re.escape(c)}\b", lowered) for c in required)):
+                decision.reasons.append(f"missing partition predicate on {table} ({', '.join(required)})")
+                decision.action = REJECT
+
+        expected = query_duration_history.expected(history_key_for(sql))
+        decision.expected_seconds = expected
+        if self.max_expected_seconds > 0 and expected is not None and expected > self.max_expected_seconds:
+            decision.reasons.append(f"expected run time {expected:.1f}s exceeds {self.max_expected_seconds:.1f}s")
+            decision.action = REJECT
+
+        if decision.action == PASS and decision.original_sql is not None:
+            decision.action = REWRITE
+        return decision
+
+    async def review(self, sql: str, uuid: Optional[str] = None,
+                     estimate_scan_bytes: Optional[Callable[[str], Awaitable[Optional[int]]]] = None) -> GuardDecision:
+        """
+        Runs check() and, when enabled, the EXPLAIN scan estimate. In "warn"
+        mode rejections are downgraded so the query still runs; the reasons
+        are kept for the record.
+        """
+        decision = self.check(sql, uuid)
+        if decision.action != REJECT and self.explain and estimate_scan_bytes is not None:
+            try:
+                decision.estimated_scan_bytes = await estimate_scan_bytes(decision.sql)
+            except Exception as e:
+                logger.warning(f"EXPLAIN failed; skipping the scan estimate: {e}")
+            estimated = decision.estimated_scan_bytes
+            if estimated is not None and estimated > self.max_scan_bytes:
+                decision.reasons.append(f"estimated scan of {estimated} bytes exceeds {self.max_scan_bytes}")
+                decision.action = REJECT
+        if decision.action == REJECT and self.mode == "warn":
+            decision.reasons.append("not enforced (warn mode)")
+            decision.action = PASS if decision.original_sql is None else REWRITE
+        return decision
+
+
+def explain_statement(sql: str) -> str:
+    return f"EXPLAIN (TYPE IO, FORMAT JSON) {sql}"
+
+
+def parse_explain_io(plan: str) -> Optional[int]:
+    """
+    Sums the estimated input bytes over the scanned tables of an
+    EXPLAIN (TYPE IO, FORMAT JSON) plan. Returns None if any table has no
+    estimate (tables without statistics report NaN).
+    """
+    try:
+        document = json.loads(plan)
+    except ValueError:
+        return None
+    total = 0.0
+    for table in document.get("inputTableColumnInfos", []):
+        size = table.get("estimate", {}).get("outputSizeInBytes")
+        try:
+            size = float(size)
+        except (TypeError, ValueError):
+            return None
+        if math.isnan(size):
+            return None
+        total += size
+    return int(total)
@@ -0,0 +1,148 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from app.utils.metrics import record_cache_lookup
+
+load_dotenv()
+
+# ------------------------ Configuration ------------------------
+
+SQL_TEMPLATE_CACHE_ENABLED = os.getenv("SQL_TEMPLATE_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+SQL_TEMPLATE_CACHE_MAX_ENTRIES = int(os.getenv("SQL_TEMPLATE_CACHE_MAX_ENTRIES", "500"))
+SQL_TEMPLATE_CACHE_TTL = int(os.getenv("SQL_TEMPLATE_CACHE_TTL", "86400"))
+
+MEMBER_PLACEHOLDER = "{{member_id}}"
+DATE_PLACEHOLDER = "{{today_date}}"
+
+DATE_LITERAL = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def normalize_question(question: str) -> str:
+    """
+    Lowercases the question and strips punctuation and repeated whitespace.
+    """
+    question = re.sub(r"[^\w\s]", " ", question.lower())
+    return " ".join(question.split())
+
+
+def _tables_fingerprint(similar_tables: List[dict]) -> str:
+    """
+    Hashes the selected table names together with their descriptions, so a
+    changed description in OpenSearch produces a different cache key.
+    """
+    digest = hashlib.sha256()
+    for table in similar_tables:
+        digest.update(table["table_name"].encode("utf-8"))
+        digest.update(b"\0")
+        digest.update((table.get("description") or "").encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _quote(value: str) -> str:
+    return value.replace("'", "''")
+
+
+class SqlTemplateCache:
+    """
+    Caches generated SQL as parameterized templates.
+
+    The member id and today's date are swapped for placeholders before storing
+    and re-bound on a hit, so the same question asked by another member (or on
+    another day) reuses the plan. Queries that contain other date literals are
+    not cached, because those are usually derived from today's date.
+    """
+
+    def __init__(self, max_entries: int = SQL_TEMPLATE_CACHE_MAX_ENTRIES, ttl: int = SQL_TEMPLATE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # key -> (template, table names, expires_at); the order doubles as the LRU order
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(question: str, similar_tables: List[dict], uuid: Optional[str]) -> tuple:
+        return (normalize_question(question), _tables_fingerprint(similar_tables), uuid is not None)
+
+    def get(self, question: str, similar_tables: List[dict], uuid: Optional[str], today_date: str) -> Optional[str]:
+        """
+        Returns the cached SQL re-bound to this member and date, or None.
+        """
+        key = self._key(question, similar_tables, uuid)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[2] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                record_cache_lookup("sql_template", False)
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        record_cache_lookup("sql_template", True)
+        sql = entry[0].replace(DATE_PLACEHOLDER, today_date)
+        if uuid is not None:
+            sql = sql.replace(MEMBER_PLACEHOLDER, _quote(uuid))
+        logger.info("SQL template cache hit.")
+        return sql
+
+    def put(self, question: str, similar_tables: List[dict], uuid: Optional[str], today_date: str, sql: str) -> bool:
+        """
+        Stores the generated SQL as a template. Returns False if it cannot be
+        parameterized safely.
+        """
+        if not sql.strip():
+            return False
+        template = sql
+        if uuid is not None:
+            if _quote(uuid) not in template:
+                # Without the member filter the template cannot be re-bound
+                return False
+            template = template.replace(_quote(uuid), MEMBER_PLACEHOLDER)
+        template = template.replace(today_date, DATE_PLACEHOLDER)
+        if DATE_LITERAL.search(template):
+            return False
+
+        key = self._key(question, similar_tables, uuid)
+        table_names = frozenset(table["table_name"] for table in similar_tables)
+        with self._lock:
+            self._entries[key] = (template, table_names, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return True
+
+    def invalidate_table(self, table_name: str) -> int:
+        """
+        Drops every template that was generated with the given table in the
+        prompt. Returns the number of templates removed.
+        """
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if table_name in entry[1]]
+            for key in stale:
+                del self._entries[key]
+        if stale:
+            logger.info(f"Invalidated {len(stale)} cached SQL templates for table {table_name}.")
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Process-wide cache shared by every ChatWorkflow in this worker
+sql_template_cache = SqlTemplateCache()
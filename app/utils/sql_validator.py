@@ -0,0 +1,329 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+from app.utils.sql_guard import mask_sql, top_level
+
+load_dotenv()
+
+# ------------------------ Configuration ------------------------
+
+SQL_VALIDATION_ENABLED = os.getenv("SQL_VALIDATION_ENABLED", "true").lower() in ("1", "true", "yes")
+# Times the LLM may correct a query after a validation or Athena error
+SQL_MAX_CORRECTIONS = int(os.getenv("SQL_MAX_CORRECTIONS", "2"))
+
+# Athena error classes the LLM can fix by rewriting the query; permission,
+# capacity and internal errors are not retried.
+CORRECTABLE_ATHENA_ERROR = re.compile(
+    r"SYNTAX_ERROR|COLUMN_NOT_FOUND|TABLE_NOT_FOUND|TYPE_MISMATCH|FUNCTION_NOT_FOUND|"
+    r"INVALID_FUNCTION_ARGUMENT|INVALID_CAST_ARGUMENT|mismatched input|cannot be resolved|"
+    r"does not exist|must be an aggregate expression|NOT_SUPPORTED",
+    re.IGNORECASE,
+)
+
+KEYWORDS = {
+    "all", "and", "any", "array", "as", "asc", "at", "between", "bigint", "boolean", "by", "case", "cast", "char",
+    "cross", "current", "current_date", "current_time", "current_timestamp", "date", "day", "days", "decimal", "desc", "distinct", "double", "dow", "doy", "else", "end",
+    "escape", "except", "exists", "false", "fetch", "filter", "first", "following", "for", "from", "full", "group",
+    "having", "hour", "hours", "ilike", "in", "inner", "int", "integer", "intersect", "interval", "is", "join",
+    "last", "lateral", "left", "like", "limit", "localtime", "localtimestamp", "map", "minute", "minutes", "month", "months", "natural", "next",
+    "not", "null", "nulls", "offset", "on", "only", "or", "order", "ordinality", "outer", "over", "partition",
+    "preceding", "quarter", "range", "real", "recursive", "right", "row", "rows", "second", "seconds", "select",
+    "smallint", "some", "then", "time", "timestamp", "tinyint", "to", "true", "try_cast", "unbounded", "union",
+    "unnest", "using", "values", "varchar", "week", "weeks", "when", "where", "with", "within", "year", "years",
+    "zone",
+    # EXTRACT fields and TRIM specifications, which take FROM inside the call
+    "both", "day_of_month", "day_of_week", "day_of_year", "leading", "timezone_hour", "timezone_minute",
+    "trailing", "year_of_week", "yow",
+}
+
+_IDENTIFIER = r'(?:"[^"]+"|`[^`]+`|[A-Za-z_][\w$]*)'
+_TABLE_TARGET = re.compile(
+    rf"\b(from|join)\s+({_IDENTIFIER}(?:\.{_IDENTIFIER})*)(?:\s+(?:as\s+)?({_IDENTIFIER}))?", re.IGNORECASE
+)
+_CTE_NAME = re.compile(rf"(?:\bwith\b(?:\s+recursive)?|,)\s*({_IDENTIFIER})\s+as\s*\(", re.IGNORECASE)
+_ALIAS_AFTER_AS = re.compile(rf"\bas\s+({_IDENTIFIER})", re.IGNORECASE)
+_ALIAS_AFTER_PAREN = re.compile(rf"\)\s+({_IDENTIFIER})", re.IGNORECASE)
+_CREATE_TABLE = re.compile(rf"create\s+(?:external\s+)?table\s+(?:if\s+not\s+exists\s+)?({_IDENTIFIER}(?:\.{_IDENTIFIER})*)\s*\(",
+                           re.IGNORECASE)
+_PARTITIONED_BY = re.compile(r"partitioned\s+by\s*\(", re.IGNORECASE)
+_TOKEN = re.compile(rf"({_IDENTIFIER})(\s*\.\s*({_IDENTIFIER}))?(\s*\()?")
+_SUBQUERY_START = re.compile(r"\s*(select|with)\b", re.IGNORECASE)
+_CONSTRAINT_ITEM = re.compile(r"^\s*(constraint|primary|foreign|unique|key|index|check)\b", re.IGNORECASE)
+
+
+def _unquote(identifier: str) -> str:
+    return identifier.strip().strip('"`').lower()
+
+
+def _last_part(name: str) -> str:
+    return _unquote(re.split(r'\.(?=(?:[^"`]*["`][^"`]*["`])*[^"`]*$)', name)[-1])
+
+
+@dataclass
+class DdlColumn:
+    name: str
+    type: str
+    comment: str = ""
+    partition: bool = False
+    key: bool = False
+
+
+@dataclass
+class DdlTable:
+    name: str
+    columns: List[DdlColumn]
+    # Span of "CREATE ... ( ... ) [PARTITIONED BY ( ... )]" in the description
+    start: int
+    end: int
+
+
+def _block_span(text: str, open_index: int) -> Tuple[int, int]:
+    """
+    Returns the span between the parenthesis at `open_index` and its match.
+    """
+    depth = 0
+    for index in range(open_index, len(text)):
+        if text[index] == "(":
+            depth += 1
+        elif text[index] == ")":
+            depth -= 1
+            if depth == 0:
+                return open_index + 1, index
+    return open_index + 1, len(text)
+
+
+def _split_top_level(text: str, start: int, end: int) -> List[Tuple[int, int]]:
+    """
+    Returns the spans of the comma-separated items of text[start:end],
+    ignoring commas inside parentheses and complex types (array<...>).
+    """
+    spans, depth, item_start = [], 0, start
+    for index in range(start, end):
+        char = text[index]
+        if char in "(<":
+            depth += 1
+        elif char in ")>":
+            depth -= 1
+        elif char == "," and depth == 0:
+            spans.append((item_start, index))
+            item_start = index + 1
+    spans.append((item_start, end))
+    return spans
+
+
+def _literal_text(literal: str) -> str:
+    return literal[1:-1].replace("''", "'")
+
+
+def parse_ddl(description: str) -> Optional[DdlTable]:
+    """
+    Parses the CREATE [EXTERNAL] TABLE statement in a table description into
+    its columns (name, type, comment), including PARTITIONED BY columns and
+    PRIMARY KEY constraints. Returns None if the description has no DDL.
+    """
+    description = description or ""
+    masked = mask_sql(description)
+    match = _CREATE_TABLE.search(masked)
+    if match is None:
+        return None
+    blocks = [(_block_span(masked, match.end() - 1), False)]
+    # Hive DDL may put COMMENT / ROW FORMAT clauses before PARTITIONED BY
+    after = blocks[0][0][1] + 1
+    statement_end = re.compile(r";|\bcreate\b", re.IGNORECASE).search(masked, after)
+    partitioned = _PARTITIONED_BY.search(masked, after, statement_end.start() if statement_end else len(masked))
+    if partitioned is not None:
+        blocks.append((_block_span(masked, partitioned.end() - 1), True))
+
+    columns, keys = [], set()
+    for (block_start, block_end), partition in blocks:
+        for item_start, item_end in _split_top_level(masked, block_start, block_end):
+            item = masked[item_start:item_end]
+            if not item.strip():
+                continue
+            if _CONSTRAINT_ITEM.match(item):
+                key = re.search(r"\bprimary\s+key\s*\(([^)]*)\)", item, re.IGNORECASE)
+                if key:
+                    keys.update(_unquote(name) for name in key.group(1).split(","))
+                continue
+            name = re.match(rf"\s*({_IDENTIFIER})", item)
+            if not name:
+                continue
+            rest_start = item_start + name.end()
+            comment = re.search(r"\bcomment\b", masked[rest_start:item_end], re.IGNORECASE)
+            type_end = rest_start + comment.start() if comment else item_end
+            column_type = re.sub(r"\s+", " ", description[rest_start:type_end]).strip()
+            column = DdlColumn(name=_unquote(name.group(1)), type=column_type, partition=partition)
+            if re.search(r"\bprimary\s+key\b", column_type, re.IGNORECASE):
+                column.type = re.sub(r"\s*\bprimary\s+key\b.*", "", column_type, flags=re.IGNORECASE)
+                column.key = True
+            if comment:
+                literal = re.match(r"\s*('(?:[^']|'')*')", description[rest_start + comment.end():item_end])
+                column.comment = _literal_text(literal.group(1)) if literal else ""
+            columns.append(column)
+    for column in columns:
+        column.key = column.key or column.name in keys
+    return DdlTable(name=_last_part(match.group(1)), columns=columns, start=match.start(), end=blocks[-1][0][1] + 1)
+
+
+def parse_ddl_columns(description: str) -> Optional[Set[str]]:
+    """
+    Extracts the column names (including partition columns) from a
+    CREATE [EXTERNAL] TABLE description. Returns None if the description
+    contains no DDL.
+    """
+    table = parse_ddl(description)
+    return None if table is None else {column.name for column in table.columns}
+
+
+def schema_from_tables(similar_tables: Optional[List[dict]]) -> Dict[str, Set[str]]:
+    """
+    Maps table name -> column names for every selected table whose
+    description contains its DDL.
+    """
+    schema = {}
+    for table in similar_tables or []:
+        columns = parse_ddl_columns(table.get("description") or "")
+        if columns:
+            schema[_last_part(table["table_name"])] = columns
+    return schema
+
+
+def _clause_level(masked: str) -> str:
+    """
+    Blanks out the contents of parentheses that are not subqueries, so the
+    FROM in calls like EXTRACT(MONTH FROM ts) or TRIM(BOTH ' ' FROM name) is
+    not read as a table reference. Subqueries and CTE bodies are kept, since
+    their FROM clauses name tables.
+    """
+    out, frames = [], []
+    for index, char in enumerate(masked):
+        if char == "(":
+            frames.append(_SUBQUERY_START.match(masked, index + 1) is not None)
+            out.append(char)
+            continue
+        if char == ")":
+            if frames:
+                frames.pop()
+            out.append(char)
+            continue
+        out.append(char if not frames or frames[-1] else " ")
+    return "".join(out)
+
+
+def _check_syntax(masked: str) -> List[str]:
+    errors = []
+    if re.search(r"'", masked):
+        errors.append("Syntax error: unterminated string literal.")
+    depth = 0
+    for char in masked:
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        if depth < 0:
+            break
+    if depth != 0:
+        errors.append("Syntax error: unbalanced parentheses.")
+    if not re.match(r"\s*(select|with)\b", masked, re.IGNORECASE):
+        errors.append("Syntax error: the query must be a single SELECT statement.")
+    elif not re.search(r"\bselect\b[\s\S]+\bfrom\b", masked, re.IGNORECASE) and " from " in f" {masked.lower()} ":
+        errors.append("Syntax error: SELECT list is empty.")
+    return errors
+
+
+def _select_list_aliases(masked: str) -> Set[str]:
+    """
+    Collects implicit aliases (`expr alias`) from the top-level SELECT list.
+    """
+    aliases = set()
+    top = top_level(masked)
+    match = re.search(r"\bselect\b(.*?)\bfrom\b", top, re.IGNORECASE | re.DOTALL)
+    if match is None:
+        return aliases
+    for item in match.group(1).split(","):
+        tokens = item.split()
+        if len(tokens) >= 2 and re.fullmatch(_IDENTIFIER, tokens[-1]) and tokens[-1].lower() not in KEYWORDS:
+            previous = tokens[-2]
+            if previous.lower() not in KEYWORDS and not re.search(r"[=<>+\-*/|]$", previous):
+                aliases.add(_unquote(tokens[-1]))
+    return aliases
+
+
+def validate_sql(sql: str, schema: Dict[str, Set[str]]) -> List[str]:
+    """
+    Checks the query against the selected tables' schema without calling
+    Athena. Returns a list of human-readable errors (empty if none found).
+
+    Table references must name a selected table (or a CTE). Column
+    references are checked when every table read has a known schema;
+    unqualified columns are only checked in queries without CTEs or
+    subqueries, where derived columns cannot appear.
+    """
+    masked = mask_sql(sql.strip().rstrip(";"))
+    errors = _check_syntax(masked)
+    if errors or not schema:
+        return errors
+
+    ctes = {_unquote(name) for name in _CTE_NAME.findall(masked)}
+    aliases: Dict[str, Optional[str]] = {}
+    tables_read = set()
+    targets = list(_TABLE_TARGET.finditer(_clause_level(masked)))
+    for match in targets:
+        target, alias = match.group(2), match.group(3)
+        table = _last_part(target)
+        if table in ctes:
+            aliases[table] = None
+        elif table not in schema:
+            errors.append(
+                f"Table '{table}' is not one of the available tables: {', '.join(sorted(schema))}."
+            )
+            continue
+        else:
+            tables_read.add(table)
+            aliases[table] = table
+        if alias and _unquote(alias) not in KEYWORDS:
+            aliases[_unquote(alias)] = None if table in ctes else table
+    if errors:
+        return errors
+
+    derived = bool(ctes) or re.search(r"\(\s*select\b", masked, re.IGNORECASE) is not None
+    known_columns = set().union(*(schema[table] for table in tables_read)) if tables_read else set()
+    output_aliases = {_unquote(a) for a in _ALIAS_AFTER_AS.findall(masked)}
+    output_aliases |= {_unquote(a) for a in _ALIAS_AFTER_PAREN.findall(masked)}
+    output_aliases |= _select_list_aliases(masked)
+
+    # Column references are looked for outside the FROM/JOIN targets
+    body = masked
+    for match in targets:
+        body = body[:match.start()] + " " * (match.end() - match.start()) + body[match.end():]
+    unknown = []
+    for match in _TOKEN.finditer(body):
+        first, qualified, second, call = match.group(1), match.group(2), match.group(3), match.group(4)
+        if call:
+            continue
+        if qualified:
+            qualifier, column = _unquote(first), _unquote(second)
+            table = aliases.get(qualifier, "")
+            if table and column not in schema[table]:
+                errors.append(
+                    f"Column '{column}' does not exist in table '{table}' "
+                    f"(columns: {', '.join(sorted(schema[table]))})."
+                )
+            continue
+        name = _unquote(first)
+        if (derived or name in KEYWORDS or name in known_columns or name in aliases
+                or name in output_aliases or first[0].isdigit()):
+            continue
+        if name not in unknown:
+            unknown.append(name)
+    for name in unknown:
+        errors.append(
+            f"Column '{name}' does not exist in {', '.join(sorted(tables_read))} "
+            f"(columns: {', '.join(sorted(known_columns))})."
+        )
+    return errors
+
+
+def is_correctable(state_change_reason: Optional[str]) -> bool:
+    return bool(state_change_reason) and CORRECTABLE_ATHENA_ERROR.search(state_change_reason) is not None
@@ -0,0 +1,136 @@
+import os
+import random
+import hashlib
+from contextvars import ContextVar
+from typing import Any
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ------------------------ Configuration ------------------------
+
+# Longest text logged verbatim at INFO (prompts, SQL, answers); longer text is cut
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "500"))
+# Share of requests whose full ChatState is logged at INFO (0.0 - 1.0)
+LOG_STATE_SAMPLE_RATE = float(os.getenv("LOG_STATE_SAMPLE_RATE", "0"))
+# Request header that forces full state logging for a single request
+FULL_STATE_HEADER = "X-Log-Full-State"
+
+_full_state_logging: ContextVar[bool] = ContextVar("full_state_logging", default=False)
+
+
+def enable_full_state_logging_for_request(headers) -> None:
+    """
+    Turns on full state dumps for the current request when it is sampled or
+    explicitly asks for it through the X-Log-Full-State header.
+    """
+    forced = headers.get(FULL_STATE_HEADER, "").lower() in ("1", "true", "yes")
+    sampled = LOG_STATE_SAMPLE_RATE > 0 and random.random() < LOG_STATE_SAMPLE_RATE
+    _full_state_logging.set(forced or sampled)
+
+
+def truncate(value: Any, limit: int = LOG_MAX_FIELD_CHARS) -> str:
+    text = str(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text) - limit} more chars]"
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:10]
+
+
+def summarize_text(text: Any) -> str:
+    if text is None:
+        return "None"
+    text = str(text)
+    return f"<{len(text)} chars sha1={_digest(text)}>"
+
+
+def summarize_rows(rows: Any) -> str:
+    if isinstance(rows, list):
+        columns = list(rows[0].keys()) if rows and isinstance(rows[0], dict) else []
+        return f"<{len(rows)} rows columns={columns}>"
+    return truncate(rows, 200)
+
+
+def summarize_tables(tables: Any) -> str:
+    if tables is None:
+        return "None"
+    return str([(t.get("table_name"), round(t.get("score") or 0.0, 4)) for t in tables])
+
+
+def summarize_state(state) -> str:
+    """
+    Compact one-line view of a ChatState: sizes, hashes, row counts and
+    short scalar fields instead of the embedding, descriptions and results.
+    """
+    return (
+        f"query={truncate(state.query, 200)!r} uuid={state.uuid} intent={state.query_intent} "
+        f"keywords={state.keywords} "
+        f"embedding={'<%d dims>' % len(state.embedding) if state.embedding else None} "
+        f"similar_tables={summarize_tables(state.similar_tables)} "
+        f"sql_query={summarize_text(state.sql_query)} sql_result={summarize_rows(state.sql_result)} "
+        f"table_used={state.table_used} table_prompt={summarize_text(state.table_prompt)} "
+        f"final_answer={summarize_text(state.final_answer)} deeplink={'set' if state.deeplink else None} "
+        f"attempts={state.attempts}"
+    )
+
+
+def log_state(logger, label: str, state) -> None:
+    """
+    Logs the state at a node boundary. The summary is built only if INFO is
+    enabled; the full dump only under DEBUG or for sampled requests.
+    """
+    if _full_state_logging.get():
+        logger.opt(lazy=True, depth=1).info("{} (full): {}", lambda: label, lambda: state.model_dump())
+        return
+    logger.opt(lazy=True, depth=1).info("{}: {}", lambda: label, lambda: summarize_state(state))
+    logger.opt(lazy=True, depth=1).debug("{} (full): {}", lambda: label, lambda: state.model_dump())
+
+
+def _benchmark(iterations: int = 2000) -> None:
+    """
+    Compares the old eager f-string dump against log_state at INFO.
+    Run with: python -m app.utils.state_logging
+    """
+    import io
+    import sys
+    import time
+    from loguru import logger
+    from app.schemas.schema import ChatState
+
+    state = ChatState(
+        query="what are my closed transactions this month?",
+        uuid="0b7c6f1e-1111-2222-3333-444455556666",
+        embedding=[0.0123456789] * 1536,
+        similar_tables=[
+            {"table_name": f"table_{i}", "description": "column_name STRING COMMENT 'description' " * 40, "score": 0.8}
+            for i in range(5)
+        ],
+        sql_query="SELECT * FROM transactions WHERE id = 'x' LIMIT 100",
+        sql_result=[{"col_%d" % c: "value %d" % r for c in range(12)} for r in range(100)],
+        final_answer="answer " * 200,
+    )
+
+    for name, log in (
+        ("eager model_dump", lambda: logger.info(f"State just before return in node: {state.model_dump()}")),
+        ("log_state summary", lambda: log_state(logger, "State just before return in node", state)),
+    ):
+        sink = io.StringIO()
+        logger.remove()
+        logger.add(sink, level="INFO", format="{message}")
+        start = time.perf_counter()
+        for _ in range(iterations):
+            log()
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name:>18}: {elapsed / iterations * 1e6:8.1f} us/call, "
+            f"{len(sink.getvalue()) / iterations:10.0f} bytes/call",
+            file=sys.stdout,
+        )
+
+
+if __name__ == "__main__":
+    _benchmark()
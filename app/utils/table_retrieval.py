@@ -0,0 +1,189 @@
+import os
+import re
+import json
+import time
+import argparse
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from app.utils.conversation_summary import extract_keywords
+from app.utils.table_vector_index import TABLE_INDEX
+
+load_dotenv()
+
+# ------------------------ Configuration ------------------------
+
+# "knn" (vector only) or "hybrid" (BM25 on the description and table name plus kNN)
+TABLE_RETRIEVAL_MODE = os.getenv("TABLE_RETRIEVAL_MODE", "knn").lower()
+# "rrf" (reciprocal rank) or "normalized" (min-max normalized scores)
+TABLE_RETRIEVAL_FUSION = os.getenv("TABLE_RETRIEVAL_FUSION", "rrf").lower()
+TABLE_RETRIEVAL_KNN_WEIGHT = float(os.getenv("TABLE_RETRIEVAL_KNN_WEIGHT", "0.6"))
+TABLE_RETRIEVAL_LEXICAL_WEIGHT = float(os.getenv("TABLE_RETRIEVAL_LEXICAL_WEIGHT", "0.4"))
+TABLE_RETRIEVAL_RRF_K = int(os.getenv("TABLE_RETRIEVAL_RRF_K", "60"))
+# Candidates taken from each retriever before fusion
+TABLE_RETRIEVAL_CANDIDATES = int(os.getenv("TABLE_RETRIEVAL_CANDIDATES", "20"))
+
+TOP_K = 5
+
+
+def knn_query(embedding: List[float], size: int) -> dict:
+    # The stored embeddings are not needed in the hits
+    return {
+        "size": size,
+        "_source": ["table_name", "table_description"],
+        "query": {"knn": {"embedding": {"vector": embedding, "k": size}}},
+    }
+
+
+def lexical_query(query: str, size: int) -> dict:
+    """
+    BM25 on the description, plus matches on the table_name keyword: exact
+    names built from the question's terms (e.g. "listing id" ->
+    "listing_id") and names containing one of its keywords.
+    """
+    terms = re.findall(r"[a-z0-9]+", query.lower())
+    names = set(terms) | {"_".join(terms[i:i + 2]) for i in range(len(terms) - 1)}
+    should = [
+        {"match": {"table_description": {"query": query}}},
+        {"terms": {"table_name": sorted(names), "boost": 3.0}},
+    ]
+    for keyword in extract_keywords(query):
+        if len(keyword) < 4:
+            # Short terms ("id", "my") match nearly every table name
+            continue
+        should.append({"wildcard": {"table_name": {"value": f"*{keyword}*", "boost": 1.5}}})
+    return {
+        "size": size,
+        "_source": ["table_name", "table_description"],
+        "query": {"bool": {"should": should, "minimum_should_match": 1}},
+    }
+
+
+def tables_from_hits(hits: List[dict]) -> List[dict]:
+    return [
+        {
+            "table_name": hit["_source"]["table_name"],
+            "description": hit["_source"]["table_description"],
+            "score": hit["_score"],
+        }
+        for hit in hits
+    ]
+
+
+def _normalized(tables: List[dict]) -> Dict[str, float]:
+    if not tables:
+        return {}
+    scores = [t["score"] for t in tables]
+    low, high = min(scores), max(scores)
+    return {t["table_name"]: (t["score"] - low) / (high - low) if high > low else 1.0 for t in tables}
+
+
+def _reciprocal_ranks(tables: List[dict], rrf_k: int) -> Dict[str, float]:
+    return {t["table_name"]: 1.0 / (rrf_k + rank) for rank, t in enumerate(tables, start=1)}
+
+
+def fuse(knn_tables: List[dict], lexical_tables: List[dict], top_k: int = TOP_K,
+         method: str = TABLE_RETRIEVAL_FUSION, knn_weight: float = TABLE_RETRIEVAL_KNN_WEIGHT,
+         lexical_weight: float = TABLE_RETRIEVAL_LEXICAL_WEIGHT, rrf_k: int = TABLE_RETRIEVAL_RRF_K) -> List[dict]:
+    """
+    Combines the ranked kNN and lexical candidates into one ranking.
+
+    "rrf" sums weight / (rrf_k + rank) over the lists a table appears in;
+    "normalized" sums the weighted min-max normalized scores (0 when absent).
+    The fused score replaces "score"; the retrievers' own scores are kept as
+    knn_score and lexical_score.
+    """
+    if method == "normalized":
+        knn_part, lexical_part = _normalized(knn_tables), _normalized(lexical_tables)
+    else:
+        knn_part, lexical_part = _reciprocal_ranks(knn_tables, rrf_k), _reciprocal_ranks(lexical_tables, rrf_k)
+
+    tables: Dict[str, dict] = {}
+    for source, candidates in (("knn_score", knn_tables), ("lexical_score", lexical_tables)):
+        for table in candidates:
+            entry = tables.setdefault(table["table_name"], {
+                "table_name": table["table_name"], "description": table["description"],
+                "knn_score": None, "lexical_score": None,
+            })
+            entry[source] = table["score"]
+    for name, entry in tables.items():
+        entry["score"] = knn_weight * knn_part.get(name, 0.0) + lexical_weight * lexical_part.get(name, 0.0)
+    return sorted(tables.values(), key=lambda t: t["score"], reverse=True)[:top_k]
+
+
+# ------------------------ Offline evaluation ------------------------
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else 0.0
+
+
+def evaluate(input_path: str, index: str, candidates: int = TABLE_RETRIEVAL_CANDIDATES,
+             weights: Optional[List[float]] = None) -> dict:
+    """
+    Measures top-1 accuracy and top-3 recall of kNN and of each hybrid
+    configuration on labelled questions, plus the latency of the kNN search
+    alone and of the hybrid msearch, against the live OpenSearch index.
+    """
+    import openai
+    from app.modules.opensearch_database import opensearch_client
+    from app.utils.llm import EMBEDDING_MODEL
+
+    with open(input_path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    queries = [row["query"] for row in rows]
+    expected = [row["table"] for row in rows]
+    embeddings = []
+    for i in range(0, len(queries), 100):
+        response = openai.embeddings.create(input=queries[i:i + 100], model=EMBEDDING_MODEL)
+        embeddings.extend(item.embedding for item in response.data)
+
+    knn_latency, hybrid_latency, retrieved = [], [], []
+    for query, embedding in zip(queries, embeddings):
+        start = time.perf_counter()
+        opensearch_client.search(index=index, body=knn_query(embedding, TOP_K))
+        knn_latency.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        response = opensearch_client.msearch(body=[
+            {"index": index}, knn_query(embedding, candidates),
+            {"index": index}, lexical_query(query, candidates),
+        ])
+        hybrid_latency.append(time.perf_counter() - start)
+        knn_hits, lexical_hits = (r["hits"]["hits"] for r in response["responses"])
+        retrieved.append((tables_from_hits(knn_hits), tables_from_hits(lexical_hits)))
+
+    def score(rankings: List[List[dict]]) -> dict:
+        names = [[t["table_name"] for t in ranking] for ranking in rankings]
+        return {
+            "top1_accuracy": sum(bool(n) and n[0] == e for n, e in zip(names, expected)) / len(expected),
+            "top3_recall": sum(e in n[:3] for n, e in zip(names, expected)) / len(expected),
+        }
+
+    report = {
+        "questions": len(queries),
+        "latency_ms": {
+            "knn": {"mean": 1000 * sum(knn_latency) / len(knn_latency), "p95": 1000 * _percentile(knn_latency, 0.95)},
+            "hybrid": {"mean": 1000 * sum(hybrid_latency) / len(hybrid_latency),
+                       "p95": 1000 * _percentile(hybrid_latency, 0.95)},
+        },
+        "knn": score([knn[:TOP_K] for knn, _ in retrieved]),
+        "lexical": score([lexical[:TOP_K] for _, lexical in retrieved]),
+    }
+    for method in ("rrf", "normalized"):
+        for knn_weight in weights or [0.5, 0.6, 0.7, 0.8]:
+            key = f"hybrid_{method}_knn{knn_weight:.2f}"
+            report[key] = score([fuse(k, l, TOP_K, method, knn_weight, 1.0 - knn_weight) for k, l in retrieved])
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare kNN and hybrid table retrieval on labelled questions.")
+    parser.add_argument("--input", required=True, help="JSONL file with 'query' and expected 'table' fields")
+    parser.add_argument("--index", default=TABLE_INDEX)
+    parser.add_argument("--candidates", type=int, default=TABLE_RETRIEVAL_CANDIDATES)
+    parser.add_argument("--weights", type=float, nargs="*", help="kNN weights to try (lexical = 1 - weight)")
+    args = parser.parse_args()
+    logger.remove()
+    print(json.dumps(evaluate(args.input, args.index, args.candidates, args.weights), indent=2))
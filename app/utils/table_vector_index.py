@@ -0,0 +1,289 @@
+import os
+import json
+import time
+import fcntl
+import asyncio
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+
+# ------------------------ Configuration ------------------------
+
+TABLE_VECTOR_INDEX_ENABLED = os.getenv("TABLE_VECTOR_INDEX_ENABLED", "false").lower() in ("1", "true", "yes")
+# Directory holding the shared matrix; must be on a local filesystem all workers can see
+TABLE_VECTOR_INDEX_DIR = os.getenv("TABLE_VECTOR_INDEX_DIR", "/tmp/table_vector_index")
+# Seconds between full reloads from OpenSearch (catches writes made outside this service)
+TABLE_VECTOR_INDEX_REFRESH_INTERVAL = int(os.getenv("TABLE_VECTOR_INDEX_REFRESH_INTERVAL", "900"))
+# Seconds between checks for a matrix written by another worker
+TABLE_VECTOR_INDEX_RELOAD_CHECK = float(os.getenv("TABLE_VECTOR_INDEX_RELOAD_CHECK", "2"))
+
+# OpenSearch index the table catalog is searched in
+TABLE_INDEX = "data_service_index"
+
+_MANIFEST = "manifest.json"
+_LOCK = ".lock"
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class TableVectorIndex:
+    """
+    In-process cosine top-k over the table catalog (table name, description
+    and embedding of every document in the OpenSearch table index).
+
+    The normalized float32 matrix is written as a .npy file and memory-mapped
+    read-only, so all workers on a host share one copy in the page cache. A
+    small JSON manifest names the current matrix file and holds the table
+    names and descriptions; writers replace it atomically, and readers pick up
+    a new manifest on their next search. Writes are serialized across
+    processes with a lock file.
+    """
+
+    def __init__(self, directory: str = TABLE_VECTOR_INDEX_DIR, reload_check: float = TABLE_VECTOR_INDEX_RELOAD_CHECK):
+        self.directory = directory
+        self.reload_check = reload_check
+        self._matrix: Optional[np.ndarray] = None
+        self._tables: List[Dict[str, str]] = []
+        self._manifest_mtime: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    # ------------------------ Files ------------------------
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def _file_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(_LOCK), "w") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _read_files(self):
+        with open(self._path(_MANIFEST)) as handle:
+            manifest = json.load(handle)
+        matrix = np.load(self._path(manifest["matrix"]), mmap_mode="r")
+        return manifest, matrix
+
+    def _write_files(self, tables: List[Dict[str, str]], matrix: np.ndarray) -> None:
+        """
+        Writes a new matrix file and swaps the manifest to it; callers hold
+        the file lock. Matrix files no longer referenced are removed (readers
+        that still map them keep their pages until they reload).
+        """
+        matrix_name = f"matrix-{time.time_ns()}.npy"
+        np.save(self._path(matrix_name), np.ascontiguousarray(matrix, dtype=np.float32))
+        manifest_tmp = self._path(f".{_MANIFEST}.{os.getpid()}")
+        with open(manifest_tmp, "w") as handle:
+            json.dump({"matrix": matrix_name, "tables": tables, "built_at": time.time()}, handle)
+        os.replace(manifest_tmp, self._path(_MANIFEST))
+        for name in os.listdir(self.directory):
+            if name.startswith("matrix-") and name != matrix_name:
+                os.remove(self._path(name))
+
+    # ------------------------ Loading ------------------------
+
+    def load(self) -> bool:
+        """
+        Maps the current matrix if the manifest changed since the last load.
+        Returns True if an index is available.
+        """
+        try:
+            mtime = os.stat(self._path(_MANIFEST)).st_mtime_ns
+        except OSError:
+            return self._matrix is not None
+        if mtime == self._manifest_mtime:
+            return self._matrix is not None
+        try:
+            manifest, matrix = self._read_files()
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Cannot load the table vector index: {e}")
+            return self._matrix is not None
+        with self._lock:
+            self._matrix, self._tables, self._manifest_mtime = matrix, manifest["tables"], mtime
+        logger.info(f"Loaded table vector index: {matrix.shape[0]} tables, dimension {matrix.shape[1] if matrix.ndim == 2 else 0}.")
+        return True
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at >= self.reload_check:
+            self._checked_at = now
+            self.load()
+
+    def age(self) -> Optional[float]:
+        """
+        Seconds since the shared index was last built, or None if there is none.
+        """
+        try:
+            return time.time() - os.path.getmtime(self._path(_MANIFEST))
+        except OSError:
+            return None
+
+    # ------------------------ Writing ------------------------
+
+    def build(self, documents: List[dict]) -> None:
+        """
+        Replaces the index with the given documents (table_name,
+        table_description, embedding).
+        """
+        documents = [d for d in documents if d.get("embedding")]
+        tables = [{"table_name": d["table_name"], "description": d.get("table_description") or ""} for d in documents]
+        if documents:
+            matrix = _normalize_rows(np.asarray([d["embedding"] for d in documents], dtype=np.float32))
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        with self._file_lock():
+            self._write_files(tables, matrix)
+        self.load()
+
+    def upsert(self, table_name: str, table_description: str, embedding: List[float]) -> None:
+        """
+        Adds or replaces one table's row.
+        """
+        self.upsert_many([{"table_name": table_name, "table_description": table_description, "embedding": embedding}])
+
+    def upsert_many(self, documents: List[dict]) -> None:
+        """
+        Adds or replaces the rows of the given documents (table_name,
+        table_description, embedding), starting from the latest shared index
+        so concurrent writers in other workers are not lost.
+        """
+        if not documents:
+            return
+        vectors = _normalize_rows(np.asarray([d["embedding"] for d in documents], dtype=np.float32))
+        dimension = vectors.shape[1]
+        with self._file_lock():
+            try:
+                manifest, current = self._read_files()
+                tables, matrix = list(manifest["tables"]), np.array(current)
+            except (OSError, ValueError, KeyError):
+                tables, matrix = [], np.zeros((0, dimension), dtype=np.float32)
+            if matrix.size and matrix.shape[1] != dimension:
+                logger.warning("Embedding dimension changed; the table vector index will be rebuilt on refresh.")
+                tables, matrix = [], np.zeros((0, dimension), dtype=np.float32)
+            matrix = matrix.reshape(-1, dimension)
+            positions = {t["table_name"]: i for i, t in enumerate(tables)}
+            added = []
+            for document, vector in zip(documents, vectors):
+                entry = {"table_name": document["table_name"], "description": document["table_description"]}
+                position = positions.get(document["table_name"])
+                if position is None:
+                    positions[document["table_name"]] = len(tables)
+                    tables.append(entry)
+                    added.append(vector)
+                elif position < matrix.shape[0]:
+                    tables[position] = entry
+                    matrix[position] = vector
+                else:
+                    # Listed twice in this call; the later document wins
+                    tables[position] = entry
+                    added[position - matrix.shape[0]] = vector
+            if added:
+                matrix = np.vstack([matrix, np.asarray(added, dtype=np.float32)])
+            self._write_files(tables, matrix)
+        self.load()
+        logger.info(f"Updated {len(documents)} tables in the table vector index.")
+
+    # ------------------------ Search ------------------------
+
+    def search(self, embedding: List[float], top_k: int = 5) -> Optional[List[dict]]:
+        """
+        Returns the top_k tables by cosine similarity, shaped like the
+        OpenSearch hits used by similarity_search, or None when no index of
+        the query's dimension is loaded (the caller then asks OpenSearch).
+
+        Scores use OpenSearch's cosinesimil scale, 1 / (2 - cosine), so they
+        are comparable with the fallback's.
+        """
+        self._maybe_reload()
+        with self._lock:
+            matrix, tables = self._matrix, self._tables
+        query = np.asarray(embedding, dtype=np.float32)
+        if matrix is None or matrix.ndim != 2 or matrix.shape[0] == 0 or matrix.shape[1] != query.shape[0]:
+            return None
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        scores = matrix @ query
+        k = min(top_k, scores.shape[0])
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [
+            {
+                "table_name": tables[i]["table_name"],
+                "description": tables[i]["description"],
+                "score": float(1.0 / (2.0 - scores[i])),
+            }
+            for i in best
+        ]
+
+    # ------------------------ Refresh ------------------------
+
+    def refresh_from_opensearch(self, force: bool = False) -> None:
+        """
+        Rebuilds the shared index from every document in the OpenSearch table
+        index, unless another worker built it within the refresh interval.
+        """
+        age = self.age()
+        if not force and age is not None and age < TABLE_VECTOR_INDEX_REFRESH_INTERVAL:
+            self.load()
+            return
+        # Imported here so the index can be used without an OpenSearch connection
+        from app.modules.opensearch_database import opensearch_client
+
+        response = opensearch_client.search(
+            index=TABLE_INDEX,
+            body={"size": 10000, "query": {"match_all": {}}},
+            _source=["table_name", "table_description", "embedding"],
+        )
+        documents = [hit["_source"] for hit in response["hits"]["hits"]]
+        self.build(documents)
+        logger.info(f"Rebuilt table vector index from OpenSearch with {len(documents)} tables.")
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(TABLE_VECTOR_INDEX_REFRESH_INTERVAL / 4)
+            try:
+                await asyncio.to_thread(self.refresh_from_opensearch)
+            except Exception as e:
+                logger.error(f"Error refreshing the table vector index: {e}")
+
+    async def start(self) -> None:
+        """
+        Loads (or builds) the index and starts the periodic refresh. Failures
+        leave the index empty, so searches fall back to OpenSearch.
+        """
+        try:
+            await asyncio.to_thread(self.refresh_from_opensearch)
+        except Exception as e:
+            logger.error(f"Error building the table vector index; using OpenSearch for table search: {e}")
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+
+# Process-wide index; started from the application lifespan when enabled
+table_vector_index = TableVectorIndex()
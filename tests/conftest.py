@@ -0,0 +1,9 @@
+import os
+
+# Settings the app modules read at import time; the tests stub every call that would use them
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("OPENSEARCH_HOST", "localhost")
+os.environ.setdefault("OPENSEARCH_PORT", "9200")
+os.environ.setdefault("OPENSEARCH_USER", "test")
+os.environ.setdefault("OPENSEARCH_PASS", "test")
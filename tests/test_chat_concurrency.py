@@ -0,0 +1,146 @@
+"""
+Checks that concurrent chats do not block each other. Every OpenAI,
+OpenSearch, S3 and Athena call is stubbed to take LATENCY seconds; if the
+graph never blocks the event loop, a batch of chats waits for I/O about as
+long as one chat, on top of the CPU time of the whole batch (measured by
+running the batch with no latency).
+"""
+import re
+import time
+import asyncio
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+
+import app.langgraph.chat_flow as chat_flow
+import app.langgraph.data_services_nodes as data_services_nodes
+from app.utils.athena_client import QueryExecution
+from app.utils.athena_result_set import ResultSet
+
+CONCURRENCY = 20
+LATENCY = 0.05
+TABLE = "CREATE TABLE t1 (id string, name string, deeplink string)"
+
+
+class StubIO:
+    """
+    The workflow's external calls, each taking `latency` seconds; with
+    `blocking` the embedding call sleeps on the event loop thread.
+    """
+
+    def __init__(self):
+        self.latency = LATENCY
+        self.blocking = False
+
+    async def wait(self):
+        await asyncio.sleep(self.latency)
+
+    async def get_prompt(self, name):
+        await self.wait()
+        return {
+            "decide_next_step": "Classify: {query}",
+            "generate_sql_query": "{combined_schema}\n{query}\n{member_filter}\n{today_date}",
+            "generate_final_answer": "{query}\n{sql_query}\n{sql_result}\n{table_prompt}",
+        }.get(name, "Table prompt")
+
+    async def create(self, model, messages, stream=False, **kwargs):
+        await self.wait()
+        content = messages[0]["content"]
+        member = re.search(r"id = '[^']*'", content)
+        if content.startswith("Classify:"):
+            text = "database_query"
+        elif member is not None and "CREATE TABLE" in content:
+            text = f"SELECT name, deeplink FROM t1 WHERE {member.group(0)} LIMIT 10"
+        else:
+            text = "You have 2 names."
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+        async def tokens():
+            for token in text.split(" "):
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token + " "))])
+        return tokens()
+
+    async def search(self, index, body):
+        await self.wait()
+        return {"hits": {"hits": [{"_source": {"table_name": "t1", "table_description": TABLE}, "_score": 0.9}]}}
+
+    async def embed(self, text):
+        if self.blocking:
+            time.sleep(self.latency)
+        else:
+            await self.wait()
+        return [0.1] * 8
+
+    async def run_query(self, sql):
+        await self.wait()
+        return "test"
+
+    async def wait_for_query(self, query_execution_id, timeout=None, history_key=None):
+        await self.wait()
+        return QueryExecution(query_execution_id, "SUCCEEDED", None, {"DataScannedInBytes": 1024})
+
+    async def get_result(self, query_execution_id, max_rows=None, output_location=None):
+        await self.wait()
+        return ResultSet.from_dicts([{"name": "a", "deeplink": "x"}, {"name": "b", "deeplink": "y"}])
+
+
+@pytest.fixture
+def io():
+    return StubIO()
+
+
+@pytest.fixture
+def workflow(io):
+    with mock.patch.object(chat_flow, "async_get_prompt", io.get_prompt), \
+            mock.patch.object(data_services_nodes, "async_get_prompt", io.get_prompt):
+        workflow = chat_flow.ChatWorkflow(openai_api_key="test", speculative=False)
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=io.create)))
+        workflow.client = client
+        workflow.answer_cache = None
+        workflow.intent_classifier = None
+        nodes = workflow.workflow_nodes
+        nodes.client = client
+        nodes.opensearch_client = SimpleNamespace(search=io.search)
+        nodes.generate_embedding = io.embed
+        nodes.run_athena_query = io.run_query
+        nodes.wait_for_query_execution = io.wait_for_query
+        nodes.get_result_set = io.get_result
+        # Caches and the Athena slot limit would hide or add waiting unrelated to blocking
+        nodes.sql_template_cache = nodes.result_cache = nodes.athena_scheduler = nodes.local_sql = None
+        nodes.table_index = nodes.column_index = None
+        yield workflow
+
+
+async def run_batch(workflow, count: int) -> float:
+    start = time.perf_counter()
+    states = await asyncio.gather(*(workflow.run("list my names", uuid=f"member-{i}") for i in range(count)))
+    elapsed = time.perf_counter() - start
+    assert all(state.final_answer for state in states)
+    return elapsed
+
+
+async def io_wait(workflow, io) -> tuple:
+    """
+    Returns (one chat's time, the batch's time minus its CPU time).
+    """
+    io.latency = 0.0
+    cpu = await run_batch(workflow, CONCURRENCY)
+    io.latency = LATENCY
+    single = await run_batch(workflow, 1)
+    return single, await run_batch(workflow, CONCURRENCY) - cpu
+
+
+@pytest.mark.asyncio
+async def test_concurrent_chats_overlap(workflow, io):
+    single, waited = await io_wait(workflow, io)
+    # Headroom for scheduling; serialized chats would wait about CONCURRENCY times as long
+    assert waited < 2 * single
+
+
+@pytest.mark.asyncio
+async def test_blocking_call_breaks_overlap(workflow, io):
+    io.blocking = True
+    single, waited = await io_wait(workflow, io)
+    assert waited > CONCURRENCY * LATENCY